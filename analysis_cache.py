@@ -0,0 +1,158 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import logging
+import lizard
+
+logger = logging.getLogger(__name__)
+
+# Cache settings (override through environment variables)
+ANALYSIS_CACHE_ENABLED = os.environ.get("ANALYSIS_CACHE", "1") != "0"
+ANALYSIS_CACHE_DIR = os.environ.get(
+    "ANALYSIS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cdb-archtool-cache"))
+ANALYSIS_CACHE_MAX_BYTES = int(os.environ.get("ANALYSIS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Bump when the shape of the cached file_info changes
+CACHE_FORMAT_VERSION = "4"
+
+class AnalysisCache:
+    """
+    On-disk, content-addressed cache of per-file analysis results.
+
+    Entries are keyed by a hash of the file contents plus the lizard version,
+    so a file is only re-analyzed when it changes or lizard is upgraded. The
+    path-dependent fields ('path', 'name') are not stored; they are filled in
+    again on lookup so the same entry serves every checkout of a file.
+    Entry access times are tracked through file mtimes, and the least
+    recently used entries are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=ANALYSIS_CACHE_DIR, max_bytes=ANALYSIS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """Yield (path, size, mtime) for every entry in the cache directory."""
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, st.st_size, st.st_mtime
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    @staticmethod
+    def key_for(content):
+        """Return the cache key for the given file contents (bytes)."""
+        digest = hashlib.sha256()
+        digest.update(f"{CACHE_FORMAT_VERSION}:{lizard.version}:".encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, key, file_path):
+        """Return the cached file_info for key, bound to file_path, or None."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            # Refresh the access time for LRU ordering
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        cached["path"] = file_path
+        cached["name"] = os.path.basename(file_path)
+        return cached
+
+    def put(self, key, file_info):
+        """Store a file_info dict under key and evict old entries if needed."""
+        cached = {k: v for k, v in file_info.items() if k not in ("path", "name")}
+        data = json.dumps(cached).encode("utf-8")
+
+        entry_path = self._entry_path(key)
+        try:
+            # An entry rewritten in place replaces its old size
+            previous_size = os.path.getsize(entry_path)
+        except OSError:
+            previous_size = 0
+
+        # Write to a temp file and rename so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            logger.warning("Could not write cache entry %s: %s", key, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._total_bytes += len(data) - previous_size
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            # Evict down to 90% so every put does not trigger another scan
+            target = int(self.max_bytes * 0.9)
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+            self._total_bytes = total
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "size_bytes": self._total_bytes
+            }
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """Return the process-wide analysis cache, or None if caching is disabled."""
+    global _default_cache
+    if not ANALYSIS_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = AnalysisCache()
+            except OSError as e:
+                logger.warning("Analysis cache disabled: %s", e)
+                return None
+        return _default_cache
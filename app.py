@@ -1,12 +1,36 @@
 import time
+
+# Measured from here so the cost of every import below is included
+_startup_began = time.perf_counter()
+
 import stat
-from flask import Flask, render_template, request, jsonify
+import threading
+import queue
+import json
+import logging
+from flask import Flask, render_template, request, jsonify, Response
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
 # Add these imports for code analysis
-from lizard_parser import analyze_codebase
+from lizard_parser import analyze_files, analyze_sources
+from source_walker import walk_sources, WalkResult
+from arch_diff import diff_revisions
+from analysis_cache import get_default_cache
 from graph_builder import build_dependency_graph
+from graph_sessions import GraphSessionStore
+from graph_layout import get_default_layout_cache
+from graph_pipeline import (filters_from_json, filters_from_form, view_error, int_error, render_graph,
+                            serialize_node, serialize_edge, serialize_cycles, serialize_graph, display_names)
+from resource_governor import ResourceGovernor
+from compact_graph import CompactGraph
+from job_manager import JobManager, JobQueueFull
+from repo_cache import get_default_repo_cache, clone_sparse, normalize_subdir
+from archive_reader import read_archive_sources, ArchiveLimitError
+from gemini_model import ANALYSIS_ONLY, create_default_model
+from architecture_summary import Summarizer, PARTITION_MODES, SUMMARY_TOKEN_BUDGET
+from instrumentation import REGISTRY, stage, begin_trace, end_trace, server_timing
+from wire_format import (columnar_graph, negotiate_format, negotiate_encoding,
+                         encode_body, compress_body)
 import ntpath
 import git
 import tempfile
@@ -16,16 +40,59 @@ import zipfile
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if not GOOGLE_API_KEY:
-    raise ValueError("Please set GOOGLE_API_KEY in your .env file")
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash')
+# Cache Gemini responses and coalesce identical concurrent prompts
+llm = create_default_model()
+if ANALYSIS_ONLY:
+    logger.warning("GOOGLE_API_KEY is not set or ANALYSIS_ONLY=1: running in analysis-only mode, "
+                   "/generate is disabled")
 
 app = Flask(__name__)
 
+# Background analysis jobs
+job_manager = JobManager()
+
+# Analyzed graphs kept for follow-up queries
+graph_sessions = GraphSessionStore()
+
+# Clone only the analyzable files of repositories (blobless, sparse checkout)
+CLONE_SPARSE = os.environ.get("CLONE_SPARSE", "1") != "0"
+
+# Minimum seconds between progress records in streamed responses
+STREAM_PROGRESS_INTERVAL = float(os.environ.get("STREAM_PROGRESS_INTERVAL", 0.5))
+
+def cache_metrics():
+    """Metrics of the caches and stores owned by the app, for /metrics."""
+    metrics = [("startup_seconds", "gauge", "Seconds spent importing and setting up the app",
+                STARTUP_SECONDS)]
+    if llm is not None:
+        for key, value in llm.stats().items():
+            metrics.append((f"gemini_cache_{key}", "gauge", f"Gemini response cache {key}", value))
+    cache = get_default_cache()
+    if cache is not None:
+        for key, value in cache.stats().items():
+            metrics.append((f"analysis_cache_{key}", "gauge", f"Analysis cache {key}", value))
+    for key, value in get_default_layout_cache().stats().items():
+        metrics.append((f"layout_cache_{key}", "gauge", f"Graph layout cache {key}", value))
+    return metrics
+
+REGISTRY.add_collector(cache_metrics)
+
+@app.before_request
+def start_request_trace():
+    begin_trace()
+
+@app.after_request
+def add_server_timing(response):
+    """Report the pipeline stages run for this request in a Server-Timing header."""
+    records = end_trace()
+    if records:
+        response.headers["Server-Timing"] = server_timing(records)
+    return response
+
 def clean_mermaid_code(code):
     """Clean and format Mermaid graph code."""
     # Remove any markdown code blocks
@@ -75,56 +142,11 @@ def convert_to_graph_td(text):
     """
    
     try:
-        response = model.generate_content(prompt)
-        graph_code = clean_mermaid_code(response.text)
+        graph_code = clean_mermaid_code(llm.generate_text(prompt))
         return graph_code
     except Exception as e:
         return f"Error generating graph: {str(e)}"
 
-def shorten_path(path, preserve_namespace=False):
-    """Extract filename with optimal directory context."""
-    if not path:
-        return ""
-   
-    # Handle already shortened paths
-    if "/" not in path and "\\" not in path:
-        return path
-   
-    # Normalize path separators
-    normalized_path = path.replace('\\', '/')
-   
-    # Get the filename (last part)
-    parts = normalized_path.split('/')
-    filename = parts[-1]
-   
-    if not preserve_namespace:
-        return filename
-   
-    # Extract meaningful context - avoid full paths but keep useful structure
-    context_parts = []
-   
-    # Identify relevant path components
-    # Skip common non-meaningful directories
-    skip_dirs = {'src', 'lib', 'app', 'source', 'main', 'test', 'bin', 'build', 'dist','venv', 'env', 'virtualenv', 'node_modules'}
-   
-    # Start from the end (nearest to filename) and collect up to 2 meaningful directory names
-    i = len(parts) - 2  # Start with the directory containing the file
-    context_count = 0
-   
-    while i >= 0 and context_count < 2:
-        part = parts[i]
-        # Skip generic directory names and empty parts
-        if part and part.lower() not in skip_dirs:
-            context_parts.insert(0, part)
-            context_count += 1
-        i -= 1
-   
-    # Assemble the shortened path
-    if context_parts:
-        return "/".join(context_parts) + "/" + filename
-    else:
-        return filename
-
 def optimize_mermaid_for_large_graph(mermaid_code, node_count):
     """Optimize mermaid settings for large graphs."""
    
@@ -145,6 +167,8 @@ def index():
 
 @app.route('/generate', methods=['POST'])
 def generate():
+    if llm is None:
+        return jsonify({'error': 'Text to graph generation is disabled: the server runs in analysis-only mode'}), 503
     text = request.json.get('text', '')
     if not text:
         return jsonify({'error': 'No text provided'}), 400
@@ -152,6 +176,90 @@ def generate():
     graph_code = convert_to_graph_td(text)
     return jsonify({'graph_code': graph_code})
 
+def clone_options(data):
+    """Read the clone mode (sparse, subdir) from a JSON request body."""
+    return {
+        "sparse": bool(data.get("sparse", CLONE_SPARSE)),
+        "subdir": normalize_subdir(data.get("subdir", ""))
+    }
+
+def clone_repository(repo_url, branch, sparse=False, subdir=""):
+    """
+    Clone a repository into a new temporary directory. Returns (repo, temp_dir).
+    A sparse clone fetches and checks out only the analyzable files.
+    """
+    temp_dir = tempfile.mkdtemp()
+    logger.info("Cloning %s (branch: %s%s)", repo_url, branch, ", sparse" if sparse else "")
+    try:
+        if sparse:
+            repo = clone_sparse(repo_url, temp_dir, branch, subdir)
+        else:
+            repo = git.Repo.clone_from(repo_url, temp_dir, branch=branch, depth=1)
+    except Exception:
+        remove_directory_async(temp_dir)
+        raise
+    return repo, temp_dir
+
+def remove_directory(path, attempts=5):
+    """Delete a directory tree, retrying briefly while files are still locked."""
+    def handle_remove_readonly(func, path, exc_info):
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+
+    delay = 0.1
+    for attempt in range(attempts):
+        if not os.path.exists(path):
+            return
+        try:
+            shutil.rmtree(path, onerror=handle_remove_readonly)
+            return
+        except Exception as e:
+            if attempt == attempts - 1:
+                logger.warning("Could not remove temp dir %s: %s", path, e)
+                return
+            time.sleep(delay)
+            delay *= 2
+
+def remove_directory_async(path):
+    """Delete a directory tree on a background thread, off the request path."""
+    threading.Thread(target=remove_directory, args=(path,), daemon=True).start()
+
+def release_repository(repo, temp_dir):
+    """Close a cloned repository and schedule its checkout for deletion."""
+    if repo is not None:
+        try:
+            repo.git.clear_cache()
+            repo.close()
+        except:
+            pass
+    if temp_dir:
+        remove_directory_async(temp_dir)
+
+def checkout_repository(repo_url, branch, sparse=CLONE_SPARSE, subdir=""):
+    """
+    Get a working copy of a repository at branch.
+
+    Uses the managed clone cache when it is enabled and a fresh shallow clone
+    otherwise. With sparse, only the analyzable files are fetched. With
+    subdir, the returned directory is that subdirectory of the checkout.
+    Returns (directory, commit_sha, release); call release() once the
+    directory is no longer needed.
+    """
+    repo_cache = get_default_repo_cache()
+    if repo_cache is not None:
+        worktree_dir, commit = repo_cache.checkout(repo_url, branch, sparse, subdir)
+        checkout_dir, release = worktree_dir, lambda: repo_cache.release(worktree_dir)
+    else:
+        repo, temp_dir = clone_repository(repo_url, branch, sparse, subdir)
+        commit = repo.head.commit.hexsha
+        checkout_dir, release = temp_dir, lambda: release_repository(repo, temp_dir)
+
+    directory = os.path.join(checkout_dir, subdir) if subdir else checkout_dir
+    if not os.path.isdir(directory):
+        release()
+        raise ValueError(f"Subdirectory not found in repository: {subdir}")
+    return directory, commit, release
+
 # Add new code analysis endpoint
 @app.route("/analyze", methods=["POST"])
 def analyze():
@@ -159,18 +267,19 @@ def analyze():
     directory = data.get("directory")
    
     # New filter options
-    filters = {
-        "node_types": data.get("node_types", []),
-        "edge_types": data.get("edge_types", []),
-        "search_term": data.get("search_term", ""),
-        "max_nodes": data.get("max_nodes", 0)
-    }
+    filters = filters_from_json(data)
    
     if not directory:
         return jsonify({"error": "Missing directory parameter"}), 400
+    if view_error(filters):
+        return jsonify({"error": view_error(filters)}), 400
+
+    if wants_stream(data):
+        return ndjson_response(stream_analysis(
+            lambda progress: build_codebase_graph(directory, filters, progress)))
 
-    graph_data = process_codebase(directory, filters)
-    return jsonify(graph_data)
+    graph, cycle_report, extras = build_codebase_graph(directory, filters)
+    return graph_response(graph, cycle_report, extras, data, root=directory)
 
 @app.route('/analyze_github', methods=['POST'])
 def analyze_github():
@@ -180,54 +289,120 @@ def analyze_github():
    
     if not repo_url:
         return jsonify({"error": "Repository URL is required"}), 400
+    if view_error(filters_from_json(data)):
+        return jsonify({"error": view_error(filters_from_json(data))}), 400
+    try:
+        options = clone_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if wants_stream(data):
+        filters = filters_from_json(data)
+
+        def run(progress):
+            directory, _, release = checkout_repository(repo_url, branch, **options)
+            try:
+                return build_codebase_graph(directory, filters, progress)
+            finally:
+                release()
+        return ndjson_response(stream_analysis(run))
    
-    temp_dir = None
-    repo = None
+    release = None
    
     try:
-        # Create temporary directory
-        temp_dir = tempfile.mkdtemp()
-       
-        # Clone the repository
-        print(f"Cloning {repo_url} (branch: {branch})...")
-        repo = git.Repo.clone_from(repo_url, temp_dir, branch=branch, depth=1)
+        # Check out the repository
+        directory, commit, release = checkout_repository(repo_url, branch, **options)
        
-        # Process directly with the temporary directory path
-        filters = {
-            "node_types": data.get("node_types", []),
-            "edge_types": data.get("edge_types", []),
-            "search_term": data.get("search_term", ""),
-            "max_nodes": data.get("max_nodes", 0)
-        }
+        # Process directly with the checkout path
+        filters = filters_from_json(data)
        
-        graph_data = process_codebase(temp_dir, filters)
-        return jsonify(graph_data)
+        graph, cycle_report, extras = build_codebase_graph(directory, filters)
+        extras["commit"] = commit
+        return graph_response(graph, cycle_report, extras, data, root=directory)
    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
-        print(f"Error analyzing repository: {str(e)}")
+        logger.error("Error analyzing repository: %s", e)
         return jsonify({"error": str(e)}), 500
    
     finally:
-        # Clean up repository resources
-        if repo is not None:
-            try:
-                repo.git.clear_cache()
-                repo.close()
-            except:
-                pass
-               
-        # Clean up temporary directory with retry and error handling
-        if temp_dir and os.path.exists(temp_dir):
-            def handle_remove_readonly(func, path, exc_info):
-                os.chmod(path, stat.S_IWRITE)
-                func(path)
-           
-            time.sleep(1)
-           
-            try:
-                shutil.rmtree(temp_dir, onerror=handle_remove_readonly)
-            except Exception as e:
-                print(f"Warning: Could not remove temp dir {temp_dir}: {str(e)}")
+        # Clean up repository resources in the background
+        if release:
+            release()
+
+def run_analysis_job(job, filters, directory=None, repo_url=None, branch='main', options=None):
+    """
+    Background job: analyze a local directory or a cloned repository.
+    options are the clone_options of the request. Jobs run under the
+    JOB_BUDGET_* limits rather than the per-request ones.
+    """
+    if directory:
+        return process_codebase(directory, filters, progress=job.update_progress,
+                                governor=ResourceGovernor.for_job())
+
+    directory, commit, release = checkout_repository(repo_url, branch, **(options or {}))
+    try:
+        job.check_cancelled()
+        graph_data = process_codebase(directory, filters, progress=job.update_progress,
+                                      governor=ResourceGovernor.for_job())
+        graph_data["commit"] = commit
+        return graph_data
+    finally:
+        release()
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue an analysis of a directory or repository and return its job id."""
+    data = request.get_json() or {}
+    directory = data.get("directory")
+    repo_url = data.get("repo_url")
+
+    if not directory and not repo_url:
+        return jsonify({"error": "Either directory or repo_url is required"}), 400
+    if view_error(filters_from_json(data)):
+        return jsonify({"error": view_error(filters_from_json(data))}), 400
+    try:
+        options = clone_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        job = job_manager.submit(run_analysis_job, filters_from_json(data), directory=directory,
+                                 repo_url=repo_url, branch=data.get("branch", "main"), options=options)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+    response = job.to_dict()
+    response["status_url"] = f"/jobs/{job.id}"
+    response["result_url"] = f"/jobs/{job.id}/result"
+    return jsonify(response), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    if job.status == "failed":
+        return jsonify({"error": job.error}), 500
+    if job.status != "done":
+        return jsonify(job.to_dict()), 409
+    return encoded_response(job.result, "json")
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.to_dict())
 
 @app.route('/upload', methods=['POST'])
 def upload_code():
@@ -239,252 +414,327 @@ def upload_code():
         return jsonify({"error": "No file selected"}), 400
        
     try:
-        # Create temporary directory for extraction
-        temp_dir = tempfile.mkdtemp()
-        upload_path = os.path.join(temp_dir, file.filename)
-       
-        # Save and extract the zip file
-        file.save(upload_path)
-        with zipfile.ZipFile(upload_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
+        # Read the source files straight from the uploaded zip, without extracting it
+        skipped = WalkResult()
+        sources = read_archive_sources(file.stream, skipped=skipped)
        
         # Get filter options from request
-        filters = {}
-        if request.form:
-            filters = {
-                "node_types": request.form.getlist("node_types"),
-                "edge_types": request.form.getlist("edge_types"),
-                "search_term": request.form.get("search_term", ""),
-                "max_nodes": int(request.form.get("max_nodes", 0))
-            }
-       
-        # Process directly with the temporary directory path
-        graph_data = process_codebase(temp_dir, filters)
+        filters = filters_from_form(request.form) if request.form else None
+
+        if view_error(filters):
+            return jsonify({"error": view_error(filters)}), 400
+
+        if wants_stream(request.form):
+            return ndjson_response(stream_analysis(
+                lambda progress: build_codebase_graph(None, filters, progress, sources, skipped=skipped)))
        
-        # Clean up
-        shutil.rmtree(temp_dir)
+        graph, cycle_report, extras = build_codebase_graph(None, filters, sources=sources, skipped=skipped)
        
-        return jsonify(graph_data)
+        return graph_response(graph, cycle_report, extras, request.form)
+
+    except (ArchiveLimitError, zipfile.BadZipFile) as e:
+        return jsonify({"error": str(e)}), 400
    
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/graphs/<graph_id>', methods=['GET'])
+def graph_info(graph_id):
+    session = graph_sessions.get(graph_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired graph"}), 404
+    return jsonify(session.to_dict())
+
+@app.route('/graphs/<graph_id>/query', methods=['POST'])
+def query_graph(graph_id):
+    """Filter, search or expand an already analyzed graph without re-analysis."""
+    data = request.get_json() or {}
+    filters = filters_from_json(data)
+    if view_error(filters):
+        return jsonify({"error": view_error(filters)}), 400
+
+    session = graph_sessions.get(graph_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired graph"}), 404
+
+    governor = ResourceGovernor()
+    graph, cycle_report, extras = render_graph(session.graph, filters, root=session.root, governor=governor)
+    extras["graph_id"] = session.id
+    # The stored graph may itself be partial
+    truncated = governor.truncation() or session.metadata.get("truncated")
+    if truncated:
+        extras["truncated"] = truncated
+    return graph_response(graph, cycle_report, extras, data, root=session.root)
+
+@app.route('/graphs/<graph_id>', methods=['DELETE'])
+def delete_graph(graph_id):
+    if not graph_sessions.delete(graph_id):
+        return jsonify({"error": "Unknown or expired graph"}), 404
+    return jsonify({"deleted": graph_id})
+
+@app.route('/diff', methods=['POST'])
+def architecture_diff():
+    """Dependency graph delta of a local repository between two revisions."""
+    data = request.get_json() or {}
+    repo_path = data.get("repo_path") or data.get("directory")
+    base = data.get("base")
+    if not repo_path or not base:
+        return jsonify({"error": "repo_path and base are required"}), 400
+
+    try:
+        with stage("diff"):
+            return jsonify(diff_revisions(repo_path, base, data.get("head", "HEAD")))
+    except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError, git.exc.BadName, ValueError) as e:
+        return jsonify({"error": f"Invalid repository or revision: {e}"}), 400
+    except Exception as e:
+        logger.error("Error computing architecture diff: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/summarize', methods=['POST'])
+def summarize():
+    """
+    Describe the architecture of an analyzed codebase: its partitions are
+    summarized concurrently by Gemini and merged into one overview.
+    """
+    if llm is None:
+        return jsonify({"error": "Summarization is disabled: the server runs in analysis-only mode"}), 503
+    data = request.get_json() or {}
+    mode = data.get("partition", "directory")
+    if mode not in PARTITION_MODES:
+        return jsonify({"error": f"Invalid partition, expected one of: {', '.join(PARTITION_MODES)}"}), 400
+    if int_error(data, ("token_budget", "depth")):
+        return jsonify({"error": int_error(data, ("token_budget", "depth"))}), 400
+    # Clients may lower the token budget, never raise it
+    token_budget = min(int(data.get("token_budget", SUMMARY_TOKEN_BUDGET)), SUMMARY_TOKEN_BUDGET)
+
+    graph_id = data.get("graph_id")
+    if not graph_id:
+        directory = data.get("directory")
+        if not directory:
+            return jsonify({"error": "directory or graph_id is required"}), 400
+        _, _, extras = build_codebase_graph(directory)
+        graph_id = extras["graph_id"]
+    session = graph_sessions.get(graph_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired graph"}), 404
+
+    try:
+        with stage("summarize"):
+            summarizer = Summarizer(llm, token_budget=token_budget)
+            result = summarizer.summarize(session.graph.to_networkx(), mode, root=session.root,
+                                          depth=int(data.get("depth", 2)))
+    except Exception as e:
+        logger.error("Error summarizing graph %s: %s", graph_id, e)
+        return jsonify({"error": str(e)}), 500
+    result["graph_id"] = graph_id
+    return jsonify(result)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Pipeline stage metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/dashboard')
 def dashboard():
     return render_template('dashboard.html')
 
-def filter_graph(graph, filters):
-    """Filter the graph based on user-specified criteria."""
-    import networkx as nx
-   
-    filtered_graph = graph.copy()
-   
-    # Filter by node type
-    if filters["node_types"]:
-        nodes_to_remove = [n for n, attrs in filtered_graph.nodes(data=True)
-                         if attrs.get("type") not in filters["node_types"]]
-        filtered_graph.remove_nodes_from(nodes_to_remove)
-   
-    # Filter by edge type
-    if filters["edge_types"]:
-        edges_to_remove = [(s, t) for s, t, attrs in filtered_graph.edges(data=True)
-                         if attrs.get("type") not in filters["edge_types"]]
-        filtered_graph.remove_edges_from(edges_to_remove)
-   
-    # Filter by search term
-    if filters["search_term"]:
-        search_term = filters["search_term"].lower()
-        nodes_to_keep = [n for n, attrs in filtered_graph.nodes(data=True)
-                        if search_term in n.lower() or
-                           search_term in attrs.get("name", "").lower()]
-        # Also keep adjacent nodes for context
-        context_nodes = set()
-        for node in nodes_to_keep:
-            if node in filtered_graph:
-                context_nodes.update(nx.neighbors(filtered_graph, node))
-        nodes_to_keep.extend(context_nodes)
-        filtered_graph = filtered_graph.subgraph(nodes_to_keep).copy()
-   
-    # Limit number of nodes (keep most connected nodes)
-    if filters["max_nodes"] > 0 and len(filtered_graph) > filters["max_nodes"]:
-        # Sort nodes by degree (number of connections)
-        nodes_by_degree = sorted(filtered_graph.degree, key=lambda x: x[1], reverse=True)
-        nodes_to_keep = [n[0] for n in nodes_by_degree[:filters["max_nodes"]]]
-        filtered_graph = filtered_graph.subgraph(nodes_to_keep).copy()
-   
-    return filtered_graph
+def build_codebase_graph(directory, filters=None, progress=None, sources=None, governor=None,
+                         skipped=None):
+    """
+    Analyze a codebase and build its filtered, weighted dependency graph.
+    Returns (graph, cycle_report, extras) where extras holds run metadata.
+    progress, if given, is called as progress(files_scanned, files_total).
+    If sources, a list of in-memory (path, bytes) files, is given, it is
+    analyzed instead of walking directory; skipped is then the WalkResult
+    of the files left out of them, reported like a walk's.
 
-def calculate_edge_weights(graph):
-    """Calculate edge weights based on relationship frequency."""
-    # Create a counter for each unique source-target pair
-    edge_counts = {}
-   
-    for source, target in graph.edges:
-        if (source, target) not in edge_counts:
-            edge_counts[(source, target)] = 0
-        edge_counts[(source, target)] += 1
-   
-    # Normalize weights to a 1-10 scale
-    if edge_counts:
-        max_count = max(edge_counts.values())
-        min_count = min(edge_counts.values())
-        weight_range = max(1, max_count - min_count)
-       
-        # Set weights on edges
-        for (source, target), count in edge_counts.items():
-            if max_count == min_count:
-                weight = 5  # Default middle weight if all edges have same count
+    Every stage runs within the budgets of governor (by default a new
+    ResourceGovernor with the configured limits). When one runs out, the
+    rest of that stage's input is dropped and extras["truncated"] lists
+    which budgets were exhausted where; the graph covers what fit.
+
+    The unfiltered graph is kept as a graph session; its id is returned in
+    extras["graph_id"] so later queries can skip the analysis.
+    """
+    governor = governor or ResourceGovernor()
+    cache = get_default_cache()
+    cache_before = cache.stats() if cache else None
+    walk = None
+    if sources is not None:
+        walk = skipped
+        logger.info("Analyzing %d in-memory files", len(sources))
+        sources = sources[:governor.limit_files("read", sources, [len(data) for _, data in sources])]
+        with stage("analyze") as record:
+            analysis_result = analyze_sources(sources, cache=cache, progress=progress,
+                                              stop=governor.analysis_stop())
+            record.files = len(analysis_result)
+            record.bytes_read = sum(len(data) for _, data in sources)
+    else:
+        logger.info("Analyzing directory: %s", directory)
+        with stage("walk") as record:
+            file_paths = []
+            if os.path.isdir(directory):
+                walk = walk_sources(directory, max_files=governor.limits["files"], deadline=governor.deadline)
+                if walk.stopped:
+                    governor.record(walk.stopped, "walk")
+                keep = governor.limit_files("walk", walk.paths, walk.sizes)
+                file_paths = walk.paths[:keep]
             else:
-                # Scale to 1-10 range
-                weight = 1 + 9 * (count - min_count) / weight_range
-            graph.edges[(source, target)]["weight"] = weight
-   
-    return graph
+                logger.warning("Directory not found: %s", directory)
+            record.files = len(file_paths)
+        with stage("analyze") as record:
+            analysis_result = analyze_files(file_paths, cache=cache, progress=progress,
+                                            stop=governor.analysis_stop())
+            record.files = len(analysis_result)
+            record.bytes_read = sum(walk.sizes[:len(file_paths)]) if walk else 0
+    with stage("build_graph") as record:
+        base_graph = build_dependency_graph(governor.limit_analysis(analysis_result))
+        governor.limit_edges(base_graph)
+        record.nodes = base_graph.number_of_nodes()
+        record.edges = base_graph.number_of_edges()
+    with stage("compact"):
+        session = graph_sessions.create(CompactGraph.from_networkx(base_graph), root=directory,
+                                        metadata={"truncated": governor.truncation()})
 
-def detect_cycles(graph):
-    """Detect cycles in the dependency graph."""
-    import networkx as nx
-   
-    cycles = list(nx.simple_cycles(graph))
-   
-    # Mark nodes and edges involved in cycles
-    cycle_nodes = set()
-    cycle_edges = set()
-   
-    for cycle in cycles:
-        # Add all nodes in this cycle
-        cycle_nodes.update(cycle)
-       
-        # Add all edges in this cycle
-        for i in range(len(cycle)):
-            source = cycle[i]
-            target = cycle[(i + 1) % len(cycle)]
-            if graph.has_edge(source, target):
-                cycle_edges.add((source, target))
-   
-    # Mark nodes involved in cycles
-    for node in cycle_nodes:
-        if "flags" not in graph.nodes[node]:
-            graph.nodes[node]["flags"] = []
-        graph.nodes[node]["flags"].append("in_cycle")
-   
-    # Mark edges involved in cycles
-    for source, target in cycle_edges:
-        if "flags" not in graph.edges[(source, target)]:
-            graph.edges[(source, target)]["flags"] = []
-        graph.edges[(source, target)]["flags"].append("in_cycle")
-   
-    return graph, cycles
+    graph, cycle_report, extras = render_graph(session.graph, filters, root=directory, governor=governor)
+    extras["graph_id"] = session.id
+    if walk is not None:
+        # What the walker left out (ignored dirs, large or generated files)
+        extras["skipped"] = walk.report()
+    if governor.truncation():
+        extras["truncated"] = governor.truncation()
+
+    # Report analysis cache effectiveness for this run and overall
+    if cache is not None:
+        cache_after = cache.stats()
+        extras["cache"] = {
+            "hits": cache_after["hits"] - cache_before["hits"],
+            "misses": cache_after["misses"] - cache_before["misses"],
+            "total": cache_after
+        }
 
-def process_codebase(directory, filters=None):
+    return graph, cycle_report, extras
+
+def process_codebase(directory, filters=None, progress=None, sources=None, governor=None):
     """
-    Core function to analyze a codebase and generate graph data.
-    This is used by analyze, analyze_github, and upload_code endpoints.
+    Core function to analyze a codebase and generate JSON graph data.
+    This is used by analysis jobs, whose results are stored as JSON.
+    progress, if given, is called as progress(files_scanned, files_total).
+    sources optionally replaces directory with in-memory (path, bytes) files.
+    governor is passed on to build_codebase_graph.
     """
-    if filters is None:
-        filters = {
-            "node_types": [],
-            "edge_types": [],
-            "search_term": "",
-            "max_nodes": 0
-        }
-   
-    print(f"Analyzing directory: {directory}")
-    analysis_result = analyze_codebase(directory)
-    graph = build_dependency_graph(analysis_result)
-   
-    # Apply filters before processing
-    if filters["node_types"] or filters["edge_types"] or filters["search_term"]:
-        graph = filter_graph(graph, filters)
-
-    # Print graph structure to console
-    print("\n=== GRAPH STRUCTURE ===")
-    print(f"Total nodes: {len(graph.nodes())}")
-    print(f"Total edges: {len(graph.edges())}")
-   
-    # Print node types
-    node_types = {}
-    for node, attrs in graph.nodes(data=True):
-        node_type = attrs.get('type', 'unknown')
-        if node_type not in node_types:
-            node_types[node_type] = 0
-        node_types[node_type] += 1
-   
-    print("\nNode types:")
-    for node_type, count in node_types.items():
-        print(f"  - {node_type}: {count}")
-   
-    # Print edge types
-    edge_types = {}
-    for source, target, attrs in graph.edges(data=True):
-        edge_type = attrs.get('type', 'unknown')
-        if edge_type not in edge_types:
-            edge_types[edge_type] = 0
-        edge_types[edge_type] += 1
-   
-    print("\nEdge types:")
-    for edge_type, count in edge_types.items():
-        print(f"  - {edge_type}: {count}")
+    graph, cycle_report, extras = build_codebase_graph(directory, filters, progress, sources, governor)
+    return serialize_graph(graph, cycle_report, extras)
 
-    # Add weight calculation
-    graph = calculate_edge_weights(graph)
-   
-    # Detect cycles
-    graph, cycles = detect_cycles(graph)
-   
-    # Convert to serializable format
-    nodes_with_attrs = []
-    for node in graph.nodes:
-        attrs = graph.nodes[node]
-        node_id = node
-        node_name = attrs.get('name', node)
-       
-        # Always shorten node representation
-        display_id = shorten_path(node_id, preserve_namespace=True)
-        if attrs.get('type') == 'file':
-            node_name = shorten_path(node_name, preserve_namespace=True)
-       
-        nodes_with_attrs.append({
-            "id": node_id,
-            "display_id": display_id,
-            "type": attrs.get("type", "unknown"),
-            "name": node_name,
-            "flags": attrs.get("flags", [])
-        })
-   
-    edges_with_attrs = []
-    for source, target in graph.edges:
-        attrs = graph.edges[(source, target)]
-        edges_with_attrs.append({
-            "source": source,
-            "target": target,
-            "type": attrs.get("type", "unknown"),
-            "weight": attrs.get("weight", 1),
-            "flags": attrs.get("flags", [])
-        })
-   
-    # Add cycle information
-    cycles_with_shortened_paths = []
-    for cycle in cycles:
-        shortened_cycle = [shorten_path(node, preserve_namespace=True) for node in cycle]
-        cycles_with_shortened_paths.append({
-            "nodes": cycle,
-            "display_nodes": shortened_cycle,
-            "length": len(cycle)
-        })
-
-    graph_data = {
-        "nodes": nodes_with_attrs,
-        "edges": edges_with_attrs,
-        "cycles": cycles_with_shortened_paths
-    }
-    
-   
-    # Add warning for large graphs
-    if len(graph.nodes()) > 100:
-        graph_data["warning"] = "Large graph detected. Rendering may take time."
-   
-    return graph_data
+def encoded_response(payload, wire_format):
+    """Encode payload in wire_format and compress it if the client accepts it."""
+    body, mimetype = encode_body(payload, wire_format)
+    body, encoding = compress_body(body, negotiate_encoding(request.accept_encodings))
+    response = Response(body, mimetype=mimetype)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.update(("Accept", "Accept-Encoding"))
+    return response
+
+def graph_response(graph, cycle_report, extras, options=None, root=None):
+    """
+    Respond with a rendered graph in the format the client negotiated:
+    plain JSON (the default), or the columnar format as JSON or MessagePack.
+    """
+    wire_format = negotiate_format(options, request.accept_mimetypes)
+    with stage("serialize") as record:
+        if wire_format == "json":
+            payload = serialize_graph(graph, cycle_report, extras)
+        else:
+            payload = columnar_graph(graph, cycle_report, extras, display_names, root=root)
+        response = encoded_response(payload, wire_format)
+        record.nodes = graph.number_of_nodes()
+        record.edges = graph.number_of_edges()
+    return response
+
+def stream_analysis(run):
+    """
+    Run an analysis and yield its result as newline-delimited JSON.
+
+    run is called on a worker thread as run(progress) and returns the
+    (graph, cycle_report, extras) tuple of build_codebase_graph, so slow
+    steps such as cloning also happen after the first byte is sent.
+    Records are emitted in order: progress, file nodes, function nodes,
+    edges, cycles and a closing summary (or a single error record).
+    """
+    records = queue.Queue()
+    stopped = threading.Event()
+    last_progress = [0.0]
+
+    def progress(files_scanned, files_total):
+        if stopped.is_set():
+            raise RuntimeError("Client disconnected")
+        now = time.monotonic()
+        if files_scanned == files_total or now - last_progress[0] >= STREAM_PROGRESS_INTERVAL:
+            last_progress[0] = now
+            records.put(("record", {"type": "progress", "files_scanned": files_scanned,
+                                    "files_total": files_total}))
+
+    def worker():
+        try:
+            records.put(("done", run(progress)))
+        except Exception as e:
+            logger.error("Error streaming analysis: %s", e)
+            records.put(("error", e))
+
+    def to_line(record):
+        return json.dumps(record) + "\n"
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        yield to_line({"type": "progress", "files_scanned": 0, "files_total": None})
+        while True:
+            kind, payload = records.get()
+            if kind == "record":
+                yield to_line(payload)
+            elif kind == "error":
+                yield to_line({"type": "error", "error": str(payload)})
+                return
+            else:
+                break
+
+        graph, cycle_report, extras = payload
+        for node_type in ("file", "function"):
+            for node, attrs in graph.nodes(data=True):
+                if attrs.get("type") == node_type:
+                    yield to_line(dict(serialize_node(node, attrs), type="node", node_type=node_type))
+        for node, attrs in graph.nodes(data=True):
+            if attrs.get("type") not in ("file", "function"):
+                yield to_line(dict(serialize_node(node, attrs), type="node", node_type=attrs.get("type", "unknown")))
+        for source, target, attrs in graph.edges(data=True):
+            edge = serialize_edge(source, target, attrs)
+            edge["edge_type"] = edge.pop("type")
+            yield to_line(dict(edge, type="edge"))
+        yield to_line(dict(serialize_cycles(cycle_report), type="cycles"))
+
+        summary = {"type": "summary", "node_count": graph.number_of_nodes(),
+                   "edge_count": graph.number_of_edges()}
+        summary.update(extras)
+        yield to_line(summary)
+    finally:
+        # Stops the worker at its next progress report if the client went away
+        stopped.set()
+
+def wants_stream(options):
+    """Whether the client asked for an NDJSON stream instead of one JSON body."""
+    flag = options.get("stream") if options else None
+    if isinstance(flag, str):
+        flag = flag.lower() in ("1", "true", "yes")
+    if flag:
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+def ndjson_response(lines):
+    """Wrap an NDJSON line generator in an unbuffered streaming response."""
+    return Response(lines, mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+STARTUP_SECONDS = time.perf_counter() - _startup_began
+logger.info("App ready in %.3fs", STARTUP_SECONDS)
 
 if __name__ == '__main__':
     # For local development use debug mode and specific port
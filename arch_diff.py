@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+import git
+import networkx as nx
+from lizard_parser import analyze_sources
+from analysis_cache import get_default_cache
+from import_resolver import ModuleIndex
+from graph_builder import function_node_id
+from cycle_detector import cyclic_components
+from source_walker import is_ignored_dir, is_generated, WALK_MAX_FILE_BYTES, SOURCE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Analyzed commits kept in memory for later diffs (override through environment variables)
+ARCH_DIFF_SNAPSHOTS = int(os.environ.get("ARCH_DIFF_SNAPSHOTS", 8))
+
+class Snapshot:
+    """
+    The analysis of one commit: file_info per repository-relative path, the
+    files each one imports, and the ModuleIndex those imports were resolved
+    with. Snapshots are shared between diffs and must not be modified.
+    """
+
+    def __init__(self, commit, files, imports, index):
+        self.commit = commit
+        self.files = files
+        self.imports = imports
+        self.index = index
+        self._components = None
+
+    def components(self):
+        """Import cycles of this commit as a set of frozensets of files."""
+        if self._components is None:
+            graph = nx.DiGraph()
+            graph.add_nodes_from(self.files)
+            graph.add_edges_from((source, target) for source, targets in self.imports.items()
+                                 for target in targets)
+            self._components = {frozenset(component) for component in cyclic_components(graph)}
+        return self._components
+
+class SnapshotStore:
+    """Least recently used snapshots keyed by (repository path, commit sha)."""
+
+    def __init__(self, max_snapshots=ARCH_DIFF_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                self._snapshots.move_to_end(key)
+            return snapshot
+
+    def put(self, key, snapshot):
+        with self._lock:
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+
+_default_store = SnapshotStore()
+
+def _wanted(path, size):
+    """Whether a blob at path would be analyzed by a directory walk."""
+    if not path.endswith(SOURCE_EXTENSIONS):
+        return False
+    if any(is_ignored_dir(part) for part in path.split("/")[:-1]):
+        return False
+    return not (WALK_MAX_FILE_BYTES and size > WALK_MAX_FILE_BYTES)
+
+def _analyze_blobs(blobs):
+    """Analyze (path, Blob) pairs from git. Returns {path: file_info}."""
+    sources = []
+    for path, blob in blobs:
+        data = blob.data_stream.read()
+        if not is_generated(os.path.basename(path), data):
+            sources.append((path, data))
+    results = analyze_sources(sources, cache=get_default_cache())
+    return {file_info['path']: file_info for file_info in results}
+
+def _resolve_imports(files, index, paths):
+    """Resolve the imports of the given files to the files they refer to."""
+    imports = {}
+    for path in paths:
+        targets = set()
+        for import_info in files[path].get('imports', []):
+            targets.update(index.resolve(import_info, path))
+        targets.discard(path)
+        imports[path] = frozenset(targets)
+    return imports
+
+def full_snapshot(commit):
+    """Analyze every source file of a commit."""
+    blobs = [(item.path, item) for item in commit.tree.traverse()
+             if item.type == "blob" and _wanted(item.path, item.size)]
+    files = _analyze_blobs(blobs)
+    index = ModuleIndex(files, root=".")
+    return Snapshot(commit.hexsha, files, _resolve_imports(files, index, files), index)
+
+def incremental_snapshot(base, base_commit, head_commit):
+    """
+    Derive the snapshot of head_commit from base by re-analyzing only the
+    files git reports as changed between the two commits.
+    Returns (snapshot, changed) where changed maps "added", "removed" and
+    "modified" to sets of paths.
+    """
+    files = dict(base.files)
+    to_analyze = []
+    for diff in base_commit.diff(head_commit):
+        if not diff.new_file:
+            files.pop(diff.a_path, None)
+        if not diff.deleted_file and _wanted(diff.b_path, diff.b_blob.size):
+            to_analyze.append((diff.b_path, diff.b_blob))
+    files.update(_analyze_blobs(to_analyze))
+
+    analyzed = {path for path, _ in to_analyze}
+    changed = {
+        "added": set(files) - set(base.files),
+        "removed": set(base.files) - set(files),
+        "modified": {path for path in analyzed if path in files and path in base.files}
+    }
+
+    if changed["added"] or changed["removed"]:
+        # The set of modules changed, so any import may now resolve differently
+        index = ModuleIndex(files, root=".")
+        imports = _resolve_imports(files, index, files)
+    else:
+        index = base.index
+        imports = dict(base.imports)
+        imports.update(_resolve_imports(files, index, changed["modified"]))
+
+    return Snapshot(head_commit.hexsha, files, imports, index), changed
+
+def _function_ids(file_info):
+    return {function_node_id(file_info['path'], func) for func in file_info.get('functions', [])}
+
+def compare_snapshots(base, head, changed):
+    """Return the architecture delta between two snapshots."""
+    nodes_added, nodes_removed = [], []
+    for path in sorted(changed["added"]):
+        nodes_added.append({"id": path, "type": "file"})
+        nodes_added.extend({"id": func_id, "type": "function"} for func_id in sorted(_function_ids(head.files[path])))
+    for path in sorted(changed["removed"]):
+        nodes_removed.append({"id": path, "type": "file"})
+        nodes_removed.extend({"id": func_id, "type": "function"} for func_id in sorted(_function_ids(base.files[path])))
+    for path in sorted(changed["modified"]):
+        before, after = _function_ids(base.files[path]), _function_ids(head.files[path])
+        nodes_added.extend({"id": func_id, "type": "function"} for func_id in sorted(after - before))
+        nodes_removed.extend({"id": func_id, "type": "function"} for func_id in sorted(before - after))
+
+    # Only files that were re-resolved can have different outgoing imports
+    if head.index is base.index:
+        sources = changed["modified"]
+    else:
+        sources = set(base.imports) | set(head.imports)
+    edges_added, edges_removed = [], []
+    empty = frozenset()
+    for source in sorted(sources):
+        before, after = base.imports.get(source, empty), head.imports.get(source, empty)
+        edges_added.extend({"source": source, "target": target, "type": "imports"}
+                           for target in sorted(after - before))
+        edges_removed.extend({"source": source, "target": target, "type": "imports"}
+                             for target in sorted(before - after))
+
+    new_cycles, broken_cycles = [], []
+    if edges_added or edges_removed:
+        base_components, head_components = base.components(), head.components()
+        new_cycles = sorted(sorted(c) for c in head_components - base_components)
+        broken_cycles = sorted(sorted(c) for c in base_components - head_components)
+
+    return {
+        "base": base.commit,
+        "head": head.commit,
+        "files": {key: sorted(paths) for key, paths in changed.items()},
+        "nodes": {"added": nodes_added, "removed": nodes_removed},
+        "edges": {"added": edges_added, "removed": edges_removed},
+        "cycles": {"new": new_cycles, "broken": broken_cycles}
+    }
+
+def diff_revisions(repo_path, base, head="HEAD", store=None):
+    """
+    Compute the architecture delta of a local repository between two
+    revisions (anything git rev-parse accepts).
+
+    The base commit is analyzed in full the first time it is seen and kept
+    in store; head is derived from it by re-analyzing only the changed
+    files, and kept too so the next diff along a history is incremental.
+    Unchanged file contents are also served by the analysis cache.
+    """
+    store = store or _default_store
+    repo = git.Repo(repo_path)
+    try:
+        base_commit = repo.commit(base)
+        head_commit = repo.commit(head)
+        repo_dir = os.path.realpath(repo.working_tree_dir or repo.git_dir)
+
+        base_snapshot = store.get((repo_dir, base_commit.hexsha))
+        base_reused = base_snapshot is not None
+        if base_snapshot is None:
+            logger.info("Analyzing base commit %s in full", base_commit.hexsha)
+            base_snapshot = full_snapshot(base_commit)
+            store.put((repo_dir, base_commit.hexsha), base_snapshot)
+
+        head_snapshot, changed = incremental_snapshot(base_snapshot, base_commit, head_commit)
+        store.put((repo_dir, head_commit.hexsha), head_snapshot)
+
+        delta = compare_snapshots(base_snapshot, head_snapshot, changed)
+        delta["base_reused"] = base_reused
+        delta["reanalyzed_files"] = len(changed["added"]) + len(changed["modified"])
+        return delta
+    finally:
+        repo.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show how the dependency graph changed between two revisions.")
+    parser.add_argument("repo", help="Path of a local git repository")
+    parser.add_argument("base", help="Base revision")
+    parser.add_argument("head", nargs="?", default="HEAD", help="Head revision (default: HEAD)")
+    args = parser.parse_args(argv)
+    print(json.dumps(diff_revisions(args.repo, args.base, args.head), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
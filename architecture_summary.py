@@ -0,0 +1,403 @@
+import os
+import sys
+import time
+import json
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from graph_views import aggregate_graph, graph_root
+from cycle_detector import cyclic_components
+
+logger = logging.getLogger(__name__)
+
+# Summarization settings (override through environment variables)
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", 4))
+SUMMARY_RETRIES = int(os.environ.get("SUMMARY_RETRIES", 2))
+SUMMARY_RETRY_BACKOFF = float(os.environ.get("SUMMARY_RETRY_BACKOFF", 1.0))
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", 200000))
+SUMMARY_PROMPT_TOKENS = int(os.environ.get("SUMMARY_PROMPT_TOKENS", 3000))
+SUMMARY_OUTPUT_TOKENS = int(os.environ.get("SUMMARY_OUTPUT_TOKENS", 400))
+SUMMARY_MERGE_TOKENS = int(os.environ.get("SUMMARY_MERGE_TOKENS", 8000))
+SUMMARY_PARTITION_FILES = int(os.environ.get("SUMMARY_PARTITION_FILES", 40))
+
+PARTITION_MODES = ("directory", "scc")
+
+# Names listed per file and dependencies listed per partition in a prompt
+FUNCTIONS_PER_FILE = 12
+DEPENDENCIES_PER_PARTITION = 10
+OVERVIEW_EDGES = 30
+
+PARTITION_PROMPT = """You are documenting the architecture of a Python codebase.
+Below is one part of it: its files, the functions they define and how they depend on each other and on other parts.
+In at most 150 words, describe what this part is responsible for, its main entry points and how it relates to the rest of the codebase.
+
+{body}"""
+
+COMBINE_PROMPT = """Below are descriptions of several parts of one Python codebase.
+Combine them into a single description of at most 250 words that keeps the responsibilities of each part and how they interact.
+
+{body}"""
+
+MERGE_PROMPT = """You are documenting the architecture of a Python codebase.
+Below are the dependencies between its top-level directories, its import cycles and descriptions of each part.
+Write an architecture overview: the main layers or components, what each is responsible for, how data and control flow between them, and any structural problems such as cycles.
+
+{body}"""
+
+def estimate_tokens(text):
+    """Rough token count of text, about four characters per token."""
+    return len(text) // 4 + 1
+
+class TokenBudget:
+    """
+    Tokens that all model calls of one summarization may spend together.
+    A call reserves its prompt plus the expected response before it is
+    sent, and settles the reservation with the actual size afterwards.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens):
+        with self._lock:
+            if self.used + tokens > self.total:
+                return False
+            self.used += tokens
+            return True
+
+    def settle(self, reserved, actual):
+        with self._lock:
+            self.used += actual - reserved
+
+class Partition:
+    """A group of files summarized by one model call."""
+
+    def __init__(self, name, files, kind="directory"):
+        self.name = name
+        self.files = files
+        self.kind = kind
+        self.status = "pending"
+        self.summary = None
+        self.error = None
+        self.attempts = 0
+
+    def to_dict(self):
+        data = {"name": self.name, "kind": self.kind, "files": len(self.files),
+                "status": self.status, "attempts": self.attempts, "summary": self.summary}
+        if self.error:
+            data["error"] = self.error
+        return data
+
+def _relative(path, root):
+    return (os.path.relpath(path, root) if root else path).replace("\\", "/")
+
+def _directory_of(rel_path, depth):
+    return "/".join(rel_path.split("/")[:-1][:depth]) or "."
+
+def partition_graph(graph, mode="directory", root=None, depth=2, max_files=SUMMARY_PARTITION_FILES):
+    """
+    Split the files of an analyzed graph into partitions.
+
+    "directory" groups files by their directory, depth levels below root.
+    "scc" first puts every import cycle in a partition of its own, then
+    groups the remaining files by directory. Partitions with more than
+    max_files files are split into chunks of that size.
+    Returns (partitions, file_graph) where file_graph is the file-level view.
+    """
+    if root is None:
+        root = graph_root(graph)
+    file_graph = aggregate_graph(graph, "file", root=root)
+
+    groups = []
+    assigned = set()
+    if mode == "scc":
+        components = sorted((sorted(component) for component in cyclic_components(file_graph)),
+                            key=lambda files: (-len(files), files))
+        for number, files in enumerate(components, 1):
+            groups.append((f"cycle {number}", files, "scc"))
+            assigned.update(files)
+
+    by_directory = {}
+    for node in sorted(file_graph.nodes()):
+        if node not in assigned:
+            by_directory.setdefault(_directory_of(_relative(node, root), depth), []).append(node)
+    groups.extend((name, files, "directory") for name, files in sorted(by_directory.items()))
+
+    partitions = []
+    for name, files, kind in groups:
+        chunks = [files[i:i + max_files] for i in range(0, len(files), max_files)] if max_files else [files]
+        for number, chunk in enumerate(chunks, 1):
+            label = name if len(chunks) == 1 else f"{name} (part {number}/{len(chunks)})"
+            partitions.append(Partition(label, chunk, kind))
+    return partitions, file_graph
+
+def describe_partition(partition, graph, file_graph, partition_of, root, max_tokens=SUMMARY_PROMPT_TOKENS):
+    """
+    Build the prompt body for one partition, kept under max_tokens by
+    listing fewer files and noting how many were left out.
+    """
+    members = set(partition.files)
+    outgoing, incoming = {}, {}
+    for path in partition.files:
+        for target in file_graph.successors(path):
+            if target not in members:
+                other = partition_of[target]
+                outgoing[other] = outgoing.get(other, 0) + 1
+        for source in file_graph.predecessors(path):
+            if source not in members:
+                other = partition_of[source]
+                incoming[other] = incoming.get(other, 0) + 1
+
+    def ranked(counts):
+        top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:DEPENDENCIES_PER_PARTITION]
+        return ", ".join(f"{name} ({count})" for name, count in top) or "none"
+
+    footer = [f"Depends on: {ranked(outgoing)}", f"Used by: {ranked(incoming)}"]
+    lines = [f"Part: {partition.name} ({len(partition.files)} files)"]
+    budget = max_tokens - estimate_tokens(PARTITION_PROMPT + "\n".join(lines + footer))
+    for index, path in enumerate(partition.files):
+        functions = sorted(graph.nodes[node].get("name", node) for node in graph.successors(path)
+                           if graph.nodes[node].get("type") == "function")
+        shown = ", ".join(functions[:FUNCTIONS_PER_FILE])
+        if len(functions) > FUNCTIONS_PER_FILE:
+            shown += f" (+{len(functions) - FUNCTIONS_PER_FILE} more)"
+        imports = sorted(_relative(target, root) for target in file_graph.successors(path)
+                         if target in members)
+        line = f"- {_relative(path, root)}: {shown or 'no functions'}"
+        if imports:
+            line += f"; imports {', '.join(imports)}"
+        budget -= estimate_tokens(line)
+        if budget < 0:
+            lines.append(f"- ... {len(partition.files) - index} more files omitted")
+            break
+        lines.append(line)
+    return "\n".join(lines + footer)
+
+def describe_overview(file_graph, partitions, partition_of, root, depth):
+    """Directory-level dependencies and import cycles, for the merge prompt."""
+    counts = {}
+    for source, target in file_graph.edges():
+        pair = (_directory_of(_relative(source, root), depth), _directory_of(_relative(target, root), depth))
+        if pair[0] != pair[1]:
+            counts[pair] = counts.get(pair, 0) + 1
+    lines = ["Dependencies between directories (number of file-level links):"]
+    top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:OVERVIEW_EDGES]
+    lines.extend(f"- {source} -> {target} ({count})" for (source, target), count in top)
+    if len(counts) > len(top):
+        lines.append(f"- ... {len(counts) - len(top)} more")
+    cycles = [partition for partition in partitions if partition.kind == "scc"]
+    if cycles:
+        lines.append("Import cycles:")
+        lines.extend(f"- {partition.name}: {', '.join(_relative(path, root) for path in partition.files[:8])}"
+                     + (" ..." if len(partition.files) > 8 else "") for partition in cycles)
+    return "\n".join(lines)
+
+def _generate(model, prompt):
+    """Text response of a CachedModel or of a plain generate_content client."""
+    if hasattr(model, "generate_text"):
+        return model.generate_text(prompt)
+    return model.generate_content(prompt).text
+
+class Summarizer:
+    """
+    Map-reduce summarization of a codebase through a language model.
+
+    Partitions are summarized concurrently on at most concurrency threads.
+    Every call is retried up to retries times with exponential backoff,
+    and all calls share one TokenBudget; partitions that no longer fit are
+    skipped, largest partitions going first. The partition summaries are
+    then combined in rounds until they fit one merge prompt.
+    model is a CachedModel, or any client with generate_content(prompt).
+    """
+
+    def __init__(self, model, concurrency=SUMMARY_CONCURRENCY, retries=SUMMARY_RETRIES,
+                 backoff=SUMMARY_RETRY_BACKOFF, token_budget=SUMMARY_TOKEN_BUDGET,
+                 merge_tokens=SUMMARY_MERGE_TOKENS):
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.budget = TokenBudget(token_budget)
+        self.merge_tokens = merge_tokens
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def ask(self, prompt):
+        """
+        Send one prompt within the budget, retrying failures. Every attempt
+        reserves its tokens before it is sent; a failed attempt is charged
+        its prompt. Returns (text, attempts); text is None when the budget
+        is exhausted before the first attempt. Raises the last error once
+        all attempts failed or the budget has no room for another one.
+        """
+        prompt_tokens = estimate_tokens(prompt)
+        reserved = prompt_tokens + SUMMARY_OUTPUT_TOKENS
+        attempt = 0
+        while True:
+            if not self.budget.reserve(reserved):
+                if attempt == 0:
+                    return None, 0
+                logger.warning("Token budget exhausted after %d failed attempts", attempt)
+                raise error
+            attempt += 1
+            with self._lock:
+                self.calls += 1
+            try:
+                text = _generate(self.model, prompt)
+            except Exception as e:
+                self.budget.settle(reserved, prompt_tokens)
+                if attempt > self.retries:
+                    raise
+                error = e
+                logger.warning("Model call failed (attempt %d): %s", attempt, e)
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+                continue
+            self.budget.settle(reserved, prompt_tokens + estimate_tokens(text))
+            return text, attempt
+
+    def _summarize_partition(self, partition, prompt):
+        try:
+            text, attempts = self.ask(prompt)
+        except Exception as e:
+            partition.status, partition.error = "failed", str(e)
+            partition.attempts = self.retries + 1
+            return
+        partition.attempts = attempts
+        if text is None:
+            partition.status = "skipped"
+            partition.error = "Token budget exhausted"
+        else:
+            partition.status, partition.summary = "ok", text.strip()
+
+    def _map(self, executor, jobs):
+        """Run (function, args) jobs on executor and wait for all of them."""
+        futures = [executor.submit(function, *args) for function, args in jobs]
+        return [future.result() for future in futures]
+
+    def _combine(self, executor, sections):
+        """
+        Combine section texts in batches that fit merge_tokens until all of
+        them fit together. Returns (sections, rounds).
+        """
+        rounds = 0
+        while len(sections) > 1 and estimate_tokens("\n\n".join(sections)) > self.merge_tokens:
+            batches, batch = [], []
+            for section in sections:
+                if batch and estimate_tokens("\n\n".join(batch + [section])) > self.merge_tokens:
+                    batches.append(batch)
+                    batch = []
+                batch.append(section)
+            batches.append(batch)
+            if len(batches) == len(sections):
+                break  # every section already fills a batch on its own
+
+            def combine(batch):
+                if len(batch) == 1:
+                    return batch[0]
+                try:
+                    text, _ = self.ask(COMBINE_PROMPT.format(body="\n\n".join(batch)))
+                except Exception as e:
+                    logger.warning("Could not combine %d summaries: %s", len(batch), e)
+                    text = None
+                # Without a combined text, keep the parts rather than lose them
+                return text.strip() if text else "\n\n".join(batch)
+
+            sections = self._map(executor, [(combine, (batch,)) for batch in batches])
+            rounds += 1
+        return sections, rounds
+
+    def summarize(self, graph, mode="directory", root=None, depth=2):
+        """
+        Summarize an analyzed graph (the function-level networkx graph).
+        Returns a dict with the merged 'summary' (None if nothing could be
+        summarized), per-partition results, token use and timing.
+        """
+        started = time.monotonic()
+        if root is None:
+            root = graph_root(graph)
+        partitions, file_graph = partition_graph(graph, mode, root, depth)
+        partition_of = {path: partition.name for partition in partitions for path in partition.files}
+
+        # Largest partitions first, so a tight budget is spent where most code is
+        ordered = sorted(partitions, key=lambda partition: -len(partition.files))
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            jobs = []
+            for partition in ordered:
+                body = describe_partition(partition, graph, file_graph, partition_of, root)
+                jobs.append((self._summarize_partition, (partition, PARTITION_PROMPT.format(body=body))))
+            self._map(executor, jobs)
+
+            sections = [f"## {partition.name}\n{partition.summary}" for partition in partitions
+                        if partition.status == "ok"]
+            sections, rounds = self._combine(executor, sections)
+
+        summary = None
+        error = None
+        if sections:
+            overview = describe_overview(file_graph, partitions, partition_of, root, depth)
+            try:
+                summary, _ = self.ask(MERGE_PROMPT.format(body=overview + "\n\n" + "\n\n".join(sections)))
+            except Exception as e:
+                error = f"Merge failed: {e}"
+            if summary is None and error is None:
+                error = "Token budget exhausted before the merge"
+            if summary is None:
+                # Still return what the partitions produced
+                summary = "\n\n".join(sections)
+        else:
+            error = "No partition could be summarized"
+
+        counts = {}
+        for partition in partitions:
+            counts[partition.status] = counts.get(partition.status, 0) + 1
+        result = {
+            "summary": summary.strip() if summary else None,
+            "mode": mode,
+            "partitions": [partition.to_dict() for partition in partitions],
+            "counts": counts,
+            "merge_rounds": rounds,
+            "calls": self.calls,
+            "tokens": {"budget": self.budget.total, "used": self.budget.used},
+            "seconds": time.monotonic() - started
+        }
+        if error:
+            result["error"] = error
+        return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the architecture of a local codebase.")
+    parser.add_argument("directory", help="Directory to analyze")
+    parser.add_argument("--partition", choices=PARTITION_MODES, default="directory",
+                        help="Group files by directory, or give each import cycle its own group")
+    parser.add_argument("--depth", type=int, default=2, help="Directory levels used to group files")
+    parser.add_argument("--concurrency", type=int, default=SUMMARY_CONCURRENCY, help="Model calls in flight at once")
+    parser.add_argument("--token-budget", type=int, default=SUMMARY_TOKEN_BUDGET, help="Tokens all calls may use together")
+    parser.add_argument("--stub-latency", type=float, default=None,
+                        help="Use a local stub model that answers after this many seconds")
+    args = parser.parse_args(argv)
+
+    from source_walker import walk_sources
+    from lizard_parser import analyze_files
+    from graph_builder import build_dependency_graph
+
+    if args.stub_latency is not None:
+        from llm_cache import CachedModel, StubModel
+        model = CachedModel(StubModel(args.stub_latency))
+    else:
+        from gemini_model import create_default_model
+        model = create_default_model()
+        if model is None:
+            parser.error("set GOOGLE_API_KEY, or use --stub-latency to run without Gemini")
+
+    directory = os.path.abspath(args.directory)
+    graph = build_dependency_graph(analyze_files(walk_sources(directory).paths))
+    summarizer = Summarizer(model, concurrency=args.concurrency, token_budget=args.token_budget)
+    result = summarizer.summarize(graph, args.partition, root=directory, depth=args.depth)
+    print(json.dumps(result, indent=2))
+    return 0 if result["summary"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
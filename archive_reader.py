@@ -0,0 +1,102 @@
+import os
+import zipfile
+from source_walker import (is_ignored_dir, is_generated, WALK_MAX_FILE_BYTES, WALK_SKIP_GENERATED,
+                           SOURCE_EXTENSIONS)
+
+# Archive limits (override through environment variables)
+ARCHIVE_MAX_MEMBERS = int(os.environ.get("ARCHIVE_MAX_MEMBERS", 50000))
+ARCHIVE_MAX_TOTAL_BYTES = int(os.environ.get("ARCHIVE_MAX_TOTAL_BYTES", 256 * 1024 * 1024))
+ARCHIVE_MAX_RATIO = float(os.environ.get("ARCHIVE_MAX_RATIO", 100))
+
+class ArchiveLimitError(ValueError):
+    """Raised when an archive exceeds one of the configured safety limits."""
+
+def _is_source_member(info):
+    if info.is_dir() or not info.filename.endswith(SOURCE_EXTENSIONS):
+        return False
+    # Skip names that would escape the archive root if it were extracted
+    name = info.filename.replace('\\', '/')
+    return not name.startswith('/') and '..' not in name.split('/')
+
+def _ignored_dir(name):
+    """The path of the first ignored directory in a member name, or None."""
+    parts = name.replace('\\', '/').split('/')[:-1]
+    for depth, part in enumerate(parts):
+        if is_ignored_dir(part):
+            return '/'.join(parts[:depth + 1])
+    return None
+
+def read_archive_sources(archive, max_members=None, max_total_bytes=None, max_ratio=None,
+                         skipped=None):
+    """
+    Read the analyzable source files of a zip archive into memory.
+
+    archive is a path or a seekable file object. Only members with a source
+    extension are decompressed; everything else is skipped without being
+    read. Members are filtered like a directory walk (see walk_sources):
+    those under ignored directories, larger than WALK_MAX_FILE_BYTES or
+    generated are left out. skipped, if given, is a WalkResult that records
+    them with their reason. Returns a list of (member_name, bytes) pairs in
+    archive order.
+
+    Raises ArchiveLimitError if the archive has too many members, if the
+    source members would decompress to more than max_total_bytes, or if a
+    member's compression ratio exceeds max_ratio. Sizes are checked against
+    the bytes actually decompressed, not only the sizes the headers declare.
+    """
+    if max_members is None:
+        max_members = ARCHIVE_MAX_MEMBERS
+    if max_total_bytes is None:
+        max_total_bytes = ARCHIVE_MAX_TOTAL_BYTES
+    if max_ratio is None:
+        max_ratio = ARCHIVE_MAX_RATIO
+
+    sources = []
+    with zipfile.ZipFile(archive) as zip_ref:
+        members = zip_ref.infolist()
+        if len(members) > max_members:
+            raise ArchiveLimitError(f"Archive has {len(members)} members (limit {max_members})")
+
+        source_members = []
+        ignored_dirs = set()
+        for info in members:
+            if not _is_source_member(info):
+                continue
+            ignored_dir = _ignored_dir(info.filename)
+            if ignored_dir is not None:
+                if skipped is not None and ignored_dir not in ignored_dirs:
+                    skipped.skip(ignored_dir, "ignored_dir")
+                ignored_dirs.add(ignored_dir)
+            elif WALK_MAX_FILE_BYTES and info.file_size > WALK_MAX_FILE_BYTES:
+                if skipped is not None:
+                    skipped.skip(info.filename, "too_large")
+            else:
+                source_members.append(info)
+        declared_total = sum(info.file_size for info in source_members)
+        if declared_total > max_total_bytes:
+            raise ArchiveLimitError(
+                f"Archive sources expand to {declared_total} bytes (limit {max_total_bytes})")
+
+        total = 0
+        for info in source_members:
+            if info.compress_size and info.file_size / info.compress_size > max_ratio:
+                raise ArchiveLimitError(
+                    f"{info.filename} has a suspicious compression ratio "
+                    f"({info.file_size / info.compress_size:.0f}:1, limit {max_ratio:.0f}:1)")
+
+            # Never trust the declared size: stop reading one byte past it
+            with zip_ref.open(info) as member:
+                data = member.read(info.file_size + 1)
+            if len(data) > info.file_size:
+                raise ArchiveLimitError(f"{info.filename} is larger than its header declares")
+
+            total += len(data)
+            if total > max_total_bytes:
+                raise ArchiveLimitError(f"Archive sources exceed {max_total_bytes} bytes")
+            if WALK_SKIP_GENERATED and is_generated(os.path.basename(info.filename), data):
+                if skipped is not None:
+                    skipped.skip(info.filename, "generated")
+                continue
+            sources.append((info.filename, data))
+
+    return sources
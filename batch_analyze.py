@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Batch settings (override through command line options)
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_TIMEOUT = float(os.environ.get("BATCH_TIMEOUT", 600))
+
+STATE_FILE = "batch_state.jsonl"
+SUMMARY_FILE = "summary.json"
+
+class BatchTimeout(Exception):
+    """Raised inside a worker once a repository ran past its time limit."""
+
+def artifact_name(source):
+    """Stable, collision-free artifact file name for a repository path."""
+    path = os.path.abspath(source)
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:10]
+    base = os.path.basename(path.rstrip(os.sep)) or "root"
+    return f"{base}-{digest}.json"
+
+def fingerprint(source):
+    """
+    Identify the state of a source so resumed batches redo changed ones:
+    the HEAD commit of a git checkout, else size and mtime.
+    """
+    if os.path.isdir(os.path.join(source, ".git")):
+        try:
+            result = subprocess.run(["git", "-C", source, "rev-parse", "HEAD"], capture_output=True,
+                                    text=True, check=True)
+            return "git:" + result.stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            pass
+    info = os.stat(source)
+    return f"stat:{info.st_size}:{int(info.st_mtime)}"
+
+def _write_json_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def analyze_one(source, artifact_path, filters, timeout):
+    """
+    Worker task: analyze one directory or zip file and write its graph.
+
+    The analysis runs serially inside the worker, since the batch already
+    keeps every pool process busy. The time limit is checked after each file
+    and between stages. Returns a small summary dict for the parent.
+    """
+    from lizard_parser import analyze_files, analyze_sources
+    from source_walker import walk_sources, WalkResult
+    from archive_reader import read_archive_sources
+    from analysis_cache import get_default_cache
+    from graph_builder import build_dependency_graph
+    from graph_pipeline import render_graph, serialize_graph
+
+    started = time.monotonic()
+    deadline = started + timeout if timeout else None
+
+    def check_deadline(*_):
+        if deadline is not None and time.monotonic() > deadline:
+            raise BatchTimeout(f"Timed out after {timeout}s")
+
+    cache = get_default_cache()
+    extras = {}
+    if os.path.isdir(source):
+        walk = walk_sources(source)
+        check_deadline()
+        analysis = analyze_files(walk.paths, workers=1, cache=cache, progress=check_deadline)
+        extras["skipped"] = walk.report()
+        root = source
+    else:
+        skipped = WalkResult()
+        sources = read_archive_sources(source, skipped=skipped)
+        check_deadline()
+        analysis = analyze_sources(sources, workers=1, cache=cache, progress=check_deadline)
+        extras["skipped"] = skipped.report()
+        root = None
+
+    graph = build_dependency_graph(analysis)
+    check_deadline()
+    graph, cycle_report, render_extras = render_graph(graph, filters, root=root)
+    check_deadline()
+    graph_data = serialize_graph(graph, cycle_report, dict(render_extras, **extras))
+    graph_data["source"] = source
+    _write_json_atomic(artifact_path, graph_data)
+
+    return {
+        "files": len(analysis),
+        "nodes": graph.number_of_nodes(),
+        "edges": graph.number_of_edges(),
+        "seconds": time.monotonic() - started
+    }
+
+def load_state(state_path):
+    """Completed entries of a previous run, keyed by source path."""
+    completed = {}
+    try:
+        with open(state_path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+                completed[entry["source"]] = entry
+    except OSError:
+        pass
+    return completed
+
+def run_batch(sources, output_dir, filters=None, workers=BATCH_WORKERS, timeout=BATCH_TIMEOUT,
+              resume=True):
+    """
+    Analyze many repositories on one process pool.
+
+    Every finished repository is appended to output_dir/batch_state.jsonl
+    as soon as it completes, so a later run with resume=True skips the ones
+    that succeeded and whose fingerprint is unchanged. Returns the summary
+    that is also written to output_dir/summary.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_FILE)
+    if not resume and os.path.exists(state_path):
+        os.remove(state_path)
+    previous = load_state(state_path) if resume else {}
+
+    results = {}
+    pending = []
+    for source in sources:
+        try:
+            source_fingerprint = fingerprint(source)
+        except OSError as e:
+            results[source] = {"source": source, "status": "failed", "error": str(e)}
+            continue
+        artifact_path = os.path.join(output_dir, artifact_name(source))
+        done = previous.get(source)
+        if (done and done["status"] == "ok" and done.get("fingerprint") == source_fingerprint
+                and os.path.exists(artifact_path)):
+            results[source] = dict(done, resumed=True)
+            continue
+        pending.append((source, source_fingerprint, artifact_path))
+
+    logger.info("Batch: %d to analyze, %d already done", len(pending),
+                sum(1 for entry in results.values() if entry.get("resumed")))
+    started = time.monotonic()
+    with open(state_path, "a") as state, ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(analyze_one, source, artifact_path, filters, timeout):
+                   (source, source_fingerprint, artifact_path)
+                   for source, source_fingerprint, artifact_path in pending}
+        for future in as_completed(futures):
+            source, source_fingerprint, artifact_path = futures[future]
+            entry = {"source": source, "fingerprint": source_fingerprint,
+                     "artifact": os.path.basename(artifact_path)}
+            try:
+                entry.update(future.result(), status="ok")
+            except BatchTimeout as e:
+                entry.update(status="timeout", error=str(e))
+            except Exception as e:
+                entry.update(status="failed", error=str(e))
+            logger.info("%s: %s", source, entry["status"])
+            results[source] = entry
+            state.write(json.dumps(entry) + "\n")
+            state.flush()
+            os.fsync(state.fileno())
+
+    entries = [results[source] for source in sources if source in results]
+    counts = {}
+    for entry in entries:
+        status = "resumed" if entry.get("resumed") else entry["status"]
+        counts[status] = counts.get(status, 0) + 1
+    summary = {
+        "total": len(entries),
+        "counts": counts,
+        "seconds": time.monotonic() - started,
+        "repositories": entries
+    }
+    _write_json_atomic(os.path.join(output_dir, SUMMARY_FILE), summary)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze many local repositories or zip files in one run.")
+    parser.add_argument("sources", nargs="*", help="Repository directories or zip files")
+    parser.add_argument("--list", help="File with one repository path or zip file per line")
+    parser.add_argument("--output", required=True, help="Directory for graph artifacts and the run summary")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Worker processes shared by all repositories")
+    parser.add_argument("--timeout", type=float, default=BATCH_TIMEOUT, help="Seconds allowed per repository (0 for none)")
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of skipping completed repositories")
+    parser.add_argument("--level", default="function", help="Level of detail of the artifacts")
+    parser.add_argument("--max-nodes", type=int, default=0, help="Keep only the most connected nodes")
+    args = parser.parse_args(argv)
+
+    sources = list(args.sources)
+    if args.list:
+        with open(args.list, "r") as f:
+            sources.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not sources:
+        parser.error("no repositories given")
+    # Keep the first occurrence of each source
+    sources = list(dict.fromkeys(sources))
+
+    from graph_pipeline import filters_from_json, view_error
+    filters = filters_from_json({"level": args.level, "max_nodes": args.max_nodes})
+    if view_error(filters):
+        parser.error(view_error(filters))
+
+    summary = run_batch(sources, args.output, filters, args.workers, args.timeout, not args.no_resume)
+    print(json.dumps(summary["counts"]))
+    return 0 if all(status in ("ok", "resumed") for status in summary["counts"]) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import subprocess
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+import tracemalloc
+import contextlib
+
+# Benchmark settings (override through command line options)
+BENCH_FILES = 500
+BENCH_FUNCTIONS = 8
+BENCH_IMPORT_DENSITY = 3.0
+BENCH_CYCLE_DENSITY = 0.05
+BENCH_REPEAT = 3
+BENCH_THRESHOLD = 0.20
+BENCH_MIN_DELTA = 0.005
+MODULES_PER_PACKAGE = 50
+
+STAGES = ("walk", "analyze_codebase", "build_dependency_graph", "compute_metrics", "filter_graph",
+          "calculate_edge_weights", "detect_cycles", "serialization")
+
+def module_name(index):
+    return f"pkg{index // MODULES_PER_PACKAGE}.mod{index}"
+
+def generate_repository(directory, files=BENCH_FILES, functions=BENCH_FUNCTIONS,
+                        import_density=BENCH_IMPORT_DENSITY, cycle_density=BENCH_CYCLE_DENSITY,
+                        seed=0):
+    """
+    Write a synthetic Python repository into directory.
+
+    Modules are spread over packages of MODULES_PER_PACKAGE files. Each
+    module imports on average import_density later modules, so imports alone
+    form no cycles; a cycle_density fraction of modules also imports an
+    earlier module, closing cycles. The same arguments and seed always
+    produce the same tree.
+    """
+    rng = random.Random(seed)
+    for package in range((files + MODULES_PER_PACKAGE - 1) // MODULES_PER_PACKAGE):
+        os.makedirs(os.path.join(directory, f"pkg{package}"), exist_ok=True)
+        with open(os.path.join(directory, f"pkg{package}", "__init__.py"), "w") as f:
+            f.write("")
+
+    for index in range(files):
+        targets = set()
+        later = files - index - 1
+        if later:
+            count = min(later, int(import_density) + (rng.random() < import_density % 1))
+            targets.update(rng.sample(range(index + 1, files), count))
+        if index and rng.random() < cycle_density:
+            targets.add(rng.randrange(index))
+
+        lines = []
+        for target in sorted(targets):
+            package, module = module_name(target).split(".")
+            if rng.random() < 0.5:
+                lines.append(f"import {package}.{module}")
+            else:
+                lines.append(f"from {package} import {module}")
+        lines.append("")
+        for function in range(functions):
+            lines.extend([
+                f"def func_{index}_{function}(value, limit=10):",
+                "    total = 0",
+                "    for item in range(limit):",
+                "        if item % 2 and value > item:",
+                "            total += item",
+                "        elif value < 0:",
+                "            total -= 1",
+                "    return total",
+                ""
+            ])
+
+        package, module = module_name(index).split(".")
+        with open(os.path.join(directory, package, module + ".py"), "w") as f:
+            f.write("\n".join(lines))
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the pipeline's console output while a stage is timed."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def with_metrics(graph):
+    """Copy of graph with the node metrics render_graph ranks and weights by."""
+    from compact_graph import CompactGraph
+    compact = CompactGraph.from_networkx(graph)
+    compact.compute_metrics()
+    return compact.to_networkx()
+
+def run_pipeline(directory, filters, workers=None, measure=None):
+    """
+    Run the analysis pipeline stage by stage, in the order process_codebase
+    does. measure(stage, fn) runs fn and returns its result.
+    Returns a summary of the produced graph.
+    """
+    from lizard_parser import find_source_files, analyze_files
+    from graph_builder import build_dependency_graph
+    from cycle_detector import detect_cycles
+    from graph_pipeline import filter_graph, calculate_edge_weights, serialize_graph
+
+    paths = measure("walk", lambda: find_source_files(directory))
+    analysis = measure("analyze_codebase", lambda: analyze_files(paths, workers=workers))
+    graph = measure("build_dependency_graph", lambda: build_dependency_graph(analysis))
+    graph = measure("compute_metrics", lambda: with_metrics(graph))
+    graph = measure("filter_graph", lambda: filter_graph(graph, filters))
+    graph = measure("calculate_edge_weights", lambda: calculate_edge_weights(graph))
+    graph, cycle_report = measure("detect_cycles", lambda: detect_cycles(graph))
+    body = measure("serialization",
+                   lambda: json.dumps(serialize_graph(graph, cycle_report, {})))
+    return {
+        "files": len(paths),
+        "nodes": graph.number_of_nodes(),
+        "edges": graph.number_of_edges(),
+        "cycles": len(cycle_report["cycles"]),
+        "response_bytes": len(body)
+    }
+
+def run_benchmark(directory, filters, repeat=BENCH_REPEAT, workers=None):
+    """
+    Time every stage repeat times, then run once more under tracemalloc to
+    record each stage's peak Python memory. Returns the results dict.
+    """
+    timings = {stage: [] for stage in STAGES}
+
+    def timed(stage, fn):
+        with quiet():
+            start = time.perf_counter()
+            result = fn()
+            timings[stage].append(time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        graph_summary = run_pipeline(directory, filters, workers, timed)
+
+    peaks = {}
+
+    def traced(stage, fn):
+        tracemalloc.reset_peak()
+        with quiet():
+            result = fn()
+        peaks[stage] = tracemalloc.get_traced_memory()[1]
+        return result
+
+    tracemalloc.start()
+    try:
+        run_pipeline(directory, filters, workers, traced)
+    finally:
+        tracemalloc.stop()
+
+    stages = {stage: {"seconds": statistics.median(timings[stage]),
+                      "runs": timings[stage],
+                      "peak_bytes": peaks[stage]}
+              for stage in STAGES}
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "stages": stages,
+        "total_seconds": sum(stage["seconds"] for stage in stages.values()),
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * rss_unit,
+        "peak_rss_children_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * rss_unit,
+        "graph": graph_summary
+    }
+
+def measure_startup(repeat=BENCH_REPEAT):
+    """
+    Time importing the app in a fresh interpreter, the cost paid by every
+    new worker before it can serve a request. Returns the stage dict.
+    """
+    env = dict(os.environ, ANALYSIS_ONLY="1", LOG_LEVEL="WARNING")
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app"], check=True, env=env,
+                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        runs.append(time.perf_counter() - start)
+    return {"seconds": statistics.median(runs), "runs": runs}
+
+def tree_size(directory):
+    """(files, bytes) under directory, counting the .git directory too."""
+    files = total = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+                files += 1
+            except OSError:
+                pass
+    return files, total
+
+def compare_clone_modes(repo_url, branch="main", subdir="", repeat=BENCH_REPEAT):
+    """
+    Time a plain shallow clone of repo_url against the sparse, blobless
+    clone used for analysis, and measure what each writes to disk.
+    file:// URLs work when the source repository allows filtering
+    (git config uploadpack.allowFilter true). Returns a dict per mode.
+    """
+    import git
+    from repo_cache import clone_sparse
+
+    modes = {
+        "full": lambda directory: git.Repo.clone_from(repo_url, directory, branch=branch, depth=1),
+        "sparse": lambda directory: clone_sparse(repo_url, directory, branch, subdir)
+    }
+    results = {}
+    for mode, clone in modes.items():
+        runs = []
+        for _ in range(repeat):
+            directory = tempfile.mkdtemp(prefix="cdb-bench-clone-")
+            try:
+                start = time.perf_counter()
+                clone(directory).close()
+                runs.append(time.perf_counter() - start)
+                files, written = tree_size(directory)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+        results[mode] = {"seconds": statistics.median(runs), "runs": runs, "files": files,
+                         "bytes_written": written}
+    return results
+
+def compare_to_baseline(results, baseline, threshold=BENCH_THRESHOLD, min_delta=BENCH_MIN_DELTA):
+    """
+    Compare stage timings with a baseline results dict. A stage regresses
+    when it is more than threshold (relative) and min_delta seconds
+    (absolute) slower. Returns a list of regression dicts.
+    """
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            continue
+        delta = current["seconds"] - previous["seconds"]
+        if delta > min_delta and delta > threshold * previous["seconds"]:
+            regressions.append({
+                "stage": stage,
+                "baseline_seconds": previous["seconds"],
+                "seconds": current["seconds"],
+                "change": delta / previous["seconds"] if previous["seconds"] else None
+            })
+    return regressions
+
+def print_report(results, regressions):
+    print(f"{'stage':<24}{'seconds':>10}{'peak MB':>10}")
+    for stage, data in results["stages"].items():
+        peak = f"{data['peak_bytes'] / 2**20:>10.1f}" if "peak_bytes" in data else f"{'-':>10}"
+        print(f"{stage:<24}{data['seconds']:>10.4f}{peak}")
+    print(f"{'total':<24}{results['total_seconds']:>10.4f}")
+    print(f"Peak RSS: {results['peak_rss_bytes'] / 2**20:.1f} MB")
+    graph = results["graph"]
+    print(f"Graph: {graph['files']} files, {graph['nodes']} nodes, {graph['edges']} edges, "
+          f"{graph['cycles']} cycles listed")
+    for regression in regressions:
+        print(f"REGRESSION {regression['stage']}: {regression['baseline_seconds']:.4f}s -> "
+              f"{regression['seconds']:.4f}s ({regression['change']:+.0%})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on a synthetic repository.")
+    parser.add_argument("--files", type=int, default=BENCH_FILES, help="Python modules to generate")
+    parser.add_argument("--functions", type=int, default=BENCH_FUNCTIONS, help="Functions per module")
+    parser.add_argument("--import-density", type=float, default=BENCH_IMPORT_DENSITY,
+                        help="Average imports per module")
+    parser.add_argument("--cycle-density", type=float, default=BENCH_CYCLE_DENSITY,
+                        help="Fraction of modules with an import that closes a cycle")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the repository generator")
+    parser.add_argument("--repeat", type=int, default=BENCH_REPEAT, help="Timed runs per stage (median is reported)")
+    parser.add_argument("--workers", type=int, default=None, help="Analysis worker processes")
+    parser.add_argument("--max-nodes", type=int, default=0, help="max_nodes filter applied in filter_graph")
+    parser.add_argument("--search", default="", help="search_term filter applied in filter_graph")
+    parser.add_argument("--repo", help="Benchmark an existing directory instead of a generated one")
+    parser.add_argument("--no-startup", action="store_true", help="Skip timing the app's import in a fresh process")
+    parser.add_argument("--clone", metavar="URL", help="Compare full and sparse clones of a repository instead")
+    parser.add_argument("--branch", default="main", help="Branch cloned by --clone")
+    parser.add_argument("--subdir", default="", help="Subdirectory the sparse clone of --clone is limited to")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a results file written by --output")
+    parser.add_argument("--threshold", type=float, default=BENCH_THRESHOLD,
+                        help="Relative slowdown that counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=BENCH_MIN_DELTA,
+                        help="Absolute slowdown in seconds below which changes are ignored")
+    args = parser.parse_args(argv)
+
+    if args.clone:
+        results = compare_clone_modes(args.clone, args.branch, args.subdir, args.repeat)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        print(f"{'clone':<10}{'seconds':>10}{'files':>8}{'MB written':>12}")
+        for mode, data in results.items():
+            print(f"{mode:<10}{data['seconds']:>10.3f}{data['files']:>8}{data['bytes_written'] / 2**20:>12.2f}")
+        return 0
+
+    config = {key: getattr(args, key) for key in
+              ("files", "functions", "import_density", "cycle_density", "seed",
+               "repeat", "workers", "max_nodes", "search", "repo")}
+    filters = {"node_types": [], "edge_types": [], "search_term": args.search,
+               "max_nodes": args.max_nodes}
+
+    directory = args.repo
+    temp_dir = None
+    if directory is None:
+        temp_dir = tempfile.mkdtemp(prefix="cdb-bench-")
+        directory = temp_dir
+        generate_repository(directory, args.files, args.functions, args.import_density,
+                            args.cycle_density, args.seed)
+    try:
+        results = run_benchmark(directory, filters, args.repeat, args.workers)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if not args.no_startup:
+        # Not part of the pipeline total; tracked so slow imports show up as regressions
+        results["stages"]["startup"] = measure_startup(args.repeat)
+
+    results["config"] = config
+    results["environment"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("Warning: Baseline was recorded with a different configuration")
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.min_delta)
+        results["regressions"] = regressions
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print_report(results, regressions)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
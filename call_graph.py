@@ -0,0 +1,238 @@
+import os
+import ast
+
+# Call edge limits (override through environment variables; 0 disables a limit)
+CALL_MAX_FANOUT = int(os.environ.get("CALL_MAX_FANOUT", 50))
+CALL_MAX_FANIN = int(os.environ.get("CALL_MAX_FANIN", 200))
+
+def _dotted(node):
+    """Return "a.b.c" for a Name/Attribute chain, or None for other callees."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+class _SymbolCollector(ast.NodeVisitor):
+    """Collects definitions and call sites, tracking the enclosing scopes."""
+
+    def __init__(self, function_lines):
+        self.function_lines = function_lines
+        self.scope = []
+        self.symbols = {}
+        self.classes = []
+        self.calls = {}
+        self._caller = None
+
+    def _qualname(self, name):
+        return ".".join([part for _, part in self.scope] + [name])
+
+    def visit_ClassDef(self, node):
+        self.classes.append(self._qualname(node.name))
+        self.scope.append(("class", node.name))
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node):
+        qualname = self._qualname(node.name)
+        lines = [node.lineno] + [decorator.lineno for decorator in node.decorator_list]
+        start_line = next((line for line in lines if line in self.function_lines), None)
+        caller = self._caller
+        if start_line is not None:
+            self.symbols[qualname] = start_line
+            self._caller = qualname
+        self.scope.append(("function", node.name))
+        self.generic_visit(node)
+        self.scope.pop()
+        self._caller = caller
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node):
+        if self._caller is not None:
+            callee = _dotted(node.func)
+            if callee:
+                callees = self.calls.setdefault(self._caller, [])
+                if callee not in callees:
+                    callees.append(callee)
+        self.generic_visit(node)
+
+def extract_symbols(tree, functions):
+    """
+    Collect the symbols and call sites of a parsed module in one walk.
+
+    functions are lizard's function_info objects for the same source; AST
+    definitions are matched to them by line so symbols map onto the
+    function nodes of the graph. Returns a dict with:
+      'symbols': {qualified name ("f", "Class.method"): start line of the lizard function}
+      'classes': [qualified class names]
+      'calls':   {caller qualified name: [callee expressions ("f", "self.m", "mod.f")]}
+    """
+    if tree is None:
+        return {'symbols': {}, 'classes': [], 'calls': {}}
+    collector = _SymbolCollector({func.start_line for func in functions})
+    collector.visit(tree)
+    return {'symbols': collector.symbols, 'classes': collector.classes, 'calls': collector.calls}
+
+class SymbolIndex:
+    """
+    Global lookup tables for resolving call sites to function nodes.
+
+    Every file gets a table of its qualified definitions and a namespace of
+    the names its imports bind, so resolving a call is a few dictionary
+    lookups regardless of repository size.
+    """
+
+    def __init__(self, analysis_results, module_index):
+        self.module_index = module_index
+        self.symbols = {}
+        self.classes = {}
+        self.namespaces = {}
+        for file_info in analysis_results:
+            path = file_info['path']
+            self.symbols[path] = {qualname: f"{path}::{qualname}"
+                                  for qualname in file_info.get('symbols', {})}
+            self.classes[path] = set(file_info.get('classes', []))
+        for file_info in analysis_results:
+            self.namespaces[file_info['path']] = self._namespace(file_info)
+
+    def _namespace(self, file_info):
+        """Map the names bound by a file's imports to what they refer to."""
+        path = file_info['path']
+        namespace = {}
+        for import_info in file_info.get('imports', []):
+            aliases = import_info.get('aliases', {})
+            level = import_info.get('level', 0)
+            module = import_info['module']
+            if not import_info.get('names'):
+                if aliases:
+                    local, dotted = next(iter(aliases.items()))
+                    namespace[local] = ("dotted", dotted)
+                else:
+                    # "import a.b" binds "a"
+                    head = module.split(".")[0]
+                    namespace[head] = ("dotted", head)
+                continue
+
+            local_names = {name: name for name in import_info['names']}
+            local_names.update({imported: local for local, imported in aliases.items()})
+            for imported, local in local_names.items():
+                if imported == "*":
+                    continue
+                qualified = f"{module}.{imported}" if module else imported
+                if level:
+                    target = self.module_index.lookup_relative(qualified, level, path)
+                else:
+                    target = self.module_index.lookup(qualified, path)
+                if target:
+                    namespace[local] = ("module", target)
+                    continue
+                if level:
+                    source = self.module_index.lookup_relative(module, level, path)
+                else:
+                    source = self.module_index.lookup(module, path) if module else None
+                if source:
+                    namespace[local] = ("symbol", source, imported)
+        return namespace
+
+    def _lookup_in(self, path, qualname, depth=0):
+        """Find a function (or a class's __init__) by qualified name in a file."""
+        symbols = self.symbols.get(path)
+        if symbols is None:
+            return None
+        found = symbols.get(qualname)
+        if found:
+            return found
+        if qualname in self.classes[path]:
+            return symbols.get(qualname + ".__init__")
+        # Follow one re-export, such as "from .impl import f" in a package __init__
+        if depth < 2:
+            head, _, rest = qualname.partition(".")
+            binding = self.namespaces.get(path, {}).get(head)
+            if binding is not None:
+                return self._resolve_binding(binding, rest.split(".") if rest else [], path, depth + 1)
+        return None
+
+    def _resolve_binding(self, binding, rest, importer, depth=0):
+        kind = binding[0]
+        if kind == "symbol":
+            return self._lookup_in(binding[1], ".".join([binding[2]] + rest), depth)
+        if kind == "module":
+            return self._lookup_in(binding[1], ".".join(rest), depth) if rest else None
+        # A dotted module path: use the longest prefix that is an analyzed module
+        parts = binding[1].split(".") + rest
+        for i in range(len(parts) - 1, 0, -1):
+            target = self.module_index.lookup(".".join(parts[:i]), importer)
+            if target:
+                return self._lookup_in(target, ".".join(parts[i:]), depth)
+        return None
+
+    def resolve(self, path, caller, callee):
+        """
+        Resolve the callee expression of a call made in function caller
+        (a qualified name) of file path. Returns a node id or None.
+        """
+        symbols = self.symbols.get(path, {})
+        head, _, rest = callee.partition(".")
+
+        if head in ("self", "cls") and rest and "." not in rest:
+            # Method of the caller's class
+            owner = caller
+            while "." in owner:
+                owner = owner.rsplit(".", 1)[0]
+                if owner in self.classes[path]:
+                    return symbols.get(f"{owner}.{rest}")
+            return None
+
+        if not rest:
+            # A function nested in the caller
+            nested = symbols.get(f"{caller}.{callee}")
+            if nested:
+                return nested
+        local = self._lookup_in(path, callee, depth=2)
+        if local:
+            return local
+
+        binding = self.namespaces.get(path, {}).get(head)
+        if binding is None:
+            return None
+        return self._resolve_binding(binding, rest.split(".") if rest else [], path)
+
+def add_call_edges(graph, analysis_results, module_index, max_fanout=CALL_MAX_FANOUT,
+                   max_fanin=CALL_MAX_FANIN):
+    """
+    Add 'calls' edges between function nodes.
+
+    A function keeps at most max_fanout outgoing and max_fanin incoming call
+    edges, in source order; the number dropped is stored on the node as
+    'calls_truncated' / 'callers_truncated'.
+    """
+    index = SymbolIndex(analysis_results, module_index)
+    fanin = {}
+    for file_info in analysis_results:
+        path = file_info['path']
+        symbols = index.symbols[path]
+        for caller, callees in file_info.get('calls', {}).items():
+            caller_id = symbols.get(caller)
+            if caller_id is None or caller_id not in graph:
+                continue
+            targets = []
+            for callee in callees:
+                target = index.resolve(path, caller, callee)
+                if target and target != caller_id and target in graph and target not in targets:
+                    targets.append(target)
+            if max_fanout and len(targets) > max_fanout:
+                graph.nodes[caller_id]['calls_truncated'] = len(targets) - max_fanout
+                targets = targets[:max_fanout]
+            for target in targets:
+                if graph.has_edge(caller_id, target):
+                    continue
+                if max_fanin and fanin.get(target, 0) >= max_fanin:
+                    attrs = graph.nodes[target]
+                    attrs['callers_truncated'] = attrs.get('callers_truncated', 0) + 1
+                    continue
+                fanin[target] = fanin.get(target, 0) + 1
+                graph.add_edge(caller_id, target, type='calls')
@@ -0,0 +1,252 @@
+import numpy as np
+import networkx as nx
+from graph_metrics import DEPENDENCY_EDGE_TYPES, compute_metrics, metric_values
+
+# Bit positions for node and edge flags
+FLAG_BITS = {"in_cycle": 1}
+
+class StringTable:
+    """Interns strings and hands out stable integer indexes for them."""
+
+    def __init__(self, strings=None):
+        self.strings = []
+        self.index = {}
+        for string in strings or []:
+            self.add(string)
+
+    def add(self, string):
+        position = self.index.get(string)
+        if position is None:
+            position = len(self.strings)
+            self.index[string] = position
+            self.strings.append(string)
+        return position
+
+    def __len__(self):
+        return len(self.strings)
+
+def flags_to_mask(flags):
+    mask = 0
+    for flag in flags or []:
+        mask |= FLAG_BITS.get(flag, 0)
+    return mask
+
+def mask_to_flags(mask):
+    return [flag for flag, bit in FLAG_BITS.items() if mask & bit]
+
+class CompactGraph:
+    """
+    Array-backed directed graph for the analysis pipeline.
+
+    Node ids are interned into a list and addressed by position. Adjacency
+    is stored in CSR form (indptr/indices) and node and edge attributes are
+    typed NumPy columns: type codes, an index into a shared string table for
+    names and files, and flags as a bitmask. Attributes with no column are
+    kept in sparse per-node/per-edge dicts. Filters are computed as boolean
+    masks over these columns instead of Python loops over dicts.
+
+    Node metrics (see graph_metrics) are computed once per graph by
+    compute_metrics() and carried into subgraphs, so a filtered view ranks
+    its nodes by their importance in the whole graph.
+    """
+
+    def __init__(self, ids, indptr, indices, node_type, node_name, node_file, node_flags,
+                 edge_type, edge_flags, types, strings, node_extra=None, edge_extra=None,
+                 metrics=None):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.node_type = node_type
+        self.node_name = node_name
+        self.node_file = node_file
+        self.node_flags = node_flags
+        self.edge_type = edge_type
+        self.edge_flags = edge_flags
+        self.types = types
+        self.strings = strings
+        self.node_extra = node_extra or {}
+        self.edge_extra = edge_extra or {}
+        self.metrics = metrics
+        self._index = None
+
+    @property
+    def index(self):
+        """Mapping from node id to position, built on first use."""
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.ids)}
+        return self._index
+
+    def number_of_nodes(self):
+        return len(self.ids)
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Build a CompactGraph from a networkx DiGraph."""
+        types = StringTable(["unknown"])
+        strings = StringTable([""])
+        ids = list(graph.nodes)
+        index = {node: i for i, node in enumerate(ids)}
+        count = len(ids)
+
+        node_type = np.zeros(count, dtype=np.uint8)
+        node_name = np.zeros(count, dtype=np.int32)
+        node_file = np.full(count, -1, dtype=np.int32)
+        node_flags = np.zeros(count, dtype=np.uint8)
+        node_extra = {}
+        columns = ("type", "name", "file", "flags")
+        for i, (node, attrs) in enumerate(graph.nodes(data=True)):
+            node_type[i] = types.add(attrs.get("type", "unknown"))
+            node_name[i] = strings.add(attrs.get("name", node))
+            if "file" in attrs:
+                node_file[i] = strings.add(attrs["file"])
+            node_flags[i] = flags_to_mask(attrs.get("flags"))
+            extra = {key: value for key, value in attrs.items() if key not in columns}
+            if extra:
+                node_extra[i] = extra
+
+        edge_count = graph.number_of_edges()
+        sources = np.empty(edge_count, dtype=np.int32)
+        targets = np.empty(edge_count, dtype=np.int32)
+        edge_type = np.zeros(edge_count, dtype=np.uint8)
+        edge_flags = np.zeros(edge_count, dtype=np.uint8)
+        raw_extra = {}
+        for e, (source, target, attrs) in enumerate(graph.edges(data=True)):
+            sources[e] = index[source]
+            targets[e] = index[target]
+            edge_type[e] = types.add(attrs.get("type", "unknown"))
+            edge_flags[e] = flags_to_mask(attrs.get("flags"))
+            extra = {key: value for key, value in attrs.items() if key not in ("type", "flags")}
+            if extra:
+                raw_extra[e] = extra
+
+        # Sort edges by source to lay them out in CSR order
+        order = np.argsort(sources, kind="stable")
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=count), out=indptr[1:])
+        position = np.empty(edge_count, dtype=np.int64)
+        position[order] = np.arange(edge_count)
+        edge_extra = {int(position[e]): extra for e, extra in raw_extra.items()}
+
+        compact = cls(ids, indptr, targets[order], node_type, node_name, node_file, node_flags,
+                      edge_type[order], edge_flags[order], types, strings, node_extra, edge_extra)
+        compact._index = index
+        return compact
+
+    def edge_sources(self):
+        """Source node position of every edge, aligned with indices."""
+        return np.repeat(np.arange(len(self.ids), dtype=np.int32), np.diff(self.indptr))
+
+    def type_codes(self, type_names):
+        """Codes of the given type names that occur in this graph."""
+        return [self.types.index[name] for name in type_names if name in self.types.index]
+
+    def compute_metrics(self):
+        """Compute the node metrics unless already done. Returns them."""
+        if self.metrics is None:
+            sources = self.edge_sources()
+            complexity = np.zeros(len(self.ids))
+            for i, extra in self.node_extra.items():
+                complexity[i] = extra.get("complexity", 0)
+            self.metrics = compute_metrics(
+                self.indptr, self.indices, sources,
+                np.isin(self.edge_type, self.type_codes(DEPENDENCY_EDGE_TYPES)),
+                np.isin(self.edge_type, self.type_codes(["contains"])),
+                complexity)
+        return self.metrics
+
+    def subgraph(self, node_mask, edge_mask=None):
+        """
+        Return the graph induced by node_mask, optionally keeping only the
+        edges selected by edge_mask (aligned with indices).
+        """
+        sources = self.edge_sources()
+        keep_edges = node_mask[sources] & node_mask[self.indices]
+        if edge_mask is not None:
+            keep_edges &= edge_mask
+
+        # Renumber the surviving nodes
+        new_position = np.cumsum(node_mask) - 1
+        kept_nodes = np.flatnonzero(node_mask)
+        kept_edges = np.flatnonzero(keep_edges)
+        new_sources = new_position[sources[kept_edges]]
+        indptr = np.zeros(len(kept_nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(new_sources, minlength=len(kept_nodes)), out=indptr[1:])
+
+        old_to_new_edge = {int(old): new for new, old in enumerate(kept_edges)} if self.edge_extra else {}
+        return CompactGraph(
+            [self.ids[i] for i in kept_nodes],
+            indptr,
+            new_position[self.indices[kept_edges]].astype(np.int32),
+            self.node_type[kept_nodes],
+            self.node_name[kept_nodes],
+            self.node_file[kept_nodes],
+            self.node_flags[kept_nodes],
+            self.edge_type[kept_edges],
+            self.edge_flags[kept_edges],
+            self.types,
+            self.strings,
+            {new: self.node_extra[int(old)] for new, old in enumerate(kept_nodes) if int(old) in self.node_extra},
+            {old_to_new_edge[e]: extra for e, extra in self.edge_extra.items() if e in old_to_new_edge},
+            {key: values[kept_nodes] for key, values in self.metrics.items()} if self.metrics else None
+        )
+
+    def filter_types(self, node_types=None, edge_types=None):
+        """Keep only nodes and edges of the given types (empty means all)."""
+        node_mask = np.ones(len(self.ids), dtype=bool)
+        if node_types:
+            node_mask = np.isin(self.node_type, self.type_codes(node_types))
+        edge_mask = None
+        if edge_types:
+            edge_mask = np.isin(self.edge_type, self.type_codes(edge_types))
+        return self.subgraph(node_mask, edge_mask)
+
+    def top_k_by_importance(self, k):
+        """Keep the k nodes with the highest importance, computing metrics if needed."""
+        return self._top_k(k, self.compute_metrics()["importance"])
+
+    def _top_k(self, k, scores):
+        if k <= 0 or k >= len(self.ids):
+            return self
+        top = np.argpartition(-scores, k - 1)[:k]
+        node_mask = np.zeros(len(self.ids), dtype=bool)
+        node_mask[top] = True
+        return self.subgraph(node_mask)
+
+    def node_attrs(self, i):
+        """Attribute dict of the node at position i, in networkx form."""
+        attrs = {"type": self.types.strings[self.node_type[i]],
+                 "name": self.strings.strings[self.node_name[i]]}
+        if self.node_file[i] >= 0:
+            attrs["file"] = self.strings.strings[self.node_file[i]]
+        if self.node_flags[i]:
+            attrs["flags"] = mask_to_flags(self.node_flags[i])
+        attrs.update(self.node_extra.get(i, {}))
+        if self.metrics is not None:
+            attrs.update(metric_values(self.metrics, i))
+        return attrs
+
+    def to_networkx(self):
+        """
+        Build a networkx DiGraph for algorithms that still need one.
+
+        networkx stores graphs as nested dicts, so this is necessarily a copy;
+        filter the CompactGraph first so only the remaining part is converted.
+        """
+        graph = nx.DiGraph()
+        graph.add_nodes_from((node, self.node_attrs(i)) for i, node in enumerate(self.ids))
+        ids = self.ids
+        type_names = self.types.strings
+        edge_columns = zip(self.edge_sources().tolist(), self.indices.tolist(),
+                           self.edge_type.tolist(), self.edge_flags.tolist())
+        edges = []
+        for e, (source, target, type_code, flags) in enumerate(edge_columns):
+            attrs = {"type": type_names[type_code]}
+            if flags:
+                attrs["flags"] = mask_to_flags(flags)
+            attrs.update(self.edge_extra.get(e, {}))
+            edges.append((ids[source], ids[target], attrs))
+        graph.add_edges_from(edges)
+        return graph
@@ -0,0 +1,94 @@
+import os
+import time
+import networkx as nx
+
+# Cycle enumeration limits (override through environment variables)
+CYCLE_MAX_COUNT = int(os.environ.get("CYCLE_MAX_COUNT", 100))
+CYCLE_MAX_PER_COMPONENT = int(os.environ.get("CYCLE_MAX_PER_COMPONENT", 10))
+CYCLE_TIME_BUDGET = float(os.environ.get("CYCLE_TIME_BUDGET", 2.0))
+
+def cyclic_components(graph):
+    """Return the strongly connected components that contain a cycle, largest first."""
+    components = []
+    for component in nx.strongly_connected_components(graph):
+        if len(component) > 1:
+            components.append(component)
+        else:
+            node = next(iter(component))
+            if graph.has_edge(node, node):
+                components.append(component)
+    components.sort(key=len, reverse=True)
+    return components
+
+def _add_flag(attrs, flag):
+    flags = attrs.setdefault("flags", [])
+    if flag not in flags:
+        flags.append(flag)
+
+def detect_cycles(graph, max_cycles=None, max_per_component=None, time_budget=None):
+    """
+    Detect cycles in the dependency graph.
+
+    Strongly connected components are found in linear time and every node
+    and edge inside a cyclic component is flagged "in_cycle" (each such edge
+    lies on at least one cycle). Only a bounded number of representative
+    simple cycles is enumerated per component, within a global count and
+    time budget, since the total number of cycles can grow exponentially.
+
+    Returns the graph and a report dict with the representative cycles,
+    per-component sizes and whether enumeration was truncated.
+    """
+    if max_cycles is None:
+        max_cycles = CYCLE_MAX_COUNT
+    if max_per_component is None:
+        max_per_component = CYCLE_MAX_PER_COMPONENT
+    if time_budget is None:
+        time_budget = CYCLE_TIME_BUDGET
+
+    components = cyclic_components(graph)
+
+    # Mark nodes and edges inside cyclic components
+    for index, component in enumerate(components):
+        for node in component:
+            _add_flag(graph.nodes[node], "in_cycle")
+            graph.nodes[node]["scc"] = index
+            for target in graph.successors(node):
+                if target in component:
+                    _add_flag(graph.edges[(node, target)], "in_cycle")
+
+    # Enumerate a few representative cycles per component
+    deadline = time.monotonic() + time_budget
+    cycles = []
+    component_reports = []
+    truncated = False
+    for index, component in enumerate(components):
+        found = 0
+        component_truncated = False
+        if len(cycles) >= max_cycles or time.monotonic() >= deadline:
+            component_truncated = True
+        else:
+            remaining = nx.simple_cycles(graph.subgraph(component))
+            for cycle in remaining:
+                cycles.append(cycle)
+                found += 1
+                if time.monotonic() >= deadline:
+                    component_truncated = True
+                    break
+                if found >= max_per_component or len(cycles) >= max_cycles:
+                    # Truncated only if the component has another cycle left
+                    component_truncated = next(remaining, None) is not None
+                    break
+        truncated = truncated or component_truncated
+        component_reports.append({
+            "id": index,
+            "size": len(component),
+            "cycles_listed": found,
+            "truncated": component_truncated
+        })
+
+    report = {
+        "cycles": cycles,
+        "components": component_reports,
+        "truncated": truncated
+    }
+    return graph, report
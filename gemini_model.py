@@ -0,0 +1,31 @@
+import os
+from dotenv import load_dotenv
+from llm_cache import CachedModel, LazyModel, StubModel
+
+# Settings may come from a .env file
+load_dotenv()
+
+# Configure Gemini API
+GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_STUB_LATENCY = float(os.environ.get("GEMINI_STUB_LATENCY", 0.5))
+# GEMINI_MODEL=stub answers from a local stub model, for development without a key
+ANALYSIS_ONLY = os.environ.get("ANALYSIS_ONLY", "0") == "1" or (not GOOGLE_API_KEY and GEMINI_MODEL != "stub")
+
+def create_gemini_model():
+    """Import and configure the Gemini client; called on the first prompt."""
+    import google.generativeai as genai
+
+    genai.configure(api_key=GOOGLE_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+def create_default_model():
+    """
+    The configured model behind a response cache that also coalesces
+    identical concurrent prompts, or None in analysis-only mode.
+    """
+    if ANALYSIS_ONLY:
+        return None
+    if GEMINI_MODEL == "stub":
+        return CachedModel(StubModel(GEMINI_STUB_LATENCY))
+    return CachedModel(LazyModel(create_gemini_model, model_name=f"models/{GEMINI_MODEL}"))
@@ -1,6 +1,14 @@
 import networkx as nx
-import matplotlib.pyplot as plt
-import os
+import logging
+from import_resolver import ModuleIndex, parse_imports
+from call_graph import add_call_edges
+from graph_layout import layered_layout
+
+logger = logging.getLogger(__name__)
+
+def function_node_id(file_path, func):
+    """Node id of a function: its file and qualified name, e.g. "pkg/mod.py::Class.method"."""
+    return f"{file_path}::{func.get('qualname', func['name'])}"
 
 def build_dependency_graph(analysis_results):
     """Build a dependency graph from code analysis results."""
@@ -8,7 +16,7 @@ def build_dependency_graph(analysis_results):
     
     # No files analyzed
     if not analysis_results:
-        print("No files to build graph from")
+        logger.info("No files to build graph from")
         return G
     
     # Add nodes for each file
@@ -18,34 +26,45 @@ def build_dependency_graph(analysis_results):
         
         # Add nodes for each function
         for func in file_info.get('functions', []):
-            func_id = f"{file_path}::{func['name']}"
-            G.add_node(func_id, type='function', name=func['name'])
+            func_id = function_node_id(file_path, func)
+            G.add_node(func_id, type='function', name=func['name'], file=file_path,
+                       complexity=func.get('complexity', 1))
             
             # Connect file to function
             G.add_edge(file_path, func_id, type='contains')
     
-    # Try to infer dependencies between files
-    # This is a simplified approach - you might need more sophisticated parsing
+    # Resolve imports to analyzed files through a dotted-name index
+    module_index = ModuleIndex(file_info['path'] for file_info in analysis_results)
     for file_info in analysis_results:
         file_path = file_info['path']
-        with open(file_path, 'r', encoding='utf-8') as f:
+        imports = file_info.get('imports')
+        if imports is None:
+            # Results produced without import data; parse the file once here
             try:
-                content = f.read()
-                
-                # Look for import statements (very basic approach)
-                for other_file in analysis_results:
-                    other_name = os.path.splitext(other_file['name'])[0]
-                    if f"import {other_name}" in content or f"from {other_name}" in content:
-                        G.add_edge(file_path, other_file['path'], type='imports')
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    imports = parse_imports(f.read(), file_path)
             except Exception as e:
-                print(f"Error processing {file_path} for dependencies: {str(e)}")
+                logger.warning("Error processing %s for dependencies: %s", file_path, e)
+                continue
+
+        for import_info in imports:
+            for target in module_index.resolve(import_info, file_path):
+                if target != file_path:
+                    G.add_edge(file_path, target, type='imports')
+
+    # Resolve call sites between functions through the symbol index
+    add_call_edges(G, analysis_results, module_index)
     
-    print(f"Built graph with {len(G.nodes())} nodes and {len(G.edges())} edges")
+    logger.info("Built graph with %d nodes and %d edges", len(G.nodes()), len(G.edges()))
     return G
 
 def visualize_graph(graph):
+    # matplotlib is slow to import and only needed here
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(10, 6))
-    pos = nx.spring_layout(graph)
+    # Flip y so dependencies are drawn below their dependents
+    pos = {node: (x, -y) for node, (x, y) in layered_layout(graph).items()}
     nx.draw(graph, pos, with_labels=True, node_color="lightblue", edge_color="gray", node_size=3000, font_size=10)
     plt.show()
 
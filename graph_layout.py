@@ -0,0 +1,276 @@
+import os
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import networkx as nx
+
+# Layout settings (override through environment variables)
+LAYOUT_DEFAULT = os.environ.get("LAYOUT_DEFAULT", "none")
+LAYOUT_CACHE_SIZE = int(os.environ.get("LAYOUT_CACHE_SIZE", 32))
+LAYOUT_FORCE_MAX_NODES = int(os.environ.get("LAYOUT_FORCE_MAX_NODES", 1000))
+LAYOUT_FORCE_ITERATIONS = int(os.environ.get("LAYOUT_FORCE_ITERATIONS", 50))
+
+LAYOUTS = ("none", "layered", "force")
+
+# Distance between neighbouring nodes, in layout units
+NODE_SPACING = 100.0
+LAYER_SPACING = 120.0
+BARYCENTER_SWEEPS = 4
+# Strongly connected components larger than this are drawn as a grid
+CIRCLE_MAX_MEMBERS = 12
+# Rows of repulsion computed at once by the force layout, bounding its memory
+FORCE_BLOCK_ROWS = 512
+
+def _edge_arrays(graph, index):
+    """Source and target positions of the graph's edges, without self-loops."""
+    sources = np.fromiter((index[source] for source, _ in graph.edges()), dtype=np.int64,
+                          count=graph.number_of_edges())
+    targets = np.fromiter((index[target] for _, target in graph.edges()), dtype=np.int64,
+                          count=graph.number_of_edges())
+    keep = sources != targets
+    return sources[keep], targets[keep]
+
+def _ranks_within(groups, keys):
+    """Rank of every item among the items of its group, ordered by keys."""
+    order = np.lexsort((keys, groups))
+    ranks = np.empty(len(groups), dtype=np.int64)
+    sorted_groups = groups[order]
+    starts = np.searchsorted(sorted_groups, sorted_groups, side="left")
+    ranks[order] = np.arange(len(groups)) - starts
+    return ranks
+
+def layered_layout(graph, max_row=None):
+    """
+    Hierarchical layout for dependency graphs. Returns {node: (x, y)}.
+
+    Strongly connected components are condensed so the graph becomes a DAG,
+    and every component is put on the layer of its longest path from a
+    source, so dependencies sit below their dependents. Components are
+    ordered within their layer by a few barycenter sweeps, computed for all
+    layers at once with NumPy. Members of a component are spread on a
+    circle around its position. Layers holding more than max_row components
+    (by default about twice the square root of their number) wrap onto
+    extra rows to keep the drawing's aspect ratio usable. Components of more
+    than CIRCLE_MAX_MEMBERS members are laid out as a grid instead.
+    """
+    nodes = list(graph.nodes())
+    if not nodes:
+        return {}
+
+    components = list(nx.strongly_connected_components(graph))
+    component_of = {}
+    for c, members in enumerate(components):
+        for node in members:
+            component_of[node] = c
+    count = len(components)
+    # Component-level edges; edges inside a component become self-loops and are dropped
+    sources, targets = _edge_arrays(graph, component_of)
+    if len(sources):
+        pairs = np.unique(sources * count + targets)
+        sources, targets = pairs // count, pairs % count
+
+    # Longest-path layering over the condensed DAG, in topological order
+    dag = nx.DiGraph()
+    dag.add_nodes_from(range(count))
+    dag.add_edges_from(zip(sources.tolist(), targets.tolist()))
+    layer = np.zeros(count, dtype=np.int64)
+    for c in nx.topological_sort(dag):
+        for successor in dag.successors(c):
+            if layer[successor] < layer[c] + 1:
+                layer[successor] = layer[c] + 1
+
+    # Barycenter ordering: alternate sweeps against predecessors and successors
+    rank = _ranks_within(layer, np.arange(count))
+    layer_size = np.bincount(layer)
+    for sweep in range(BARYCENTER_SWEEPS):
+        position = (rank + 0.5) / layer_size[layer]
+        neighbours, owners = (sources, targets) if sweep % 2 == 0 else (targets, sources)
+        total = np.bincount(owners, weights=position[neighbours], minlength=count)
+        degree = np.bincount(owners, minlength=count)
+        barycenter = np.where(degree > 0, total / np.maximum(degree, 1), position)
+        rank = _ranks_within(layer, barycenter)
+
+    # Wrap wide layers onto several rows
+    if max_row is None:
+        max_row = max(8, int(2 * math.sqrt(count)))
+    rows_per_layer = (layer_size + max_row - 1) // max_row
+    first_row = np.concatenate(([0], np.cumsum(rows_per_layer)[:-1]))
+    row = first_row[layer] + rank // max_row
+    rank = rank % max_row
+
+    # Components take room for their members; place them left to right in each row
+    sizes = np.array([len(members) for members in components], dtype=np.float64)
+    circle_radius = np.maximum(NODE_SPACING * sizes / (2 * math.pi), NODE_SPACING / 2)
+    grid_radius = NODE_SPACING * np.ceil(np.sqrt(sizes)) / 2
+    radius = np.where(sizes > CIRCLE_MAX_MEMBERS, grid_radius,
+                      np.where(sizes > 1, circle_radius, 0.0))
+    width = 2 * radius + NODE_SPACING
+    order = np.lexsort((rank, row))
+    sorted_rows = row[order]
+    ends = np.cumsum(width[order])
+    row_starts = np.searchsorted(sorted_rows, sorted_rows, side="left")
+    before_row = np.concatenate(([0.0], ends))[row_starts]
+    center_x = np.empty(count)
+    center_x[order] = ends - before_row - width[order] / 2
+    row_count = int(row.max()) + 1
+    row_width = np.zeros(row_count)
+    np.maximum.at(row_width, row, center_x + width / 2)
+    center_x -= row_width[row] / 2
+
+    row_height = np.zeros(row_count)
+    np.maximum.at(row_height, row, 2 * radius)
+    row_top = np.concatenate(([0.0], np.cumsum(row_height + LAYER_SPACING)[:-1]))
+    center_y = row_top[row] + row_height[row] / 2
+
+    positions = {}
+    for c, members in enumerate(components):
+        if len(members) == 1:
+            positions[next(iter(members))] = (float(center_x[c]), float(center_y[c]))
+        elif len(members) <= CIRCLE_MAX_MEMBERS:
+            step = 2 * math.pi / len(members)
+            for i, node in enumerate(sorted(members)):
+                positions[node] = (float(center_x[c] + radius[c] * math.cos(i * step)),
+                                   float(center_y[c] + radius[c] * math.sin(i * step)))
+        else:
+            # Large tangles fill a square grid, in name order so related files stay close
+            columns = int(math.ceil(math.sqrt(len(members))))
+            left = center_x[c] - radius[c] + NODE_SPACING / 2
+            top = center_y[c] - radius[c] + NODE_SPACING / 2
+            for i, node in enumerate(sorted(members)):
+                positions[node] = (float(left + (i % columns) * NODE_SPACING),
+                                   float(top + (i // columns) * NODE_SPACING))
+    return positions
+
+def force_layout(graph, iterations=LAYOUT_FORCE_ITERATIONS, initial=None):
+    """
+    Fruchterman-Reingold force-directed layout on NumPy arrays.
+    Returns {node: (x, y)}.
+
+    Repulsion between all pairs is computed in blocks of FORCE_BLOCK_ROWS
+    rows, so memory stays linear in the node count while time is quadratic;
+    callers should keep it to graphs of a few thousand nodes. Starts from
+    initial ({node: (x, y)}, by default the layered layout) so the result
+    is deterministic.
+    """
+    nodes = list(graph.nodes())
+    n = len(nodes)
+    if n == 0:
+        return {}
+    if initial is None:
+        initial = layered_layout(graph)
+    index = {node: i for i, node in enumerate(nodes)}
+    pos = np.array([initial[node] for node in nodes], dtype=np.float64)
+    sources, targets = _edge_arrays(graph, index)
+
+    x, y = pos[:, 0].copy(), pos[:, 1].copy()
+
+    k = NODE_SPACING
+    temperature = max(float(np.ptp(x)), float(np.ptp(y)), k) / 10
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        move_x = np.empty(n)
+        move_y = np.empty(n)
+        for start in range(0, n, FORCE_BLOCK_ROWS):
+            stop = start + FORCE_BLOCK_ROWS
+            dx = x[start:stop, None] - x[None, :]
+            dy = y[start:stop, None] - y[None, :]
+            # Repulsion k^2 / d along the unit vector is delta * k^2 / d^2
+            strength = k * k / np.maximum(dx * dx + dy * dy, 0.01)
+            move_x[start:stop] = (dx * strength).sum(axis=1)
+            move_y[start:stop] = (dy * strength).sum(axis=1)
+        if len(sources):
+            dx = x[sources] - x[targets]
+            dy = y[sources] - y[targets]
+            # Attraction d^2 / k along the unit vector is delta * d / k
+            strength = np.sqrt(dx * dx + dy * dy) / k
+            move_x += np.bincount(targets, dx * strength, n) - np.bincount(sources, dx * strength, n)
+            move_y += np.bincount(targets, dy * strength, n) - np.bincount(sources, dy * strength, n)
+        length = np.sqrt(np.maximum(move_x * move_x + move_y * move_y, 0.01))
+        scale = np.minimum(length, temperature) / length
+        x += move_x * scale
+        y += move_y * scale
+        temperature -= cooling
+
+    x -= x.min()
+    y -= y.min()
+    return {node: (float(node_x), float(node_y)) for node, node_x, node_y in zip(nodes, x, y)}
+
+def graph_fingerprint(graph):
+    """Hash of a graph's node ids and edges, independent of insertion order."""
+    digest = hashlib.sha1()
+    for node in sorted(graph.nodes()):
+        digest.update(node.encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    digest.update(b"\1")
+    for source, target in sorted(graph.edges()):
+        digest.update(f"{source}\0{target}\0".encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+class LayoutCache:
+    """Least recently used layouts keyed by (algorithm, graph fingerprint)."""
+
+    def __init__(self, max_layouts=LAYOUT_CACHE_SIZE):
+        self.max_layouts = max_layouts
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._layouts.move_to_end(key)
+            return layout
+
+    def put(self, key, layout):
+        with self._lock:
+            self._layouts[key] = layout
+            self._layouts.move_to_end(key)
+            while len(self._layouts) > self.max_layouts:
+                self._layouts.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._layouts), "hits": self.hits, "misses": self.misses}
+
+_default_cache = LayoutCache()
+
+def get_default_layout_cache():
+    return _default_cache
+
+def apply_layout(graph, algorithm="layered", cache=None):
+    """
+    Compute node coordinates for a rendered graph and store them on its
+    nodes as 'x' and 'y'. Layouts are cached per graph structure, so
+    re-rendering the same view reuses them. The force layout falls back to
+    the layered one above LAYOUT_FORCE_MAX_NODES nodes.
+    Returns a dict describing the layout for the response.
+    """
+    cache = cache or _default_cache
+    if algorithm == "force" and graph.number_of_nodes() > LAYOUT_FORCE_MAX_NODES:
+        algorithm = "layered"
+    key = (algorithm, graph_fingerprint(graph))
+    positions = cache.get(key)
+    cached = positions is not None
+    if positions is None:
+        positions = force_layout(graph) if algorithm == "force" else layered_layout(graph)
+        cache.put(key, positions)
+
+    for node, (x, y) in positions.items():
+        attrs = graph.nodes[node]
+        attrs["x"] = round(x, 1)
+        attrs["y"] = round(y, 1)
+
+    xs = [x for x, _ in positions.values()] or [0.0]
+    ys = [y for _, y in positions.values()] or [0.0]
+    return {
+        "algorithm": algorithm,
+        "cached": cached,
+        "bounds": [round(min(xs), 1), round(min(ys), 1), round(max(xs), 1), round(max(ys), 1)]
+    }
@@ -0,0 +1,152 @@
+import os
+import numpy as np
+
+# Node metric settings (override through environment variables)
+METRICS_PAGERANK_DAMPING = float(os.environ.get("METRICS_PAGERANK_DAMPING", 0.85))
+METRICS_PAGERANK_ITERATIONS = int(os.environ.get("METRICS_PAGERANK_ITERATIONS", 100))
+METRICS_PAGERANK_TOLERANCE = 1e-8
+METRICS_BETWEENNESS_SAMPLES = int(os.environ.get("METRICS_BETWEENNESS_SAMPLES", 32))
+
+# Metrics attached to nodes, in response order
+METRIC_KEYS = ("fan_in", "fan_out", "complexity", "pagerank", "betweenness", "importance")
+# Metrics that add up when nodes are merged into a file or directory
+ADDITIVE_METRICS = ("complexity", "pagerank", "importance")
+
+# Share of each normalized metric in the importance score
+IMPORTANCE_WEIGHTS = {"pagerank": 0.35, "betweenness": 0.25, "degree": 0.25, "complexity": 0.15}
+
+# Edges that express a dependency; 'contains' only expresses where code lives
+DEPENDENCY_EDGE_TYPES = ("imports", "calls")
+
+def _pagerank(sources, targets, count, damping=METRICS_PAGERANK_DAMPING,
+              iterations=METRICS_PAGERANK_ITERATIONS, tolerance=METRICS_PAGERANK_TOLERANCE):
+    """
+    PageRank by power iteration. Each step is one sparse matrix-vector
+    product, done as a bincount over the edge arrays. Rank flows from a
+    dependent to its dependency, so widely used code ranks high.
+    """
+    if count == 0:
+        return np.zeros(0)
+    out_degree = np.bincount(sources, minlength=count).astype(np.float64)
+    dangling = out_degree == 0
+    inverse_degree = np.divide(1.0, out_degree, out=np.zeros(count), where=~dangling)
+    rank = np.full(count, 1.0 / count)
+    for _ in range(iterations):
+        flow = np.bincount(targets, weights=(rank * inverse_degree)[sources], minlength=count)
+        updated = (1 - damping) / count + damping * (flow + rank[dangling].sum() / count)
+        converged = np.abs(updated - rank).sum() < tolerance * count
+        rank = updated
+        if converged:
+            break
+    return rank
+
+def _betweenness(indptr, indices, count, samples=METRICS_BETWEENNESS_SAMPLES, seed=0):
+    """
+    Approximate betweenness centrality (Brandes' algorithm from a random
+    sample of source nodes, scaled up to all sources). Each breadth-first
+    search advances a whole frontier at a time with array operations.
+    """
+    betweenness = np.zeros(count)
+    if count == 0 or samples <= 0 or len(indices) == 0:
+        return betweenness
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(count, size=min(samples, count), replace=False)
+    out_degree = np.diff(indptr)
+
+    for source in chosen:
+        distance = np.full(count, -1, dtype=np.int64)
+        paths = np.zeros(count)
+        distance[source] = 0
+        paths[source] = 1.0
+        frontier = np.array([source])
+        levels = []
+        depth = 0
+        while len(frontier):
+            # All edges leaving the frontier
+            degrees = out_degree[frontier]
+            total = int(degrees.sum())
+            if total == 0:
+                break
+            offsets = np.repeat(indptr[frontier] - np.cumsum(degrees) + degrees, degrees)
+            edges = offsets + np.arange(total)
+            tails = np.repeat(frontier, degrees)
+            heads = indices[edges]
+
+            unseen = distance[heads] == -1
+            distance[heads[unseen]] = depth + 1
+            # Edges on shortest paths lead to nodes of the next level
+            on_path = distance[heads] == depth + 1
+            tails, heads = tails[on_path], heads[on_path]
+            paths += np.bincount(heads, weights=paths[tails], minlength=count)
+            levels.append((tails, heads))
+            frontier = np.unique(heads)
+            depth += 1
+
+        # Accumulate dependencies from the deepest level back to the source
+        dependency = np.zeros(count)
+        for tails, heads in reversed(levels):
+            share = paths[tails] / paths[heads] * (1 + dependency[heads])
+            dependency += np.bincount(tails, weights=share, minlength=count)
+        dependency[source] = 0
+        betweenness += dependency
+
+    return betweenness * (count / len(chosen))
+
+def _normalized(values):
+    peak = values.max() if len(values) else 0
+    return values / peak if peak > 0 else np.zeros_like(values, dtype=np.float64)
+
+def compute_metrics(indptr, indices, edge_sources, edge_is_dependency, edge_is_containment,
+                    complexity):
+    """
+    Compute per-node metrics of a graph given in CSR form.
+
+    Fan-in, fan-out, PageRank and betweenness use the dependency edges
+    (edge_is_dependency, a boolean mask aligned with indices). A node's
+    complexity is its own lizard complexity plus that of the nodes it
+    contains, so files carry the total of their functions. 'importance'
+    combines the normalized metrics with IMPORTANCE_WEIGHTS.
+    Returns a dict of arrays aligned with the nodes.
+    """
+    count = len(indptr) - 1
+    sources = edge_sources[edge_is_dependency]
+    targets = indices[edge_is_dependency]
+    fan_out = np.bincount(sources, minlength=count)
+    fan_in = np.bincount(targets, minlength=count)
+
+    contained = np.bincount(edge_sources[edge_is_containment],
+                            weights=complexity[indices[edge_is_containment]], minlength=count)
+    total_complexity = complexity + contained
+
+    # CSR of the dependency edges only, for the searches
+    order = np.argsort(sources, kind="stable")
+    dependency_indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(fan_out, out=dependency_indptr[1:])
+    dependency_indices = targets[order]
+
+    pagerank = _pagerank(sources, targets, count)
+    betweenness = _betweenness(dependency_indptr, dependency_indices, count)
+
+    importance = (IMPORTANCE_WEIGHTS["pagerank"] * _normalized(pagerank)
+                  + IMPORTANCE_WEIGHTS["betweenness"] * _normalized(betweenness)
+                  + IMPORTANCE_WEIGHTS["degree"] * _normalized((fan_in + fan_out).astype(np.float64))
+                  + IMPORTANCE_WEIGHTS["complexity"] * _normalized(total_complexity))
+    return {
+        "fan_in": fan_in,
+        "fan_out": fan_out,
+        "complexity": total_complexity,
+        "pagerank": pagerank,
+        "betweenness": betweenness,
+        "importance": importance
+    }
+
+def metric_values(metrics, i):
+    """Metrics of node i as plain Python numbers, rounded for responses."""
+    return {
+        "fan_in": int(metrics["fan_in"][i]),
+        "fan_out": int(metrics["fan_out"][i]),
+        "complexity": int(metrics["complexity"][i]),
+        "pagerank": round(float(metrics["pagerank"][i]), 8),
+        "betweenness": round(float(metrics["betweenness"][i]), 3),
+        "importance": round(float(metrics["importance"][i]), 6)
+    }
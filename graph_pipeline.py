@@ -0,0 +1,376 @@
+import heapq
+import logging
+import functools
+from cycle_detector import detect_cycles, CYCLE_TIME_BUDGET
+from graph_views import aggregate_graph, LEVELS
+from graph_layout import apply_layout, LAYOUTS, LAYOUT_DEFAULT
+from compact_graph import CompactGraph
+from graph_metrics import METRIC_KEYS
+from instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=65536)
+def shorten_path(path, preserve_namespace=False):
+    """Extract filename with optimal directory context."""
+    if not path:
+        return ""
+   
+    # Handle already shortened paths
+    if "/" not in path and "\\" not in path:
+        return path
+   
+    # Normalize path separators
+    normalized_path = path.replace('\\', '/')
+   
+    # Get the filename (last part)
+    parts = normalized_path.split('/')
+    filename = parts[-1]
+   
+    if not preserve_namespace:
+        return filename
+   
+    # Extract meaningful context - avoid full paths but keep useful structure
+    context_parts = []
+   
+    # Identify relevant path components
+    # Skip common non-meaningful directories
+    skip_dirs = {'src', 'lib', 'app', 'source', 'main', 'test', 'bin', 'build', 'dist','venv', 'env', 'virtualenv', 'node_modules'}
+   
+    # Start from the end (nearest to filename) and collect up to 2 meaningful directory names
+    i = len(parts) - 2  # Start with the directory containing the file
+    context_count = 0
+   
+    while i >= 0 and context_count < 2:
+        part = parts[i]
+        # Skip generic directory names and empty parts
+        if part and part.lower() not in skip_dirs:
+            context_parts.insert(0, part)
+            context_count += 1
+        i -= 1
+   
+    # Assemble the shortened path
+    if context_parts:
+        return "/".join(context_parts) + "/" + filename
+    else:
+        return filename
+
+# Filter options that must be integers
+INT_FILTERS = ("max_nodes", "depth", "hops")
+
+def _as_int(value):
+    """value as an int, or unchanged if it is not an integer (see int_error)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+def int_error(options, keys):
+    """Return an error message for the first of keys in options that is not an integer, else None."""
+    for key in keys:
+        if key in options and not isinstance(_as_int(options[key]), int):
+            return f"Invalid {key}, expected an integer"
+    return None
+
+def filters_from_json(data):
+    """Read graph filter options from a JSON request body."""
+    return {
+        "node_types": data.get("node_types", []),
+        "edge_types": data.get("edge_types", []),
+        "search_term": data.get("search_term", ""),
+        "max_nodes": _as_int(data.get("max_nodes", 0)),
+        "level": data.get("level", "function"),
+        "scope": data.get("scope", ""),
+        "depth": _as_int(data.get("depth", 1)),
+        "focus": data.get("focus", ""),
+        "hops": _as_int(data.get("hops", 1)),
+        "layout": data.get("layout", LAYOUT_DEFAULT)
+    }
+
+def filters_from_form(form):
+    """Read graph filter options from an uploaded form."""
+    return {
+        "node_types": form.getlist("node_types"),
+        "edge_types": form.getlist("edge_types"),
+        "search_term": form.get("search_term", ""),
+        "max_nodes": _as_int(form.get("max_nodes", 0)),
+        "level": form.get("level", "function"),
+        "scope": form.get("scope", ""),
+        "depth": _as_int(form.get("depth", 1)),
+        "layout": form.get("layout", LAYOUT_DEFAULT)
+    }
+
+def view_error(filters):
+    """Return an error message if the requested graph view is invalid, else None."""
+    if filters and filters.get("level", "function") not in LEVELS:
+        return f"Invalid level, expected one of: {', '.join(LEVELS)}"
+    if filters and filters.get("layout", LAYOUT_DEFAULT) not in LAYOUTS:
+        return f"Invalid layout, expected one of: {', '.join(LAYOUTS)}"
+    if filters:
+        return int_error(filters, INT_FILTERS)
+    return None
+
+def filter_graph(graph, filters):
+    """Filter the graph based on user-specified criteria."""
+    import networkx as nx
+   
+    filtered_graph = graph.copy()
+
+    # Keep only the neighborhood of a focus node
+    if filters.get("focus"):
+        focus = filters["focus"]
+        if focus not in filtered_graph:
+            return nx.DiGraph()
+        neighborhood = nx.ego_graph(filtered_graph, focus, radius=filters.get("hops", 1), undirected=True)
+        filtered_graph = filtered_graph.subgraph(neighborhood.nodes).copy()
+   
+    # Filter by node type
+    if filters["node_types"]:
+        nodes_to_remove = [n for n, attrs in filtered_graph.nodes(data=True)
+                         if attrs.get("type") not in filters["node_types"]]
+        filtered_graph.remove_nodes_from(nodes_to_remove)
+   
+    # Filter by edge type
+    if filters["edge_types"]:
+        edges_to_remove = [(s, t) for s, t, attrs in filtered_graph.edges(data=True)
+                         if attrs.get("type") not in filters["edge_types"]]
+        filtered_graph.remove_edges_from(edges_to_remove)
+   
+    # Filter by search term
+    if filters["search_term"]:
+        search_term = filters["search_term"].lower()
+        nodes_to_keep = [n for n, attrs in filtered_graph.nodes(data=True)
+                        if search_term in n.lower() or
+                           search_term in attrs.get("name", "").lower()]
+        # Also keep adjacent nodes for context
+        context_nodes = set()
+        for node in nodes_to_keep:
+            if node in filtered_graph:
+                context_nodes.update(nx.neighbors(filtered_graph, node))
+        nodes_to_keep.extend(context_nodes)
+        filtered_graph = filtered_graph.subgraph(nodes_to_keep).copy()
+   
+    # Limit number of nodes (keep the most important nodes, then the most connected)
+    if filters["max_nodes"] > 0 and len(filtered_graph) > filters["max_nodes"]:
+        # Select the top nodes with a heap
+        nodes_to_keep = heapq.nlargest(
+            filters["max_nodes"], filtered_graph.nodes,
+            key=lambda n: (filtered_graph.nodes[n].get("importance", 0), filtered_graph.degree(n)))
+        filtered_graph = filtered_graph.subgraph(nodes_to_keep).copy()
+   
+    return filtered_graph
+
+def calculate_edge_weights(graph):
+    """
+    Calculate edge weights based on relationship frequency and importance.
+
+    An edge's strength is the number of relationships it stands for times
+    the importance of the node it points to, so edges into the structurally
+    central parts of the code weigh most.
+    """
+    # Strength of each unique source-target pair
+    edge_counts = {}
+   
+    for source, target, attrs in graph.edges(data=True):
+        if (source, target) not in edge_counts:
+            edge_counts[(source, target)] = 0
+        # Aggregated views merge several relationships into one edge
+        edge_counts[(source, target)] += attrs.get("count", 1) * graph.nodes[target].get("importance", 1)
+   
+    # Normalize weights to a 1-10 scale
+    if edge_counts:
+        max_count = max(edge_counts.values())
+        min_count = min(edge_counts.values())
+        weight_range = max_count - min_count
+       
+        # Set weights on edges
+        for (source, target), count in edge_counts.items():
+            if max_count == min_count:
+                weight = 5  # Default middle weight if all edges have same strength
+            else:
+                # Scale to 1-10 range
+                weight = 1 + 9 * (count - min_count) / weight_range
+            graph.edges[(source, target)]["weight"] = weight
+   
+    return graph
+
+def log_graph_structure(graph):
+    """Log node and edge type counts of a rendered graph at debug level."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    node_types = {}
+    for node, attrs in graph.nodes(data=True):
+        node_type = attrs.get('type', 'unknown')
+        node_types[node_type] = node_types.get(node_type, 0) + 1
+    edge_types = {}
+    for source, target, attrs in graph.edges(data=True):
+        edge_type = attrs.get('type', 'unknown')
+        edge_types[edge_type] = edge_types.get(edge_type, 0) + 1
+    logger.debug("Graph structure: %d nodes %s, %d edges %s", graph.number_of_nodes(), node_types,
+                 graph.number_of_edges(), edge_types)
+
+def prefilter_compact(compact, filters, level, scope):
+    """
+    Apply the filters that have vectorized CompactGraph equivalents and
+    convert the remaining graph to networkx. max_nodes keeps the nodes with
+    the highest importance (see graph_metrics).
+    Returns (graph, remaining_filters).
+    """
+    remaining = dict(filters)
+    # Type and degree filters only commute with the full, unfocused view
+    if level == "function" and not scope and not filters.get("focus"):
+        if filters["node_types"] or filters["edge_types"]:
+            compact = compact.filter_types(filters["node_types"], filters["edge_types"])
+            remaining["node_types"] = []
+            remaining["edge_types"] = []
+        if filters["max_nodes"] > 0 and not filters["search_term"]:
+            compact = compact.top_k_by_importance(filters["max_nodes"])
+            remaining["max_nodes"] = 0
+    return compact.to_networkx(), remaining
+
+def render_graph(base_graph, filters=None, root=None, governor=None):
+    """
+    Apply a view and filters to an analyzed graph (a networkx DiGraph or a
+    CompactGraph), then weight edges and detect cycles. base_graph is left
+    untouched; node metrics are computed on it once and kept with it, so
+    later renders of a stored graph reuse them. With a governor, cycle enumeration gets at most the time
+    left in its budget and the layout is skipped once it has run out.
+    Returns (graph, cycle_report, extras).
+    """
+    if filters is None:
+        filters = {
+            "node_types": [],
+            "edge_types": [],
+            "search_term": "",
+            "max_nodes": 0
+        }
+
+    level = filters.get("level", "function")
+    scope = filters.get("scope", "")
+
+    # Filter a compact graph with array masks, then convert what is left
+    if not isinstance(base_graph, CompactGraph):
+        base_graph = CompactGraph.from_networkx(base_graph)
+    with stage("metrics") as record:
+        base_graph.compute_metrics()
+        record.nodes = base_graph.number_of_nodes()
+    with stage("prefilter"):
+        base_graph, filters = prefilter_compact(base_graph, filters, level, scope)
+
+    # Collapse to the requested level of detail before filtering
+    with stage("aggregate"):
+        graph = aggregate_graph(base_graph, level, scope, filters.get("depth", 1), root=root)
+
+    # Apply filters before processing
+    if (filters["node_types"] or filters["edge_types"] or filters["search_term"]
+            or filters.get("focus") or filters["max_nodes"] > 0):
+        with stage("filter") as record:
+            graph = filter_graph(graph, filters)
+            record.nodes = graph.number_of_nodes()
+            record.edges = graph.number_of_edges()
+
+    log_graph_structure(graph)
+
+    # Add weight calculation
+    with stage("edge_weights"):
+        graph = calculate_edge_weights(graph)
+   
+    # Detect cycles
+    time_budget = None
+    if governor is not None and governor.remaining_seconds() is not None:
+        time_budget = min(CYCLE_TIME_BUDGET, governor.remaining_seconds())
+    with stage("cycles"):
+        graph, cycle_report = detect_cycles(graph, time_budget=time_budget)
+    if cycle_report["truncated"] and time_budget is not None and time_budget < CYCLE_TIME_BUDGET:
+        governor.record("seconds", "cycles")
+
+    extras = {"view": {"level": level, "scope": scope}}
+
+    # Node coordinates, so clients can draw large graphs without laying them out
+    layout = filters.get("layout", LAYOUT_DEFAULT)
+    if layout != "none" and not (governor is not None and governor.check_time("layout")):
+        with stage("layout") as record:
+            extras["layout"] = apply_layout(graph, layout)
+            record.nodes = graph.number_of_nodes()
+   
+    # Add warning for large graphs
+    if len(graph.nodes()) > 100:
+        extras["warning"] = "Large graph detected. Rendering may take time."
+        if level != "directory":
+            extras["warning"] += " Request level 'directory' for an overview."
+
+    return graph, cycle_report, extras
+
+def display_names(node, attrs):
+    """Return the shortened (display_id, name) of a graph node."""
+    node_name = attrs.get('name', node)
+   
+    # Always shorten node representation
+    display_id = shorten_path(node, preserve_namespace=True)
+    if attrs.get('type') == 'file':
+        node_name = shorten_path(node_name, preserve_namespace=True)
+    return display_id, node_name
+
+def serialize_node(node, attrs):
+    """Convert a graph node to its JSON representation."""
+    display_id, node_name = display_names(node, attrs)
+    node_data = {
+        "id": node,
+        "display_id": display_id,
+        "type": attrs.get("type", "unknown"),
+        "name": node_name,
+        "flags": attrs.get("flags", [])
+    }
+
+    # Sizes of aggregated nodes, call edges dropped by the fan-in/out caps, metrics and layout coordinates
+    for key in ("file_count", "function_count", "external_edges", "calls_truncated", "callers_truncated",
+                *METRIC_KEYS, "x", "y"):
+        if key in attrs:
+            node_data[key] = attrs[key]
+    return node_data
+
+def serialize_edge(source, target, attrs):
+    """Convert a graph edge to its JSON representation."""
+    edge_data = {
+        "source": source,
+        "target": target,
+        "type": attrs.get("type", "unknown"),
+        "weight": attrs.get("weight", 1),
+        "flags": attrs.get("flags", [])
+    }
+
+    # Number of relationships an aggregated edge stands for
+    if "count" in attrs:
+        edge_data["count"] = attrs["count"]
+        edge_data["counts"] = attrs["counts"]
+    return edge_data
+
+def serialize_cycles(cycle_report):
+    """
+    Convert a cycle report to response fields: "cycles", the list of
+    representative cycles, plus "cycle_components" and "cycles_truncated".
+    """
+    cycles_with_shortened_paths = []
+    for cycle in cycle_report["cycles"]:
+        shortened_cycle = [shorten_path(node, preserve_namespace=True) for node in cycle]
+        cycles_with_shortened_paths.append({
+            "nodes": cycle,
+            "display_nodes": shortened_cycle,
+            "length": len(cycle)
+        })
+
+    return {
+        "cycles": cycles_with_shortened_paths,
+        "cycle_components": cycle_report["components"],
+        "cycles_truncated": cycle_report["truncated"]
+    }
+
+def serialize_graph(graph, cycle_report, extras):
+    """Convert a rendered graph to the JSON response format."""
+    graph_data = {
+        "nodes": [serialize_node(node, attrs) for node, attrs in graph.nodes(data=True)],
+        "edges": [serialize_edge(source, target, attrs) for source, target, attrs in graph.edges(data=True)]
+    }
+    graph_data.update(serialize_cycles(cycle_report))
+    graph_data.update(extras)
+    return graph_data
@@ -0,0 +1,74 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# Graph session settings (override through environment variables)
+GRAPH_SESSION_TTL = float(os.environ.get("GRAPH_SESSION_TTL", 1800))
+GRAPH_SESSION_MAX = int(os.environ.get("GRAPH_SESSION_MAX", 16))
+
+class GraphSession:
+    """An analyzed, unfiltered dependency graph kept for follow-up queries."""
+
+    def __init__(self, graph, root=None, metadata=None):
+        self.id = uuid.uuid4().hex
+        self.graph = graph
+        self.root = root
+        self.metadata = metadata or {}
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    def to_dict(self):
+        return {
+            "graph_id": self.id,
+            "node_count": self.graph.number_of_nodes(),
+            "edge_count": self.graph.number_of_edges(),
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+            "metadata": self.metadata
+        }
+
+class GraphSessionStore:
+    """
+    Keeps analyzed graphs in memory under an id so they can be re-filtered
+    without re-analysis. Sessions expire ttl seconds after their last use,
+    and the least recently used one is dropped when more than max_sessions
+    are stored. Stored graphs must be treated as read-only.
+    """
+
+    def __init__(self, ttl=GRAPH_SESSION_TTL, max_sessions=GRAPH_SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge_expired(self, now):
+        expired = [sid for sid, session in self._sessions.items() if now - session.last_used > self.ttl]
+        for sid in expired:
+            del self._sessions[sid]
+
+    def create(self, graph, root=None, metadata=None):
+        """Store a graph and return its GraphSession."""
+        session = GraphSession(graph, root, metadata)
+        with self._lock:
+            self._purge_expired(time.time())
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, graph_id):
+        """Return the session for graph_id and refresh its TTL, or None."""
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            session = self._sessions.get(graph_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(graph_id)
+            return session
+
+    def delete(self, graph_id):
+        with self._lock:
+            return self._sessions.pop(graph_id, None) is not None
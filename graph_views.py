@@ -0,0 +1,114 @@
+import os
+import networkx as nx
+from graph_metrics import ADDITIVE_METRICS
+
+LEVELS = ("directory", "file", "function")
+
+def graph_root(graph):
+    """Return the common directory of all file nodes in the graph."""
+    file_dirs = [os.path.dirname(node) for node, attrs in graph.nodes(data=True)
+                 if attrs.get("type") == "file"]
+    if not file_dirs:
+        return ""
+    try:
+        return os.path.commonpath(file_dirs)
+    except ValueError:
+        return ""
+
+def _relative(path, root):
+    rel = os.path.relpath(path, root) if root else path
+    return rel.replace("\\", "/")
+
+def _file_of(node, attrs):
+    """Path of the file a node belongs to."""
+    if attrs.get("type") == "file":
+        return node
+    return attrs.get("file") or node.split("::", 1)[0]
+
+def _in_scope(rel_path, scope):
+    return not scope or rel_path == scope or rel_path.startswith(scope + "/")
+
+def aggregate_graph(graph, level="function", scope="", depth=1, root=None):
+    """
+    Collapse the dependency graph to the requested level of detail.
+
+    level is "directory" (one node per directory, grouped depth levels
+    below scope), "file" (file nodes only) or "function" (the full graph).
+    scope, a directory relative to the analyzed root, limits the view to
+    the files under it so clients can drill into one part of a large repo.
+    Edges between grouped nodes are merged and carry a "count" of the
+    underlying edges plus a per-type breakdown in "counts". Edges that
+    leave the scope are dropped and tallied in the node's "external_edges".
+    Grouped nodes get the sum of their members' additive metrics.
+    """
+    if level not in LEVELS:
+        raise ValueError(f"Unknown level '{level}', expected one of {', '.join(LEVELS)}")
+    scope = (scope or "").strip("/")
+    if level == "function" and not scope:
+        return graph
+    if root is None:
+        root = graph_root(graph)
+
+    # Map every node to the node that represents it in the view (or None)
+    groups = {}
+    view = nx.DiGraph()
+    for node, attrs in graph.nodes(data=True):
+        rel_file = _relative(_file_of(node, attrs), root)
+        if not _in_scope(rel_file, scope):
+            groups[node] = None
+            continue
+
+        if level == "function":
+            group = node
+            if group not in view:
+                view.add_node(group, **attrs)
+        elif level == "file":
+            if attrs.get("type") != "file":
+                group = _file_of(node, attrs)
+            else:
+                group = node
+            if group not in view:
+                view.add_node(group, type="file", name=os.path.basename(group),
+                              function_count=0)
+        else:
+            parts = rel_file.split("/")[:-1]
+            scope_depth = len(scope.split("/")) if scope else 0
+            group = "/".join(parts[:scope_depth + depth]) or "."
+            if group not in view:
+                view.add_node(group, type="directory", name=group, file_count=0, function_count=0)
+
+        groups[node] = group
+        group_attrs = view.nodes[group]
+        if level != "function":
+            if attrs.get("type") == "file" and "file_count" in group_attrs:
+                group_attrs["file_count"] += 1
+            elif attrs.get("type") == "function":
+                group_attrs["function_count"] += 1
+            for key in ADDITIVE_METRICS:
+                # A file's complexity already includes its functions; add each function once
+                if key in attrs and not (key == "complexity" and attrs.get("type") == "file"):
+                    group_attrs[key] = round(group_attrs.get(key, 0) + attrs[key], 8)
+
+    # Merge edges between groups, counting how many each one stands for
+    for source, target, attrs in graph.edges(data=True):
+        group_source = groups.get(source)
+        group_target = groups.get(target)
+        if group_source is None:
+            continue
+        if group_target is None:
+            view.nodes[group_source]["external_edges"] = view.nodes[group_source].get("external_edges", 0) + 1
+            continue
+        if group_source == group_target:
+            continue
+
+        edge_type = attrs.get("type", "unknown")
+        if view.has_edge(group_source, group_target):
+            edge = view.edges[(group_source, group_target)]
+            edge["counts"][edge_type] = edge["counts"].get(edge_type, 0) + 1
+            edge["count"] += 1
+            edge["type"] = max(edge["counts"], key=edge["counts"].get)
+        else:
+            view.add_edge(group_source, group_target, type=edge_type, count=1,
+                          counts={edge_type: 1})
+
+    return view
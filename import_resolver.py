@@ -0,0 +1,171 @@
+import os
+import ast
+import logging
+
+logger = logging.getLogger(__name__)
+
+def parse_tree(code, file_path=""):
+    """Parse Python source into an AST, or return None if it does not parse."""
+    try:
+        return ast.parse(code)
+    except (SyntaxError, ValueError) as e:
+        logger.warning("Could not parse %s: %s", file_path, e)
+        return None
+
+def imports_from_tree(tree):
+    """
+    Extract the import statements of a parsed module.
+
+    Returns a list of dicts with the imported 'module' (dotted name, may be
+    empty for "from . import x"), the relative import 'level' and the
+    imported 'names' for from-imports. Names bound under another name are
+    listed in 'aliases' as {local name: imported name}; for "import a.b as c"
+    that is {"c": "a.b"}.
+    """
+    if tree is None:
+        return []
+
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                import_info = {'module': alias.name, 'level': 0, 'names': []}
+                if alias.asname:
+                    import_info['aliases'] = {alias.asname: alias.name}
+                imports.append(import_info)
+        elif isinstance(node, ast.ImportFrom):
+            import_info = {
+                'module': node.module or '',
+                'level': node.level,
+                'names': [alias.name for alias in node.names]
+            }
+            aliases = {alias.asname: alias.name for alias in node.names if alias.asname}
+            if aliases:
+                import_info['aliases'] = aliases
+            imports.append(import_info)
+    return imports
+
+def parse_imports(code, file_path=""):
+    """Extract the import statements of a Python source string (see imports_from_tree)."""
+    return imports_from_tree(parse_tree(code, file_path))
+
+def _module_parts(rel_path):
+    """Split a root-relative .py path into dotted module name components."""
+    parts = rel_path.replace('\\', '/')[:-len('.py')].split('/')
+    if parts[-1] == '__init__':
+        parts = parts[:-1]
+    return parts
+
+class ModuleIndex:
+    """
+    Lookup tables from dotted module names to analyzed file paths.
+
+    Files are registered under their dotted name relative to each plausible
+    source root above them: the analyzed root, and every directory that is
+    not a package itself but directly holds a top-level package (such as
+    "src"). Nested modules are not registered under bare suffixes of their
+    name, so "import logging" never resolves to some vendored
+    tools/vendor/logging.py. Relative imports resolve against the importing
+    file's location through a table keyed by path.
+    """
+
+    def __init__(self, file_paths, root=None):
+        file_paths = list(file_paths)
+        package_dirs = {os.path.normpath(os.path.dirname(p)) for p in file_paths
+                        if os.path.basename(p) == '__init__.py'}
+        if root is None:
+            root = os.path.commonpath([os.path.dirname(p) for p in file_paths]) if file_paths else ''
+            # A common directory that is itself a package is named by its parent
+            while root and os.path.normpath(root) in package_dirs:
+                parent = os.path.dirname(root)
+                if parent == root:
+                    break
+                root = parent
+        self.root = root
+        top = os.path.normpath(root)
+        parents = {d: os.path.normpath(os.path.dirname(d)) for d in package_dirs}
+        self.source_roots = {top} | {parent for parent in parents.values() if parent not in package_dirs}
+        self.by_name = {}
+        self.by_path = {}
+
+        for file_path in file_paths:
+            if not file_path.endswith('.py'):
+                continue
+            self.by_path[os.path.normpath(file_path)] = file_path
+            # Register the file under each source root above it, up to the analyzed root
+            directory = os.path.normpath(os.path.dirname(file_path))
+            while True:
+                if directory in self.source_roots:
+                    name = '.'.join(_module_parts(os.path.relpath(file_path, directory)))
+                    self.by_name.setdefault(name, []).append(file_path)
+                parent = os.path.normpath(os.path.dirname(directory))
+                if directory == top or parent == directory:
+                    break
+                directory = parent
+
+    def _pick(self, candidates, importer):
+        """Choose the candidate closest to the importing file."""
+        if len(candidates) == 1:
+            return candidates[0]
+        importer_dir = os.path.dirname(importer)
+        return max(candidates, key=lambda c: len(os.path.commonpath([importer_dir, os.path.dirname(c)])))
+
+    def lookup(self, name, importer):
+        """Resolve an absolute dotted module name, or return None."""
+        candidates = self.by_name.get(name)
+        if not candidates:
+            return None
+        return self._pick(candidates, importer)
+
+    def lookup_relative(self, name, level, importer):
+        """Resolve a module name relative to the importing file's package."""
+        base_dir = os.path.dirname(importer)
+        for _ in range(level - 1):
+            base_dir = os.path.dirname(base_dir)
+        module_dir = os.path.join(base_dir, *name.split('.')) if name else base_dir
+        for candidate in (module_dir + '.py', os.path.join(module_dir, '__init__.py')):
+            found = self.by_path.get(os.path.normpath(candidate))
+            if found:
+                return found
+        return None
+
+    def resolve(self, import_info, importer):
+        """
+        Return the set of analyzed files an import statement refers to.
+
+        "from pkg import mod" points at pkg/mod.py when that is a module and
+        at pkg/__init__.py otherwise. "import a.b.c" falls back to the
+        closest enclosing package that was analyzed.
+        """
+        module = import_info['module']
+        level = import_info.get('level', 0)
+
+        if level:
+            def find(name):
+                return self.lookup_relative(name, level, importer)
+        else:
+            def find(name):
+                return self.lookup(name, importer)
+
+        targets = set()
+        if import_info.get('names'):
+            for imported in import_info['names']:
+                if imported == '*':
+                    continue
+                target = find(f"{module}.{imported}" if module else imported)
+                if target:
+                    targets.add(target)
+            if len(targets) < len(import_info['names']):
+                target = find(module) if (module or level) else None
+                if target:
+                    targets.add(target)
+            return targets
+
+        parts = module.split('.')
+        while parts:
+            target = find('.'.join(parts))
+            if target:
+                targets.add(target)
+                break
+            parts.pop()
+        return targets
@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+import logging
+import threading
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+METRIC_PREFIX = "cdb_archtool_"
+
+# Log one in this many per-file events (override through environment variables)
+LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", 100))
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None if unknown."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+
+class StageRecord:
+    """Measurements of one run of a pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.files = None
+        self.bytes_read = None
+        self.nodes = None
+        self.edges = None
+
+    def to_dict(self):
+        data = {"stage": self.name, "seconds": self.seconds}
+        for key in ("files", "bytes_read", "nodes", "edges"):
+            if getattr(self, key) is not None:
+                data[key] = getattr(self, key)
+        if self.files and self.seconds > 0:
+            data["files_per_second"] = self.files / self.seconds
+        return data
+
+class MetricsRegistry:
+    """
+    Process-wide stage metrics, rendered in the Prometheus text format.
+
+    Durations are kept as a histogram per stage; files and bytes are
+    counters; graph size, throughput and peak RSS are gauges holding the
+    latest value. Collectors registered with add_collector are called on
+    every render and return (name, type, help, value) tuples for metrics
+    owned by other components, such as cache statistics.
+    """
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self._durations = {}
+        self._counters = {}
+        self._gauges = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, record):
+        with self._lock:
+            histogram = self._durations.get(record.name)
+            if histogram is None:
+                histogram = self._durations[record.name] = {
+                    "buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if record.seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += record.seconds
+
+            labels = (("stage", record.name),)
+            if record.files is not None:
+                self._add_counter("files_total", labels, record.files)
+                if record.seconds > 0:
+                    self._gauges[("files_per_second", labels)] = record.files / record.seconds
+            if record.bytes_read is not None:
+                self._add_counter("bytes_read_total", labels, record.bytes_read)
+            if record.nodes is not None:
+                self._gauges[("graph_nodes", labels)] = record.nodes
+            if record.edges is not None:
+                self._gauges[("graph_edges", labels)] = record.edges
+            rss = peak_rss_bytes()
+            if rss is not None:
+                self._gauges[("peak_rss_bytes", ())] = rss
+
+    def _add_counter(self, name, labels, value):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def increment(self, name, labels=(), value=1):
+        """Add value to a counter; labels is a tuple of (key, value) pairs."""
+        with self._lock:
+            self._add_counter(name, labels, value)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            name = METRIC_PREFIX + "stage_duration_seconds"
+            lines.append(f"# HELP {name} Duration of analysis pipeline stages")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self._durations.items()):
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum"]}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+            lines.extend(self._render_family(self._counters, "counter"))
+            lines.extend(self._render_family(self._gauges, "gauge"))
+
+        for collector in self._collectors:
+            try:
+                for metric, metric_type, help_text, value in collector():
+                    lines.append(f"# HELP {METRIC_PREFIX}{metric} {help_text}")
+                    lines.append(f"# TYPE {METRIC_PREFIX}{metric} {metric_type}")
+                    lines.append(f"{METRIC_PREFIX}{metric} {value}")
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_family(values, metric_type):
+        lines = []
+        for metric in sorted({name for name, _ in values}):
+            lines.append(f"# TYPE {METRIC_PREFIX}{metric} {metric_type}")
+            for (name, labels), value in sorted(values.items()):
+                if name != metric:
+                    continue
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                label_text = "{" + label_text + "}" if label_text else ""
+                lines.append(f"{METRIC_PREFIX}{metric}{label_text} {value}")
+        return lines
+
+REGISTRY = MetricsRegistry()
+
+_local = threading.local()
+
+def begin_trace():
+    """Start collecting the stages run by this thread (e.g. for one request)."""
+    _local.trace = []
+
+def end_trace():
+    """Stop collecting and return the StageRecords of the current trace."""
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    return trace or []
+
+@contextlib.contextmanager
+def stage(name, registry=REGISTRY):
+    """
+    Time a pipeline stage. The yielded StageRecord can be given files,
+    bytes_read, nodes and edges before the block ends. The record goes to
+    the registry, the current thread's trace and the log.
+    """
+    record = StageRecord(name)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        registry.observe(record)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.append(record)
+        if logger.isEnabledFor(logging.DEBUG):
+            details = ", ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                                for key, value in record.to_dict().items()
+                                if key not in ("stage", "seconds"))
+            logger.debug("Stage %s took %.3fs%s", name, record.seconds,
+                        f" ({details})" if details else "")
+
+def server_timing(records):
+    """Format StageRecords as a Server-Timing header value."""
+    return ", ".join(f"{record.name};dur={record.seconds * 1000:.1f}" for record in records)
+
+def sampled(every):
+    """
+    Return a function that is true once every `every` calls, for logging a
+    sample of per-item events. every <= 1 logs them all.
+    """
+    counter = [0]
+    lock = threading.Lock()
+
+    def should_log():
+        with lock:
+            counter[0] += 1
+            return every <= 1 or counter[0] % every == 1
+    return should_log
@@ -0,0 +1,140 @@
+import os
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job settings (override through environment variables)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", 32))
+JOB_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", 3600))
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running."""
+
+class Job:
+    """State of one background job, shared between the worker and the API."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.progress = {"files_scanned": 0, "files_total": 0}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def check_cancelled(self):
+        """Abort the running job if cancellation was requested."""
+        if self.cancelled:
+            raise JobCancelled()
+
+    def update_progress(self, files_scanned, files_total):
+        """Progress callback for the analysis pipeline; also a cancellation point."""
+        self.progress = {"files_scanned": files_scanned, "files_total": files_total}
+        self.check_cancelled()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool and keeps their results for a while.
+
+    Job functions are called as fn(job, *args, **kwargs) and should report
+    progress through job.update_progress(), which raises JobCancelled once
+    the job is cancelled. Finished jobs expire result_ttl seconds after they
+    complete.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, result_ttl=JOB_RESULT_TTL):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn to run in the background and return its Job."""
+        self.purge_expired()
+        job = Job()
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if not j.finished)
+            if active >= self.max_pending:
+                raise JobQueueFull(f"Too many analysis jobs in progress ({active})")
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            # Cancelled while queued, after the future could no longer be cancelled
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.exception("Job %s failed: %s", job.id, e)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        """Return the job with the given id, or None if unknown or expired."""
+        self.purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation of a job. Returns the job, or None if unknown."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job._cancelled.set()
+        # Jobs that never started can be dropped from the queue right away
+        if job.future is not None and job.future.cancel():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+        return job
+
+    def purge_expired(self):
+        """Forget finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
@@ -1,52 +1,288 @@
+"""
+Analysis of Python source files with lizard and the AST.
+
+Large batches are analyzed in worker processes started by a fork server
+(or spawned), which import the main module of the program again. Scripts
+that call analyze_files, analyze_sources or analyze_codebase must
+therefore keep their entry point under an if __name__ == "__main__" guard.
+"""
 import os
 import lizard
 import logging
-logging.basicConfig(level=logging.DEBUG)
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from import_resolver import parse_tree, imports_from_tree
+from call_graph import extract_symbols
+from source_walker import walk_sources
+from instrumentation import sampled, LOG_SAMPLE_EVERY
+
+logger = logging.getLogger(__name__)
+
+# Per-file debug messages are sampled so large trees do not flood the log
+_log_file = sampled(LOG_SAMPLE_EVERY)
+
+def _available_cpus():
+    """CPUs this process may run on, which can be fewer than the machine has."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Parallel analysis settings (override through environment variables)
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", _available_cpus()))
+PARALLEL_MIN_FILES = int(os.environ.get("PARALLEL_MIN_FILES", 200))
+ANALYSIS_CHUNK_SIZE = int(os.environ.get("ANALYSIS_CHUNK_SIZE", 0))
+
+def find_source_files(directory):
+    """
+    Collect the paths of the Python files under the given directory, skipping
+    ignored directories, large files and generated code (see walk_sources).
+    """
+    return walk_sources(directory).paths
+
+def analyze_source(file_path, code):
+    """Analyze source code that belongs to file_path and return its file_info dict."""
+    # Analyze the code with lizard
+    analysis = lizard.analyze_file.analyze_source_code(file_path, code)
+
+    # Parse once for imports, definitions and call sites
+    tree = parse_tree(code, file_path)
+
+    # Extract file information
+    file_info = {
+        'path': file_path,
+        'name': os.path.basename(file_path),
+        'functions': [],
+        'imports': imports_from_tree(tree)
+    }
+    file_info.update(extract_symbols(tree, analysis.function_list))
+    # lizard names methods without their class; the AST gives the qualified name
+    qualnames = {line: qualname for qualname, line in file_info['symbols'].items()}
+
+    # Extract function information
+    for func in analysis.function_list:
+        function_info = {
+            'name': func.name,
+            'qualname': qualnames.get(func.start_line, func.name),
+            'start_line': func.start_line,
+            'end_line': func.end_line,
+            'complexity': func.cyclomatic_complexity,
+            'parameters': func.parameters
+        }
+        file_info['functions'].append(function_info)
+
+    return file_info
+
+def analyze_file(file_path):
+    """Analyze a single file, returning its file_info dict or None on error."""
+    if logger.isEnabledFor(logging.DEBUG) and _log_file():
+        logger.debug("Analyzing file: %s", file_path)
+
+    try:
+        try:
+            code = lizard.auto_read(file_path)
+        except UnicodeDecodeError:
+            # Keep undecodable files in the graph as empty files, like lizard does
+            logger.warning("Unsupported encoding in %s", file_path)
+            code = ''
+        return analyze_source(file_path, code)
+    except Exception as e:
+        logger.warning("Error analyzing %s: %s", file_path, e)
+        return None
+
+def decode_source(data):
+    """Decode raw file contents the way lizard.auto_read does."""
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('utf8', 'ignore')
+
+def analyze_source_bytes(source):
+    """Analyze an in-memory (path, bytes) source, returning file_info or None on error."""
+    file_path, data = source
+    if logger.isEnabledFor(logging.DEBUG) and _log_file():
+        logger.debug("Analyzing file: %s", file_path)
+
+    try:
+        return analyze_source(file_path, decode_source(data))
+    except Exception as e:
+        logger.warning("Error analyzing %s: %s", file_path, e)
+        return None
+
+# Worker pools by size, kept for the life of the process
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool(workers):
+    """
+    Return the shared process pool with the given number of workers.
+
+    The server runs analyses from several threads, and forking a threaded
+    process can copy a lock another thread holds (such as the logging lock)
+    into the child, deadlocking it. Workers are therefore started by a fork
+    server (spawned where that is unavailable), once per pool.
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            context = multiprocessing.get_context(method)
+            if method == "forkserver":
+                # Import the analysis code once in the fork server instead of in every worker
+                context.set_forkserver_preload(["lizard_parser"])
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pools[workers] = pool
+        return pool
 
-def analyze_codebase(directory):
+def _chunk_size(file_count, workers):
+    """Pick a chunk size that gives each worker a few batches to balance load."""
+    if ANALYSIS_CHUNK_SIZE > 0:
+        return ANALYSIS_CHUNK_SIZE
+    return max(1, file_count // (workers * 4))
+
+def _run_analysis(items, analyze, workers, chunk_size, on_file=None, stop=None):
+    """Run analyze over items, returning a list aligned with them (None for failures)."""
+    if workers <= 1 or len(items) < PARALLEL_MIN_FILES:
+        analyzed = []
+        for item in items:
+            analyzed.append(analyze(item))
+            if on_file:
+                on_file()
+            if stop and stop():
+                break
+        return analyzed
+
+    workers = min(workers, len(items))
+    if chunk_size is None:
+        chunk_size = _chunk_size(len(items), workers)
+    # executor.map yields in submission order, so output is deterministic
+    pool = _pool(workers)
+    results = pool.map(analyze, items, chunksize=chunk_size)
+    try:
+        analyzed = []
+        for file_info in results:
+            analyzed.append(file_info)
+            if on_file:
+                on_file()
+            if stop and stop():
+                break
+        return analyzed
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool next time
+        with _pools_lock:
+            if _pools.get(workers) is pool:
+                del _pools[workers]
+        raise
+    finally:
+        # Drop queued chunks if on_file aborted the run or stop ended it
+        results.close()
+
+def _read_file(file_path):
+    """Return the raw contents of a file, or None if it cannot be read."""
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        logger.warning("Error reading %s: %s", file_path, e)
+        return None
+
+def _analyze_batch(items, paths, analyze, read_content, workers, chunk_size, cache, progress, stop=None):
+    """
+    Shared driver for analyze_files and analyze_sources. Without a cache
+    every item is passed to analyze; with one, each item is read once with
+    read_content for its cache key, and misses are analyzed from those bytes.
+    """
+    if workers is None:
+        workers = ANALYSIS_WORKERS
+
+    total = len(items)
+    scanned = 0
+
+    def on_file():
+        nonlocal scanned
+        scanned += 1
+        if progress:
+            progress(scanned, total)
+
+    if progress:
+        progress(0, total)
+
+    if cache is None:
+        analyzed = _run_analysis(items, analyze, workers, chunk_size, on_file, stop)
+        return [file_info for file_info in analyzed if file_info is not None]
+
+    # Serve unchanged files from the cache and collect the rest, with the bytes already read
+    analyzed = [None] * total
+    keys = [None] * total
+    pending = []
+    pending_sources = []
+    for index, item in enumerate(items):
+        if stop and stop():
+            break
+        content = read_content(item)
+        if content is not None:
+            keys[index] = cache.key_for(content)
+            analyzed[index] = cache.get(keys[index], paths[index])
+            if analyzed[index] is None:
+                pending.append(index)
+                pending_sources.append((paths[index], content))
+                continue
+        on_file()
+
+    fresh = []
+    if not (stop and stop()):
+        fresh = _run_analysis(pending_sources, analyze_source_bytes, workers, chunk_size, on_file, stop)
+    for index, file_info in zip(pending, fresh):
+        if file_info is not None:
+            cache.put(keys[index], file_info)
+            analyzed[index] = file_info
+
+    hits = sum(1 for key in keys if key is not None) - len(pending)
+    logger.info("Analysis cache: %d hits, %d misses", hits, len(pending))
+    return [file_info for file_info in analyzed if file_info is not None]
+
+def analyze_files(file_paths, workers=None, chunk_size=None, cache=None, progress=None, stop=None):
+    """
+    Analyze a list of files, in parallel when it is worth it.
+
+    Results are returned in the same order as file_paths. Files that fail to
+    parse are skipped. Small batches (fewer than PARALLEL_MIN_FILES files) or
+    workers <= 1 run serially, since pool startup would cost more than it saves.
+    If an AnalysisCache is given, only files missing from it are analyzed.
+    progress, if given, is called as progress(files_scanned, files_total)
+    after each file; an exception raised from it aborts the analysis.
+    stop, if given, is called after each file; once it returns True the
+    remaining files are skipped and the results so far are returned.
+    """
+    return _analyze_batch(file_paths, file_paths, analyze_file, _read_file,
+                          workers, chunk_size, cache, progress, stop)
+
+def analyze_sources(sources, workers=None, chunk_size=None, cache=None, progress=None, stop=None):
+    """
+    Analyze in-memory sources given as a list of (path, bytes) pairs.
+
+    Behaves like analyze_files, but nothing is read from disk; the paths are
+    only used to name the results.
+    """
+    return _analyze_batch(sources, [path for path, _ in sources], analyze_source_bytes,
+                          lambda source: source[1], workers, chunk_size, cache, progress, stop)
+
+def analyze_codebase(directory, workers=None, chunk_size=None, cache=None, progress=None):
     """Analyze all code files in the given directory."""
     results = []
-    
+
     # Check if directory exists
     if not os.path.exists(directory):
-        print(f"Directory not found: {directory}")
+        logger.warning("Directory not found: %s", directory)
         return results
-        
+
     # Walk through all files in the directory
-    for root, _, files in os.walk(directory):
-        for file in files:
-            # Check for Python files
-            if file.endswith('.py'):
-                file_path = os.path.join(root, file)
-                print(f"Analyzing file: {file_path}")
-                
-                try:
-                    # Analyze the file with lizard
-                    analysis = lizard.analyze_file(file_path)
-                    
-                    # Extract file information
-                    file_info = {
-                        'path': file_path,
-                        'name': file,
-                        'functions': []
-                    }
-                    
-                    # Extract function information
-                    for func in analysis.function_list:
-                        function_info = {
-                            'name': func.name,
-                            'start_line': func.start_line,
-                            'end_line': func.end_line,
-                            'complexity': func.cyclomatic_complexity,
-                            'parameters': func.parameters
-                        }
-                        file_info['functions'].append(function_info)
-                    
-                    results.append(file_info)
-                except Exception as e:
-                    print(f"Error analyzing {file_path}: {str(e)}")
-    
-    print(f"Found {len(results)} files with code")
+    file_paths = find_source_files(directory)
+    results = analyze_files(file_paths, workers=workers, chunk_size=chunk_size, cache=cache,
+                            progress=progress)
+
+    logger.info("Found %d files with code", len(results))
     return results
 
 # Example usage
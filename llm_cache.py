@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Response cache settings (override through environment variables)
+GEMINI_CACHE_TTL = float(os.environ.get("GEMINI_CACHE_TTL", 3600))
+GEMINI_CACHE_MAX_ENTRIES = int(os.environ.get("GEMINI_CACHE_MAX_ENTRIES", 256))
+GEMINI_CACHE_DIR = os.environ.get("GEMINI_CACHE_DIR", "")
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+class LazyModel:
+    """
+    Model client created by factory on the first generate_content call, so
+    importing and configuring the client library stays off the startup path.
+    """
+
+    def __init__(self, factory, model_name=""):
+        self.factory = factory
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.factory()
+        return self._model.generate_content(prompt)
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+class StubModel:
+    """
+    Local stand-in for a model client, for development and load tests
+    without an API key. Every call sleeps latency seconds, fails with
+    probability failure_rate, and otherwise answers with a short
+    description of the prompt.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.model_name = "stub"
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.failure_rate
+        time.sleep(self.latency)
+        if fail:
+            raise RuntimeError("Stub model failure")
+        lines = [line for line in prompt.splitlines() if line.strip()]
+        subject = next((line for line in lines if line.startswith(("Part:", "## "))), lines[0] if lines else "")
+        return _StubResponse(f"Stub summary of {subject.lstrip('# ')} ({len(lines)} prompt lines).")
+
+class _InFlight:
+    """An upstream call that concurrent identical requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.text = None
+        self.error = None
+
+class CachedModel:
+    """
+    Caching wrapper around a generative model client.
+
+    model is any object with a generate_content(prompt) method returning a
+    response with a .text attribute, such as google.generativeai's
+    GenerativeModel or a local stub. Responses are cached by a hash of the
+    normalized prompt in an in-memory LRU with a TTL, and optionally in a
+    directory on disk that survives restarts. Concurrent calls with the same
+    prompt share one upstream request (single flight). Errors are passed
+    to every waiting caller and never cached.
+    """
+
+    def __init__(self, model, model_name="", ttl=GEMINI_CACHE_TTL,
+                 max_entries=GEMINI_CACHE_MAX_ENTRIES, cache_dir=GEMINI_CACHE_DIR):
+        self.model = model
+        self.model_name = model_name or getattr(model, "model_name", "")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir or None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(self, prompt):
+        digest = hashlib.sha256(f"{self.model_name}\0{normalize_prompt(prompt)}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _get_memory(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, text = entry
+        if now - created_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return text
+
+    def _put_memory(self, key, text, created_at):
+        self._entries[key] = (created_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _get_disk(self, key, now):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - entry["created_at"] > self.ttl:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def _put_disk(self, key, text, created_at):
+        if not self.cache_dir:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"created_at": created_at, "text": text}, f)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            logger.warning("Could not write response cache entry: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def generate_text(self, prompt):
+        """Return the model's text response for prompt, from cache when possible."""
+        key = self.key_for(prompt)
+        now = time.time()
+
+        with self._lock:
+            text = self._get_memory(key, now)
+            if text is not None:
+                self.hits += 1
+                return text
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _InFlight()
+                self._in_flight[key] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Another request is already asking the model for this prompt
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.text
+
+        try:
+            entry = self._get_disk(key, now)
+            if entry is not None:
+                text, created_at = entry["text"], entry["created_at"]
+                with self._lock:
+                    self.hits += 1
+            else:
+                with self._lock:
+                    self.misses += 1
+                text = self.model.generate_content(prompt).text
+                created_at = time.time()
+                self._put_disk(key, text, created_at)
+
+            with self._lock:
+                self._put_memory(key, text, created_at)
+            flight.text = text
+            return text
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries)
+            }
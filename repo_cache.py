@@ -0,0 +1,309 @@
+import os
+import re
+import stat
+import shutil
+import hashlib
+import tempfile
+import threading
+import logging
+import git
+from source_walker import SOURCE_EXTENSIONS, IGNORE_FILES
+
+logger = logging.getLogger(__name__)
+
+# Clone cache settings (override through environment variables)
+REPO_CACHE_ENABLED = os.environ.get("REPO_CACHE", "1") != "0"
+REPO_CACHE_DIR = os.environ.get(
+    "REPO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cdb-archtool-repos"))
+REPO_CACHE_MAX_BYTES = int(os.environ.get("REPO_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+_SHA_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+# Files a sparse checkout fetches: analyzable sources and the ignore files the walker reads
+SPARSE_FILE_PATTERNS = tuple("*" + extension for extension in SOURCE_EXTENSIONS) + IGNORE_FILES
+
+def normalize_subdir(subdir):
+    """Return subdir as a clean relative path ("" for the whole repository)."""
+    subdir = (subdir or "").replace("\\", "/").strip("/")
+    if subdir and (os.path.isabs(subdir) or ".." in subdir.split("/")):
+        raise ValueError(f"Invalid subdirectory: {subdir}")
+    return subdir
+
+def sparse_patterns(subdir=""):
+    """Non-cone sparse-checkout patterns that select the analyzable files under subdir."""
+    subdir = normalize_subdir(subdir)
+    if not subdir:
+        return list(SPARSE_FILE_PATTERNS)
+    return [f"/{subdir}/**/{pattern}" for pattern in SPARSE_FILE_PATTERNS]
+
+def sparse_checkout(repo, subdir=""):
+    """
+    Populate the working tree of repo (created with no checkout) with only
+    the files matched by sparse_patterns(subdir) at HEAD. In a blobless
+    clone, git fetches just those blobs, in one batch.
+
+    The sparse settings are passed for this one command instead of being
+    stored, because storing them per worktree would switch the shared
+    mirror to per-worktree config, which GitPython cannot read. Checkouts
+    are never updated afterwards, so nothing else needs them.
+    """
+    patterns_path = os.path.join(repo.working_tree_dir,
+                                 repo.git.rev_parse("--git-path", "info/sparse-checkout"))
+    os.makedirs(os.path.dirname(patterns_path), exist_ok=True)
+    with open(patterns_path, "w") as f:
+        f.write("\n".join(sparse_patterns(subdir)) + "\n")
+    repo.git(c=["core.sparseCheckout=true", "core.sparseCheckoutCone=false"]).read_tree("-mu", "HEAD")
+
+def clone_sparse(repo_url, directory, branch, subdir=""):
+    """
+    Shallow, blobless clone of branch into directory that checks out only
+    the analyzable files. Returns the git.Repo.
+    """
+    repo = git.Repo.clone_from(repo_url, directory, branch=branch, depth=1,
+                               filter="blob:none", no_checkout=True)
+    sparse_checkout(repo, subdir)
+    return repo
+
+def _directory_size(path):
+    """Total size in bytes of the files under path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def _remove_tree(path):
+    def handle_remove_readonly(func, path, exc_info):
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+    shutil.rmtree(path, onerror=handle_remove_readonly)
+
+class RepoCache:
+    """
+    Managed cache of bare mirrors and per-commit worktrees.
+
+    Each repository URL gets one bare mirror, created with a blobless clone
+    (history only; file contents are fetched when a worktree needs them)
+    the first time and refreshed with a fetch afterwards. Branches are
+    resolved to a commit SHA and checked out into a worktree named after the
+    SHA, so repeat analyses of an unchanged branch reuse the existing
+    checkout. Sparse worktrees hold only the analyzable files, optionally
+    under one subdirectory, and are named <sha>-sparse-<subdir hash>.
+    Worktrees in use are reference counted; the least recently used
+    worktrees, and then mirrors, are evicted once the cache exceeds max_bytes.
+
+    Layout: <cache_dir>/<url hash>/mirror.git and <url hash>/worktrees/<sha>.
+    """
+
+    def __init__(self, cache_dir=REPO_CACHE_DIR, max_bytes=REPO_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._repo_locks = {}
+        self._in_use = {}
+        self._repo_urls = {}
+        # Sizes of mirrors and worktrees; worktrees never change once created
+        self._sizes = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _repo_dir(self, repo_url):
+        return os.path.join(self.cache_dir, hashlib.sha1(repo_url.encode()).hexdigest()[:16])
+
+    def _repo_lock(self, repo_url):
+        with self._lock:
+            return self._repo_locks.setdefault(repo_url, threading.Lock())
+
+    @staticmethod
+    def _touch(path):
+        """Record that path was just used, for LRU ordering."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _size(self, path):
+        with self._lock:
+            size = self._sizes.get(path)
+        if size is None:
+            size = _directory_size(path)
+            with self._lock:
+                self._sizes[path] = size
+        return size
+
+    def _forget_size(self, path):
+        with self._lock:
+            self._sizes.pop(path, None)
+
+    def _update_mirror(self, repo_url, repo_dir, branch):
+        """Create or refresh the bare mirror for repo_url and return it."""
+        mirror_dir = os.path.join(repo_dir, "mirror.git")
+        self._forget_size(mirror_dir)
+        if not os.path.exists(mirror_dir):
+            logger.info("Mirroring %s", repo_url)
+            os.makedirs(repo_dir, exist_ok=True)
+            try:
+                return git.Repo.clone_from(repo_url, mirror_dir, mirror=True, filter="blob:none")
+            except Exception:
+                # Do not leave a half-written mirror behind for the next request
+                if os.path.exists(mirror_dir):
+                    _remove_tree(mirror_dir)
+                raise
+
+        mirror = git.Repo(mirror_dir)
+        # A pinned commit that is already present needs no network round trip
+        if _SHA_PATTERN.match(branch or ""):
+            try:
+                mirror.git.cat_file("-e", f"{branch}^{{commit}}")
+                return mirror
+            except git.GitCommandError:
+                pass
+        logger.info("Fetching %s", repo_url)
+        mirror.git.fetch("--prune", "origin")
+        return mirror
+
+    def checkout(self, repo_url, branch="main", sparse=False, subdir=""):
+        """
+        Check out repo_url at branch (or a commit SHA) from the cache. With
+        sparse, only the analyzable files (under subdir, if given) are
+        checked out.
+
+        Returns (worktree_dir, commit_sha). The worktree is pinned until
+        release(worktree_dir) is called and must be treated as read-only.
+        """
+        subdir = normalize_subdir(subdir)
+        repo_dir = self._repo_dir(repo_url)
+        with self._lock:
+            self._repo_urls[repo_dir] = repo_url
+        with self._repo_lock(repo_url):
+            mirror = self._update_mirror(repo_url, repo_dir, branch)
+            try:
+                commit = mirror.git.rev_parse("--verify", f"{branch}^{{commit}}")
+                name = commit
+                if sparse:
+                    name += "-sparse-" + hashlib.sha1(subdir.encode()).hexdigest()[:8]
+                worktree_dir = os.path.join(repo_dir, "worktrees", name)
+                if not os.path.exists(worktree_dir):
+                    # Stale registrations would make "worktree add" refuse the path
+                    mirror.git.worktree("prune")
+                    if sparse:
+                        mirror.git.worktree("add", "--detach", "--no-checkout", worktree_dir, commit)
+                        try:
+                            worktree = git.Repo(worktree_dir)
+                            try:
+                                sparse_checkout(worktree, subdir)
+                            finally:
+                                worktree.close()
+                        except Exception:
+                            _remove_tree(worktree_dir)
+                            raise
+                    else:
+                        mirror.git.worktree("add", "--detach", worktree_dir, commit)
+            finally:
+                mirror.close()
+
+            with self._lock:
+                self._in_use[worktree_dir] = self._in_use.get(worktree_dir, 0) + 1
+            self._touch(worktree_dir)
+            self._touch(repo_dir)
+
+        self.evict()
+        return worktree_dir, commit
+
+    def release(self, worktree_dir):
+        """Unpin a worktree returned by checkout()."""
+        with self._lock:
+            count = self._in_use.get(worktree_dir, 0) - 1
+            if count > 0:
+                self._in_use[worktree_dir] = count
+            else:
+                self._in_use.pop(worktree_dir, None)
+
+    def _is_in_use(self, path):
+        with self._lock:
+            return any(used == path or used.startswith(path + os.sep) for used in self._in_use)
+
+    def _remove_unused(self, repo_dir, path):
+        """Delete path (a worktree or a whole repo entry) unless it is in use."""
+        with self._lock:
+            repo_url = self._repo_urls.get(repo_dir)
+        # Skip repositories another thread is checking out right now
+        lock = self._repo_lock(repo_url) if repo_url else None
+        if lock is not None and not lock.acquire(blocking=False):
+            return False
+        try:
+            if self._is_in_use(path):
+                return False
+            _remove_tree(path)
+        except OSError as e:
+            logger.warning("Could not evict %s: %s", path, e)
+            return False
+        finally:
+            if lock is not None:
+                lock.release()
+
+        with self._lock:
+            for cached in [p for p in self._sizes if p == path or p.startswith(path + os.sep)]:
+                del self._sizes[cached]
+        return True
+
+    def evict(self):
+        """Remove least recently used worktrees, then mirrors, beyond max_bytes."""
+        repos = []
+        worktrees = []
+        for name in os.listdir(self.cache_dir):
+            repo_dir = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(repo_dir):
+                continue
+            repos.append(repo_dir)
+            worktree_root = os.path.join(repo_dir, "worktrees")
+            if os.path.isdir(worktree_root):
+                worktrees.extend(os.path.join(worktree_root, sha) for sha in os.listdir(worktree_root))
+
+        sizes = {path: self._size(path) for path in worktrees}
+        total = sum(self._size(os.path.join(repo, "mirror.git")) for repo in repos) + sum(sizes.values())
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        removed = set()
+        for worktree_dir in sorted(worktrees, key=os.path.getmtime):
+            if total <= self.max_bytes:
+                break
+            repo_dir = os.path.dirname(os.path.dirname(worktree_dir))
+            if self._remove_unused(repo_dir, worktree_dir):
+                removed.add(worktree_dir)
+                total -= sizes[worktree_dir]
+                evicted += 1
+
+        for repo_dir in sorted(repos, key=os.path.getmtime):
+            if total <= self.max_bytes:
+                break
+            size = self._size(os.path.join(repo_dir, "mirror.git"))
+            size += sum(sizes[path] for path in worktrees
+                        if path.startswith(repo_dir + os.sep) and path not in removed)
+            if self._remove_unused(repo_dir, repo_dir):
+                total -= size
+                evicted += 1
+
+        logger.info("Repository cache: evicted %d entries", evicted)
+        return evicted
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_repo_cache():
+    """Return the process-wide clone cache, or None if it is disabled."""
+    global _default_cache
+    if not REPO_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = RepoCache()
+            except OSError as e:
+                logger.warning("Repository cache disabled: %s", e)
+                return None
+        return _default_cache
@@ -0,0 +1,144 @@
+import os
+import time
+import logging
+from instrumentation import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Per-request budgets (override through environment variables; 0 disables a budget)
+BUDGET_SECONDS = float(os.environ.get("BUDGET_SECONDS", 120))
+BUDGET_FILES = int(os.environ.get("BUDGET_FILES", 20000))
+BUDGET_BYTES = int(os.environ.get("BUDGET_BYTES", 256 * 1024 * 1024))
+BUDGET_NODES = int(os.environ.get("BUDGET_NODES", 200000))
+BUDGET_EDGES = int(os.environ.get("BUDGET_EDGES", 1000000))
+
+# Budgets for background jobs, which exist for repositories too large for a request
+JOB_BUDGET_SECONDS = float(os.environ.get("JOB_BUDGET_SECONDS", 0))
+JOB_BUDGET_FILES = int(os.environ.get("JOB_BUDGET_FILES", 200000))
+JOB_BUDGET_BYTES = int(os.environ.get("JOB_BUDGET_BYTES", 2 * 1024 * 1024 * 1024))
+JOB_BUDGET_NODES = int(os.environ.get("JOB_BUDGET_NODES", 2000000))
+JOB_BUDGET_EDGES = int(os.environ.get("JOB_BUDGET_EDGES", 10000000))
+
+# Edge types dropped first when a graph has too many edges
+EDGE_DROP_ORDER = ("calls", "imports", "contains")
+
+class ResourceGovernor:
+    """
+    Budgets for the work one request may do: wall time, files analyzed,
+    source bytes read and graph size. Every pipeline stage asks the
+    governor how much of its input it may process; work past a budget is
+    dropped and recorded, so the request still returns a well-formed graph
+    of what fit, together with the report from truncation().
+    """
+
+    def __init__(self, seconds=BUDGET_SECONDS, files=BUDGET_FILES, bytes_read=BUDGET_BYTES,
+                 nodes=BUDGET_NODES, edges=BUDGET_EDGES):
+        self.limits = {"seconds": seconds, "files": files, "bytes": bytes_read,
+                       "nodes": nodes, "edges": edges}
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds if seconds else None
+        self.exhausted = []
+
+    @classmethod
+    def for_job(cls):
+        """A governor with the JOB_BUDGET_* limits, for background analysis jobs."""
+        return cls(JOB_BUDGET_SECONDS, JOB_BUDGET_FILES, JOB_BUDGET_BYTES, JOB_BUDGET_NODES,
+                   JOB_BUDGET_EDGES)
+
+    def remaining_seconds(self):
+        """Seconds left before the deadline, or None without a time budget."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def out_of_time(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def record(self, resource, stage, **details):
+        """Note that stage stopped early because resource ran out."""
+        if any(entry["resource"] == resource and entry["stage"] == stage for entry in self.exhausted):
+            return
+        entry = dict(resource=resource, stage=stage, limit=self.limits[resource], **details)
+        self.exhausted.append(entry)
+        REGISTRY.increment("budget_exhausted_total", (("resource", resource), ("stage", stage)))
+        logger.warning("Budget exhausted: %s during %s %s", resource, stage, details or "")
+
+    def check_time(self, stage):
+        """Record and return True if the deadline has passed before stage."""
+        if self.out_of_time():
+            self.record("seconds", stage)
+            return True
+        return False
+
+    def limit_files(self, stage, paths, sizes):
+        """
+        Keep the longest prefix of paths within the file and byte budgets.
+        Returns the number of files to keep.
+        """
+        keep = len(paths)
+        if self.limits["files"] and keep > self.limits["files"]:
+            keep = self.limits["files"]
+            self.record("files", stage, skipped_files=len(paths) - keep)
+        if self.limits["bytes"]:
+            total = 0
+            for index, size in enumerate(sizes[:keep]):
+                total += size
+                if total > self.limits["bytes"]:
+                    self.record("bytes", stage, skipped_files=len(paths) - index)
+                    keep = index
+                    break
+        return keep
+
+    def analysis_stop(self, stage="analyze"):
+        """A stop callback for analyze_files that ends the analysis at the deadline."""
+        def stop():
+            return self.check_time(stage)
+        return stop
+
+    def limit_analysis(self, analysis_results, stage="build_graph"):
+        """
+        Keep the longest prefix of analyzed files whose file and function
+        nodes fit the node budget.
+        """
+        if not self.limits["nodes"]:
+            return analysis_results
+        nodes = 0
+        for index, file_info in enumerate(analysis_results):
+            nodes += 1 + len(file_info.get('functions', []))
+            if nodes > self.limits["nodes"]:
+                self.record("nodes", stage, skipped_files=len(analysis_results) - index)
+                return analysis_results[:index]
+        return analysis_results
+
+    def limit_edges(self, graph, stage="build_graph"):
+        """
+        Remove edges beyond the edge budget from graph, calls edges first,
+        then imports, then contains. Returns the number removed.
+        """
+        excess = graph.number_of_edges() - self.limits["edges"]
+        if not self.limits["edges"] or excess <= 0:
+            return 0
+        removed = {}
+        for edge_type in EDGE_DROP_ORDER:
+            edges = [(source, target) for source, target, attrs in graph.edges(data=True)
+                     if attrs.get("type") == edge_type]
+            # Drop the most recently added edges of this type
+            dropped = edges[len(edges) - min(excess, len(edges)):]
+            graph.remove_edges_from(dropped)
+            if dropped:
+                removed[edge_type] = len(dropped)
+            excess -= len(dropped)
+            if excess <= 0:
+                break
+        self.record("edges", stage, removed_edges=removed)
+        return sum(removed.values())
+
+    def truncation(self):
+        """What was cut short, for the response, or None if nothing was."""
+        if not self.exhausted:
+            return None
+        return {
+            "budgets": self.exhausted,
+            "limits": dict(self.limits),
+            "seconds": time.monotonic() - self.started
+        }
@@ -0,0 +1,236 @@
+import os
+import re
+import time
+import fnmatch
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Source walk settings (override through environment variables)
+WALK_MAX_FILE_BYTES = int(os.environ.get("WALK_MAX_FILE_BYTES", 1024 * 1024))
+WALK_SKIP_GENERATED = os.environ.get("WALK_SKIP_GENERATED", "1") != "0"
+WALK_REPORT_LIMIT = int(os.environ.get("WALK_REPORT_LIMIT", 50))
+
+SOURCE_EXTENSIONS = ('.py',)
+IGNORE_FILES = ('.gitignore', '.archtoolignore')
+
+# Directories that are never part of the architecture
+DEFAULT_IGNORED_DIRS = {
+    '.git', '.hg', '.svn', '__pycache__', 'node_modules', 'venv', '.venv', 'env',
+    'virtualenv', 'site-packages', 'build', 'dist', '.eggs', '.tox', '.nox',
+    '.mypy_cache', '.pytest_cache', '.ruff_cache', '.idea', '.vscode'
+}
+DEFAULT_IGNORED_DIR_PATTERNS = ('*.egg-info',)
+
+# Generated modules recognised by name, and by a marker near the top of the file
+GENERATED_NAME_PATTERNS = ('*_pb2.py', '*_pb2_grpc.py')
+# Phrases only count in comment lines, so code that merely mentions them is kept
+GENERATED_MARKERS = re.compile(rb"(?<![\w@])@generated\b|^\s*#.*\b(?:do not edit|auto-?generated)\b"
+                               rb"|^\s*#\s*generated by", re.IGNORECASE | re.MULTILINE)
+GENERATED_HEAD_BYTES = 512
+
+def _pattern_regex(pattern):
+    """Translate a gitignore glob into a regex over '/'-separated paths."""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            i += 3
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape(pattern[i])
+                i += 1
+            else:
+                regex += "[" + pattern[i + 1:end].replace("!", "^", 1) + "]"
+                i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+class IgnoreRule:
+    """One line of a .gitignore-style file, scoped to the directory it is in."""
+
+    def __init__(self, pattern, base):
+        self.negated = pattern.startswith("!")
+        if self.negated:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # Patterns with an inner or leading slash only match relative to base
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        prefix = "" if anchored else "(?:.*/)?"
+        self.base = base
+        self.regex = re.compile(prefix + _pattern_regex(pattern) + "$")
+
+    def matches(self, rel_path, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        return self.regex.match(rel_path) is not None
+
+def read_ignore_file(path, base):
+    """Parse a .gitignore-style file into IgnoreRules relative to base."""
+    rules = []
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                line = line.rstrip("\n").rstrip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("\\"):
+                    line = line[1:]
+                rules.append(IgnoreRule(line, base))
+    except OSError as e:
+        logger.warning("Could not read ignore file %s: %s", path, e)
+    return rules
+
+def is_ignored(rules, rel_path, is_dir):
+    """Apply rules in order; the last matching rule decides."""
+    ignored = False
+    for rule in rules:
+        if rule.negated == ignored and rule.matches(rel_path, is_dir):
+            ignored = not rule.negated
+    return ignored
+
+def is_ignored_dir(name):
+    """Whether a directory with this name is pruned by default."""
+    return name in DEFAULT_IGNORED_DIRS or any(
+        fnmatch.fnmatch(name, pattern) for pattern in DEFAULT_IGNORED_DIR_PATTERNS)
+
+def is_generated(name, head):
+    """Whether a file is generated code, judged by its name or first bytes."""
+    if any(fnmatch.fnmatch(name, pattern) for pattern in GENERATED_NAME_PATTERNS):
+        return True
+    return GENERATED_MARKERS.search(head[:GENERATED_HEAD_BYTES]) is not None
+
+def looks_generated(path, name):
+    """Like is_generated, reading the head of the file at path."""
+    if any(fnmatch.fnmatch(name, pattern) for pattern in GENERATED_NAME_PATTERNS):
+        return True
+    try:
+        with open(path, "rb") as f:
+            head = f.read(GENERATED_HEAD_BYTES)
+    except OSError:
+        return False
+    return is_generated(name, head)
+
+class WalkResult:
+    """Source files found by walk_sources, plus what was skipped and why."""
+
+    def __init__(self, report_limit=WALK_REPORT_LIMIT):
+        self.paths = []
+        self.sizes = []
+        self.skipped = {}
+        self.skipped_paths = []
+        self.report_limit = report_limit
+        # "files" or "seconds" when the walk stopped before visiting everything
+        self.stopped = None
+
+    def skip(self, rel_path, reason):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        if len(self.skipped_paths) < self.report_limit:
+            self.skipped_paths.append({"path": rel_path, "reason": reason})
+
+    def report(self):
+        return {
+            "counts": dict(self.skipped),
+            "paths": self.skipped_paths,
+            "truncated": sum(self.skipped.values()) > len(self.skipped_paths)
+        }
+
+def walk_sources(directory, max_file_bytes=WALK_MAX_FILE_BYTES, skip_generated=WALK_SKIP_GENERATED,
+                 extensions=SOURCE_EXTENSIONS, ignore_files=IGNORE_FILES, max_files=0, deadline=None):
+    """
+    Collect source files under directory with os.scandir.
+
+    Directories in DEFAULT_IGNORED_DIRS, and paths matched by a .gitignore or
+    .archtoolignore at any level, are pruned before they are entered. Files
+    larger than max_file_bytes and generated files are skipped. Every skip
+    is recorded in the returned WalkResult with its reason: "ignored_dir",
+    "gitignore", "too_large" or "generated". Paths are returned in sorted,
+    deterministic order.
+
+    The walk stops once more than max_files files were found, or at
+    deadline (a time.monotonic() value), setting the result's 'stopped'.
+    """
+    result = WalkResult()
+    # Stack of (absolute dir, path relative to directory, rules in effect)
+    stack = [(directory, "", [])]
+    while stack:
+        if max_files and len(result.paths) > max_files:
+            result.stopped = "files"
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            result.stopped = "seconds"
+            break
+        current, rel_dir, rules = stack.pop()
+        for ignore_file in ignore_files:
+            ignore_path = os.path.join(current, ignore_file)
+            if os.path.isfile(ignore_path):
+                # Copy so the rules only apply below this directory
+                rules = rules + read_ignore_file(ignore_path, rel_dir)
+
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning("Could not list %s: %s", current, e)
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+
+            if is_dir:
+                if is_ignored_dir(entry.name):
+                    result.skip(rel_path, "ignored_dir")
+                elif rules and is_ignored(rules, rel_path, True):
+                    result.skip(rel_path, "gitignore")
+                else:
+                    subdirs.append((entry.path, rel_path, rules))
+                continue
+
+            if not entry.name.endswith(extensions):
+                continue
+            if rules and is_ignored(rules, rel_path, False):
+                result.skip(rel_path, "gitignore")
+                continue
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            if max_file_bytes and size > max_file_bytes:
+                result.skip(rel_path, "too_large")
+                continue
+            if skip_generated and looks_generated(entry.path, entry.name):
+                result.skip(rel_path, "generated")
+                continue
+            result.paths.append(entry.path)
+            result.sizes.append(size)
+
+        # Visit subdirectories in name order
+        stack.extend(reversed(subdirs))
+
+    if result.skipped:
+        logger.info("Skipped while walking %s: %s", directory, result.skipped)
+    return result
@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def sample_project(tmp_path):
+    """A small package with imports between modules, an import cycle and a nested directory."""
+    files = {
+        "core/models.py": "import core.store\n\nclass Model:\n    def save(self):\n        return core.store.write(self)\n",
+        "core/store.py": "import core.models\n\ndef write(item):\n    if item:\n        return True\n    return False\n",
+        "api/views.py": "from core.models import Model\n\ndef index():\n    return Model().save()\n",
+        "api/util.py": "def slug(text):\n    return text.lower().replace(' ', '-')\n",
+        "main.py": "from api.views import index\n\ndef run():\n    return index()\n",
+    }
+    for rel_path, code in files.items():
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(code)
+    return tmp_path
@@ -0,0 +1,94 @@
+import pytest
+from graph_builder import build_dependency_graph
+from lizard_parser import analyze_codebase
+from llm_cache import CachedModel, StubModel
+from architecture_summary import (SUMMARY_OUTPUT_TOKENS, Summarizer, TokenBudget, estimate_tokens,
+                                  partition_graph)
+
+@pytest.fixture
+def graph(sample_project):
+    return build_dependency_graph(analyze_codebase(str(sample_project), workers=1))
+
+def _summarizer(model=None, **kwargs):
+    kwargs.setdefault("backoff", 0)
+    return Summarizer(model or CachedModel(StubModel(), cache_dir=""), **kwargs)
+
+def _partitions(result):
+    return {partition["name"]: partition for partition in result["partitions"]}
+
+def test_directory_partitions(graph):
+    partitions, _ = partition_graph(graph, "directory")
+    assert [(partition.name, len(partition.files)) for partition in partitions] == \
+        [(".", 1), ("api", 2), ("core", 2)]
+
+def test_scc_partitions_put_cycles_first(graph):
+    partitions, _ = partition_graph(graph, "scc")
+    assert partitions[0].kind == "scc"
+    assert sorted(path.rsplit("/", 1)[-1] for path in partitions[0].files) == ["models.py", "store.py"]
+    assert [partition.name for partition in partitions[1:]] == [".", "api"]
+
+def test_summarize_with_stub_model(graph):
+    result = _summarizer().summarize(graph, "directory")
+
+    assert result["counts"] == {"ok": 3}
+    assert result["calls"] == 4  # three partitions and the merge
+    assert result["summary"].startswith("Stub summary")
+    assert "error" not in result
+    assert all(partition["summary"] for partition in result["partitions"])
+    assert 0 < result["tokens"]["used"] <= result["tokens"]["budget"]
+
+def test_budget_cap_skips_smaller_partitions(graph):
+    # Room for one partition call at a time, and not for the merge after it
+    summarizer = _summarizer(concurrency=1, token_budget=SUMMARY_OUTPUT_TOKENS + 250)
+    result = summarizer.summarize(graph, "directory")
+
+    partitions = _partitions(result)
+    assert result["counts"]["skipped"] >= 1
+    assert partitions["."]["status"] == "skipped"
+    assert partitions["."]["error"] == "Token budget exhausted"
+    # The largest partitions go first
+    assert partitions["api"]["status"] == "ok"
+    assert result["tokens"]["used"] <= result["tokens"]["budget"]
+    assert result["error"] == "Token budget exhausted before the merge"
+    assert result["summary"]
+
+def test_concurrent_calls_stay_within_budget(graph):
+    budget = 2 * SUMMARY_OUTPUT_TOKENS
+    result = _summarizer(concurrency=4, token_budget=budget).summarize(graph, "directory")
+    assert result["tokens"]["used"] <= budget
+
+def test_failed_partitions_are_retried(graph):
+    model = StubModel(failure_rate=1.0)
+    result = _summarizer(model, retries=2).summarize(graph, "directory")
+
+    assert result["counts"] == {"failed": 3}
+    assert model.calls == 3 * 3
+    assert all(partition["error"] == "Stub model failure" for partition in result["partitions"])
+    assert result["summary"] is None
+    assert result["error"] == "No partition could be summarized"
+
+def test_every_attempt_reserves_tokens():
+    model = StubModel(failure_rate=1.0)
+    prompt = "Part: core\n" + "x" * 400
+    # Room for two attempts: the failed first one is charged its prompt only
+    summarizer = _summarizer(model, retries=5,
+                             token_budget=2 * estimate_tokens(prompt) + SUMMARY_OUTPUT_TOKENS)
+
+    with pytest.raises(RuntimeError):
+        summarizer.ask(prompt)
+    assert model.calls == 2
+    assert summarizer.budget.used == 2 * estimate_tokens(prompt)
+
+def test_ask_without_budget_is_skipped():
+    model = StubModel()
+    text, attempts = _summarizer(model, token_budget=10).ask("Part: core")
+    assert (text, attempts) == (None, 0)
+    assert model.calls == 0
+
+def test_token_budget():
+    budget = TokenBudget(100)
+    assert budget.reserve(80)
+    assert not budget.reserve(30)
+    budget.settle(80, 20)
+    assert budget.reserve(30)
+    assert budget.used == 50
@@ -0,0 +1,74 @@
+import math
+import networkx as nx
+import graph_layout
+from graph_layout import (LayoutCache, NODE_SPACING, apply_layout, force_layout, graph_fingerprint,
+                          layered_layout)
+
+def _chain_with_cycle():
+    # a -> b -> c <-> d, plus a shortcut a -> c
+    return nx.DiGraph([("a", "b"), ("b", "c"), ("a", "c"), ("c", "d"), ("d", "c")])
+
+def _distance(first, second):
+    return math.hypot(first[0] - second[0], first[1] - second[1])
+
+def test_layered_places_dependencies_below_dependents():
+    positions = layered_layout(_chain_with_cycle())
+
+    assert set(positions) == {"a", "b", "c", "d"}
+    # Layers follow the longest path from a source
+    assert positions["a"][1] < positions["b"][1] < positions["c"][1]
+    # Members of a cycle share a layer without overlapping
+    assert positions["c"][1] == positions["d"][1]
+    assert _distance(positions["c"], positions["d"]) >= NODE_SPACING / 2
+
+def test_layered_wraps_wide_layers():
+    graph = nx.DiGraph([("root", f"leaf{i}") for i in range(30)])
+    positions = layered_layout(graph, max_row=10)
+
+    leaf_rows = {positions[f"leaf{i}"][1] for i in range(30)}
+    assert len(leaf_rows) == 3
+    assert all(row > positions["root"][1] for row in leaf_rows)
+
+def test_large_cycles_use_a_grid():
+    members = [f"n{i:02d}" for i in range(graph_layout.CIRCLE_MAX_MEMBERS + 4)]
+    graph = nx.DiGraph(list(zip(members, members[1:] + members[:1])))
+    positions = layered_layout(graph)
+
+    assert len({positions[node] for node in members}) == len(members)
+    assert len({x for x, _ in positions.values()}) < len(members)
+
+def test_force_layout_is_deterministic_and_spread_out():
+    graph = _chain_with_cycle()
+    first = force_layout(graph)
+
+    assert first == force_layout(graph)
+    assert min(x for x, _ in first.values()) == 0.0
+    assert min(y for _, y in first.values()) == 0.0
+    assert all(_distance(first[u], first[v]) > 1.0 for u in first for v in first if u < v)
+
+def test_empty_graph():
+    assert layered_layout(nx.DiGraph()) == {}
+    assert force_layout(nx.DiGraph()) == {}
+
+def test_apply_layout_sets_coordinates_and_caches():
+    cache = LayoutCache()
+    graph = _chain_with_cycle()
+
+    info = apply_layout(graph, "layered", cache=cache)
+    assert info["algorithm"] == "layered" and not info["cached"]
+    assert all("x" in attrs and "y" in attrs for _, attrs in graph.nodes(data=True))
+
+    again = apply_layout(_chain_with_cycle(), "layered", cache=cache)
+    assert again["cached"] and again["bounds"] == info["bounds"]
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+def test_force_falls_back_to_layered_on_large_graphs(monkeypatch):
+    monkeypatch.setattr(graph_layout, "LAYOUT_FORCE_MAX_NODES", 3)
+    info = apply_layout(_chain_with_cycle(), "force", cache=LayoutCache())
+    assert info["algorithm"] == "layered"
+
+def test_fingerprint_ignores_insertion_order():
+    reordered = nx.DiGraph()
+    reordered.add_nodes_from(["d", "c", "b", "a"])
+    reordered.add_edges_from(reversed(list(_chain_with_cycle().edges())))
+    assert graph_fingerprint(reordered) == graph_fingerprint(_chain_with_cycle())
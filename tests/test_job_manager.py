@@ -0,0 +1,106 @@
+import threading
+import pytest
+from job_manager import JobManager, JobCancelled, JobQueueFull
+
+def _wait(job, timeout=5):
+    job.future.exception(timeout=timeout)
+    return job
+
+def test_job_lifecycle():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+    proceed = threading.Event()
+
+    def work(job, value):
+        job.update_progress(0, 2)
+        started.set()
+        proceed.wait(5)
+        job.update_progress(2, 2)
+        return value * 2
+
+    job = manager.submit(work, 21)
+    assert started.wait(5)
+    assert job.status == "running"
+    assert job.started_at is not None
+    proceed.set()
+    _wait(job)
+
+    assert job.status == "done"
+    assert job.result == 42
+    assert job.progress == {"files_scanned": 2, "files_total": 2}
+    assert job.finished_at >= job.started_at
+    assert manager.get(job.id) is job
+    assert job.to_dict()["status"] == "done"
+
+def test_failed_job_records_error():
+    manager = JobManager(max_workers=1)
+
+    def work(job):
+        raise ValueError("bad input")
+
+    job = _wait(manager.submit(work))
+    assert job.status == "failed"
+    assert job.error == "bad input"
+
+def test_cancel_running_job():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+
+    def work(job):
+        started.set()
+        while True:
+            job.update_progress(1, 10)
+
+    job = manager.submit(work)
+    assert started.wait(5)
+    assert manager.cancel(job.id) is job
+    _wait(job)
+    assert job.status == "cancelled"
+    assert job.finished_at is not None
+
+def test_cancel_queued_job():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    blocker = manager.submit(lambda job: release.wait(5))
+    ran = []
+    queued = manager.submit(lambda job: ran.append(job))
+
+    manager.cancel(queued.id)
+    release.set()
+    _wait(blocker)
+
+    assert queued.status == "cancelled"
+    assert queued.future.cancelled()
+    assert ran == []
+
+def test_check_cancelled_raises():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    job = manager.submit(lambda job: release.wait(5))
+    manager.cancel(job.id)
+    with pytest.raises(JobCancelled):
+        job.check_cancelled()
+    release.set()
+
+def test_cancel_unknown_job():
+    assert JobManager(max_workers=1).cancel("missing") is None
+
+def test_queue_limit():
+    manager = JobManager(max_workers=1, max_pending=2)
+    release = threading.Event()
+    jobs = [manager.submit(lambda job: release.wait(5)) for _ in range(2)]
+    with pytest.raises(JobQueueFull):
+        manager.submit(lambda job: None)
+    release.set()
+    for job in jobs:
+        _wait(job)
+    # Finished jobs no longer count against the limit
+    _wait(manager.submit(lambda job: None))
+
+def test_finished_jobs_expire():
+    manager = JobManager(max_workers=1, result_ttl=0)
+    job = _wait(manager.submit(lambda job: "result"))
+    job.finished_at -= 1
+
+    assert manager.purge_expired() == 1
+    assert manager.get(job.id) is None
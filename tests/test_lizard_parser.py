@@ -0,0 +1,45 @@
+import lizard_parser
+from lizard_parser import analyze_files, analyze_sources, find_source_files
+
+def _many_files(directory, count=24):
+    for i in range(count):
+        (directory / f"module_{i:02d}.py").write_text(
+            f"import module_{(i + 1) % count:02d}\n\n"
+            f"def run_{i}(value):\n    if value > {i}:\n        return value - {i}\n    return value\n")
+    return find_source_files(str(directory))
+
+def test_parallel_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(lizard_parser, "PARALLEL_MIN_FILES", 1)
+    paths = _many_files(tmp_path)
+
+    serial = analyze_files(paths, workers=1)
+    parallel = analyze_files(paths, workers=3, chunk_size=2)
+
+    assert len(serial) == len(paths)
+    assert parallel == serial
+
+def test_parallel_output_is_deterministic(tmp_path, monkeypatch):
+    monkeypatch.setattr(lizard_parser, "PARALLEL_MIN_FILES", 1)
+    paths = _many_files(tmp_path)
+
+    runs = [analyze_files(paths, workers=3, chunk_size=1) for _ in range(3)]
+
+    assert [file_info["path"] for file_info in runs[0]] == paths
+    assert runs[1] == runs[0]
+    assert runs[2] == runs[0]
+
+def test_sources_match_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(lizard_parser, "PARALLEL_MIN_FILES", 1)
+    paths = _many_files(tmp_path, count=8)
+    sources = [(path, open(path, "rb").read()) for path in paths]
+
+    assert analyze_sources(sources, workers=2) == analyze_files(paths, workers=1)
+
+def test_progress_reaches_total(tmp_path):
+    paths = _many_files(tmp_path, count=5)
+    calls = []
+
+    analyze_files(paths, workers=1, progress=lambda scanned, total: calls.append((scanned, total)))
+
+    assert calls[0] == (0, 5)
+    assert calls[-1] == (5, 5)
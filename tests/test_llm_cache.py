@@ -0,0 +1,144 @@
+import time
+import threading
+import pytest
+import llm_cache
+from llm_cache import CachedModel, LazyModel, StubModel, normalize_prompt
+
+class BlockingModel(StubModel):
+    """StubModel whose calls wait until release is set."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def generate_content(self, prompt):
+        self.started.set()
+        self.release.wait(5)
+        return super().generate_content(prompt)
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def test_repeated_prompt_is_served_from_cache():
+    stub = StubModel()
+    model = CachedModel(stub, cache_dir="")
+
+    first = model.generate_text("Part: core\nfiles")
+    # Formatting-only differences share the entry
+    second = model.generate_text("  Part: core   files ")
+
+    assert first == second
+    assert stub.calls == 1
+    assert model.stats() == {"hits": 1, "misses": 1, "coalesced": 0, "entries": 1}
+
+def test_concurrent_identical_prompts_share_one_call():
+    stub = BlockingModel()
+    model = CachedModel(stub, cache_dir="")
+    results = []
+
+    def ask():
+        results.append(model.generate_text("Part: core"))
+
+    threads = [threading.Thread(target=ask) for _ in range(8)]
+    threads[0].start()
+    assert stub.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_for(lambda: model.stats()["coalesced"] == len(threads) - 1)
+    stub.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert stub.calls == 1
+    assert len(results) == len(threads) and len(set(results)) == 1
+    assert model.stats()["misses"] == 1
+
+def test_errors_reach_all_waiters_and_are_not_cached():
+    stub = BlockingModel(failure_rate=1.0)
+    model = CachedModel(stub, cache_dir="")
+    errors = []
+
+    def ask():
+        try:
+            model.generate_text("Part: core")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ask) for _ in range(4)]
+    threads[0].start()
+    assert stub.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_for(lambda: model.stats()["coalesced"] == len(threads) - 1)
+    stub.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == len(threads)
+    assert stub.calls == 1
+    stub.failure_rate = 0.0
+    model.generate_text("Part: core")
+    assert stub.calls == 2
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    stub = StubModel()
+    model = CachedModel(stub, ttl=60, cache_dir="")
+
+    model.generate_text("Part: core")
+    now[0] += 59
+    model.generate_text("Part: core")
+    assert stub.calls == 1
+
+    now[0] += 2
+    model.generate_text("Part: core")
+    assert stub.calls == 2
+
+def test_least_recently_used_entry_is_dropped():
+    stub = StubModel()
+    model = CachedModel(stub, max_entries=2, cache_dir="")
+    for prompt in ("a", "b", "a", "c"):
+        model.generate_text(prompt)
+
+    model.generate_text("a")
+    assert stub.calls == 3
+    model.generate_text("b")
+    assert stub.calls == 4
+
+def test_disk_cache_survives_restart(tmp_path):
+    stub = StubModel()
+    CachedModel(stub, cache_dir=str(tmp_path)).generate_text("Part: core")
+
+    restarted = CachedModel(stub, cache_dir=str(tmp_path))
+    restarted.generate_text("Part: core")
+    assert stub.calls == 1
+    assert restarted.stats()["hits"] == 1
+
+def test_model_name_is_part_of_the_key():
+    assert CachedModel(StubModel(), model_name="a").key_for("x") != \
+        CachedModel(StubModel(), model_name="b").key_for("x")
+
+def test_lazy_model_creates_client_once():
+    created = []
+
+    def factory():
+        created.append(StubModel())
+        return created[-1]
+
+    model = LazyModel(factory)
+    assert created == []
+    model.generate_content("one")
+    model.generate_content("two")
+    assert len(created) == 1 and created[0].calls == 2
+
+def test_stub_model_failures():
+    with pytest.raises(RuntimeError):
+        StubModel(failure_rate=1.0).generate_content("prompt")
+
+def test_normalize_prompt():
+    assert normalize_prompt(" a\n\n b\tc ") == "a b c"
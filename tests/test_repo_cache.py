@@ -0,0 +1,134 @@
+import os
+import git
+import pytest
+from repo_cache import RepoCache, clone_sparse, normalize_subdir
+
+def _commit(repo, files, message):
+    for rel_path, text in files.items():
+        path = os.path.join(repo.working_tree_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+    repo.git.add("-A")
+    repo.git.commit("-m", message)
+    return repo.head.commit.hexsha
+
+@pytest.fixture
+def origin(tmp_path, monkeypatch):
+    """A local repository served over file://, with a branch 'main'."""
+    for variable in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(variable, "Test")
+    for variable in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(variable, "test@example.com")
+    repo = git.Repo.init(tmp_path / "origin", initial_branch="main")
+    # Let blobless clones filter on the server side, as hosted remotes do
+    repo.git.config("uploadpack.allowFilter", "true")
+    _commit(repo, {
+        "app/main.py": "def main():\n    pass\n",
+        "app/data.bin": "binary",
+        "lib/util.py": "def util():\n    pass\n",
+        "README.md": "readme",
+        ".gitignore": "build/\n",
+    }, "initial")
+    return repo
+
+def _url(repo):
+    return "file://" + repo.working_tree_dir
+
+def _files(directory):
+    found = set()
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if name != ".git"]
+        for name in files:
+            if name != ".git":
+                found.add(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/"))
+    return found
+
+def test_checkout_creates_mirror_and_worktree(origin, tmp_path):
+    cache = RepoCache(str(tmp_path / "cache"))
+    worktree, commit = cache.checkout(_url(origin), "main")
+
+    assert commit == origin.head.commit.hexsha
+    assert os.path.basename(worktree) == commit
+    mirror = git.Repo(os.path.join(os.path.dirname(os.path.dirname(worktree)), "mirror.git"))
+    assert mirror.bare
+    # Blobless: file contents are fetched on demand
+    assert mirror.git.config("remote.origin.partialclonefilter") == "blob:none"
+    mirror.close()
+    assert _files(worktree) == {"app/main.py", "app/data.bin", "lib/util.py", "README.md", ".gitignore"}
+
+def test_unchanged_branch_reuses_worktree(origin, tmp_path):
+    cache = RepoCache(str(tmp_path / "cache"))
+    first, _ = cache.checkout(_url(origin), "main")
+    marker = os.path.join(first, "marker")
+    open(marker, "w").close()
+
+    second, _ = cache.checkout(_url(origin), "main")
+    assert second == first
+    assert os.path.exists(marker)
+
+def test_new_commit_is_fetched(origin, tmp_path):
+    cache = RepoCache(str(tmp_path / "cache"))
+    first, first_commit = cache.checkout(_url(origin), "main")
+    new_commit = _commit(origin, {"lib/extra.py": "x = 1\n"}, "add extra")
+
+    second, commit = cache.checkout(_url(origin), "main")
+    assert commit == new_commit != first_commit
+    assert second != first
+    assert os.path.exists(os.path.join(second, "lib/extra.py"))
+    assert not os.path.exists(os.path.join(first, "lib/extra.py"))
+
+def test_checkout_pinned_commit(origin, tmp_path):
+    pinned = origin.head.commit.hexsha
+    _commit(origin, {"lib/extra.py": "x = 1\n"}, "add extra")
+    cache = RepoCache(str(tmp_path / "cache"))
+
+    worktree, commit = cache.checkout(_url(origin), pinned)
+    assert commit == pinned
+    assert not os.path.exists(os.path.join(worktree, "lib/extra.py"))
+
+def test_sparse_checkout_keeps_analyzable_files(origin, tmp_path):
+    cache = RepoCache(str(tmp_path / "cache"))
+    worktree, commit = cache.checkout(_url(origin), "main", sparse=True)
+
+    assert os.path.basename(worktree).startswith(commit + "-sparse-")
+    assert _files(worktree) == {"app/main.py", "lib/util.py", ".gitignore"}
+
+def test_sparse_checkout_of_subdirectory(origin, tmp_path):
+    cache = RepoCache(str(tmp_path / "cache"))
+    full, _ = cache.checkout(_url(origin), "main", sparse=True)
+    worktree, _ = cache.checkout(_url(origin), "main", sparse=True, subdir="/app/")
+
+    assert worktree != full
+    assert _files(worktree) == {"app/main.py"}
+
+def test_clone_sparse(origin, tmp_path):
+    directory = str(tmp_path / "clone")
+    clone_sparse(_url(origin), directory, "main", subdir="lib").close()
+    assert _files(directory) == {"lib/util.py"}
+
+def test_eviction_spares_worktrees_in_use(origin, tmp_path):
+    pinned = origin.head.commit.hexsha
+    cache = RepoCache(str(tmp_path / "cache"))
+    kept, _ = cache.checkout(_url(origin), pinned)
+    _commit(origin, {"lib/extra.py": "x = 1\n"}, "add extra")
+    released, _ = cache.checkout(_url(origin), "main")
+    cache.release(released)
+
+    cache.max_bytes = 0
+    cache.evict()
+    assert os.path.isdir(kept)
+    assert not os.path.exists(released)
+
+    cache.release(kept)
+    cache.evict()
+    assert os.listdir(cache.cache_dir) == []
+
+@pytest.mark.parametrize("subdir", ["../outside", "app/../../outside"])
+def test_normalize_subdir_rejects_parent_paths(subdir):
+    with pytest.raises(ValueError):
+        normalize_subdir(subdir)
+
+def test_normalize_subdir():
+    assert normalize_subdir("\\app\\core\\") == "app/core"
+    assert normalize_subdir(None) == ""
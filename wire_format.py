@@ -0,0 +1,138 @@
+import os
+import gzip
+import json
+from compact_graph import FLAG_BITS, StringTable, flags_to_mask
+from graph_views import graph_root
+from graph_metrics import METRIC_KEYS
+
+# Optional encoders; used only when installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+
+COLUMNAR_MIMETYPE = "application/vnd.cdb-archtool.columnar+json"
+MSGPACK_MIMETYPE = "application/msgpack"
+
+# Optional node columns, emitted only when some node has them
+NODE_COUNT_COLUMNS = ("file_count", "function_count", "external_edges", "calls_truncated",
+                      "callers_truncated")
+
+def columnar_graph(graph, cycle_report, extras, display_name, root=None):
+    """
+    Encode a rendered graph as a string table plus integer-indexed columns.
+
+    Node ids are written relative to root (by default the common directory
+    of the file nodes) so long checkout prefixes are sent once. Edges and
+    cycles refer to nodes by their position in the node columns.
+    display_name(node_id, attrs) returns (display_id, name) and is called
+    once per node.
+    """
+    strings = StringTable()
+    types = StringTable()
+    if root is None:
+        root = graph_root(graph)
+    prefix = os.path.join(root, "") if root else ""
+
+    index = {}
+    nodes = {"id": [], "display_id": [], "type": [], "name": [], "flags": []}
+    counts = {key: [] for key in NODE_COUNT_COLUMNS}
+    for position, (node, attrs) in enumerate(graph.nodes(data=True)):
+        index[node] = position
+        display_id, name = display_name(node, attrs)
+        relative_id = node[len(prefix):] if prefix and node.startswith(prefix) else node
+        nodes["id"].append(strings.add(relative_id))
+        nodes["display_id"].append(strings.add(display_id))
+        nodes["type"].append(types.add(attrs.get("type", "unknown")))
+        nodes["name"].append(strings.add(name))
+        nodes["flags"].append(flags_to_mask(attrs.get("flags")))
+        for key in NODE_COUNT_COLUMNS:
+            counts[key].append(attrs.get(key, 0))
+    for key in NODE_COUNT_COLUMNS:
+        if any(counts[key]):
+            nodes[key] = counts[key]
+    # Node metrics, when the view has them (aggregated views carry only the additive ones)
+    for key in METRIC_KEYS:
+        if any(key in attrs for _, attrs in graph.nodes(data=True)):
+            nodes[key] = [attrs.get(key, 0) for _, attrs in graph.nodes(data=True)]
+    if "layout" in extras:
+        nodes["x"] = [attrs.get("x", 0.0) for _, attrs in graph.nodes(data=True)]
+        nodes["y"] = [attrs.get("y", 0.0) for _, attrs in graph.nodes(data=True)]
+
+    edges = {"source": [], "target": [], "type": [], "weight": [], "flags": []}
+    edge_counts = []
+    edge_breakdowns = []
+    for source, target, attrs in graph.edges(data=True):
+        edges["source"].append(index[source])
+        edges["target"].append(index[target])
+        edges["type"].append(types.add(attrs.get("type", "unknown")))
+        edges["weight"].append(round(attrs.get("weight", 1), 3))
+        edges["flags"].append(flags_to_mask(attrs.get("flags")))
+        edge_counts.append(attrs.get("count", 1))
+        edge_breakdowns.append(attrs.get("counts"))
+    if any(breakdown is not None for breakdown in edge_breakdowns):
+        edges["count"] = edge_counts
+        edges["counts"] = edge_breakdowns
+
+    payload = {
+        "format": "columnar-v1",
+        "root": root,
+        "strings": strings.strings,
+        "types": types.strings,
+        "flags": list(FLAG_BITS),
+        "nodes": nodes,
+        "edges": edges,
+        "cycles": [[index[node] for node in cycle] for cycle in cycle_report["cycles"]],
+        "cycle_components": cycle_report["components"],
+        "cycles_truncated": cycle_report["truncated"]
+    }
+    payload.update(extras)
+    return payload
+
+def negotiate_format(options, accept_mimetypes):
+    """Pick "json", "columnar" or "msgpack" from request options and Accept."""
+    requested = (options or {}).get("format")
+    if requested in ("json", "columnar"):
+        return requested
+    if requested == "msgpack":
+        return "msgpack" if msgpack is not None else "columnar"
+    best = accept_mimetypes.best_match(["application/json", COLUMNAR_MIMETYPE, MSGPACK_MIMETYPE],
+                                       default="application/json")
+    if best == MSGPACK_MIMETYPE and msgpack is not None:
+        return "msgpack"
+    if best == COLUMNAR_MIMETYPE:
+        return "columnar"
+    return "json"
+
+def negotiate_encoding(accept_encodings):
+    """Pick "br", "gzip" or None from the Accept-Encoding header."""
+    if brotli is not None and "br" in accept_encodings:
+        return "br"
+    if "gzip" in accept_encodings:
+        return "gzip"
+    return None
+
+def encode_body(payload, wire_format):
+    """Serialize payload. Returns (body_bytes, mimetype)."""
+    if wire_format == "msgpack":
+        return msgpack.packb(payload, use_bin_type=True), MSGPACK_MIMETYPE
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    if wire_format == "columnar":
+        return body, COLUMNAR_MIMETYPE
+    return body, "application/json"
+
+def compress_body(body, encoding):
+    """Compress body with encoding. Returns (body, applied_encoding or None)."""
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=5), "br"
+    return gzip.compress(body, compresslevel=6), "gzip"